@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backwyrm.settings')
+# Read endpoints that have async handlers run them natively under ASGI
+os.environ.setdefault('BOOKS_ASYNC_VIEWS', 'true')
 
 application = get_asgi_application()
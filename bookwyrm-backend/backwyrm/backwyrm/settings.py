@@ -21,13 +21,21 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-#hwc36lsm@2vj#2p)k4pm@-u#3bi#(e_5gal@efxh&p84r%uj2'
+SECRET_KEY = os.environ.get(
+    'DJANGO_SECRET_KEY',
+    'django-insecure-#hwc36lsm@2vj#2p)k4pm@-u#3bi#(e_5gal@efxh&p84r%uj2'
+)
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# run_production.sh sets DJANGO_DEBUG=false
+DEBUG = os.environ.get('DJANGO_DEBUG', 'true').lower() in ('1', 'true', 'yes')
 
-# Allow connections from any host in development
-ALLOWED_HOSTS = ['*'] if DEBUG else ['localhost', '127.0.0.1']
+# Allow connections from any host in development. In production set
+# DJANGO_ALLOWED_HOSTS to a comma-separated list, e.g. "192.168.0.57,books.lan"
+if os.environ.get('DJANGO_ALLOWED_HOSTS'):
+    ALLOWED_HOSTS = [host.strip() for host in os.environ['DJANGO_ALLOWED_HOSTS'].split(',') if host.strip()]
+else:
+    ALLOWED_HOSTS = ['*'] if DEBUG else ['localhost', '127.0.0.1']
 
 # Application definition
 
@@ -77,12 +85,64 @@ WSGI_APPLICATION = 'backwyrm.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Configured from the environment. SQLite is the default; set
+# DATABASE_ENGINE=postgresql (with DATABASE_NAME, DATABASE_USER,
+# DATABASE_PASSWORD, DATABASE_HOST and DATABASE_PORT) for PostgreSQL.
+DATABASE_ENGINE = os.environ.get('DATABASE_ENGINE', 'sqlite3')
+
+if DATABASE_ENGINE in ('postgresql', 'postgres'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DATABASE_NAME', 'backwyrm'),
+            'USER': os.environ.get('DATABASE_USER', 'backwyrm'),
+            'PASSWORD': os.environ.get('DATABASE_PASSWORD', ''),
+            'HOST': os.environ.get('DATABASE_HOST', 'localhost'),
+            'PORT': os.environ.get('DATABASE_PORT', '5432'),
+            # Keep connections open between requests instead of reconnecting
+            # every time, checking they still work before reuse
+            'CONN_MAX_AGE': int(os.environ.get('DATABASE_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    # DATABASE_POOL_SIZE > 0 uses a psycopg connection pool (needs
+    # psycopg[pool]) shared by the threads of a process instead. Pooled
+    # connections are returned to the pool after each request, so
+    # CONN_MAX_AGE has to be 0.
+    DATABASE_POOL_SIZE = int(os.environ.get('DATABASE_POOL_SIZE', '0'))
+    if DATABASE_POOL_SIZE > 0:
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': 1,
+            'max_size': DATABASE_POOL_SIZE,
+            'timeout': 10,
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DATABASE_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': int(os.environ.get('DATABASE_CONN_MAX_AGE', '60')),
+            'OPTIONS': {
+                # Write transactions take the write lock when they begin, so
+                # they queue up on the busy timeout instead of failing with
+                # "database is locked" when upgrading from a read
+                'transaction_mode': 'IMMEDIATE',
+                # Seconds to wait for a lock held by another connection
+                'timeout': int(os.environ.get('DATABASE_BUSY_TIMEOUT', '20')),
+                # Run on every new connection. WAL lets readers carry on while
+                # a write is in progress, and synchronous=NORMAL is safe in
+                # WAL mode while only syncing at checkpoints. Reads go through
+                # a 256 MB memory map instead of read() calls.
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    'PRAGMA mmap_size=268435456;'
+                ),
+            },
+        }
     }
-}
 
 
 # Password validation
@@ -120,6 +180,9 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
 STATIC_URL = 'static/'
+# collectstatic target for the admin's static files. In production the web
+# server in front serves STATIC_URL from here; gunicorn doesn't
+STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -166,6 +229,58 @@ CORS_ALLOWED_ORIGINS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# How media files are served:
+#   'app'              - Django streams them (sendfile() under most WSGI servers)
+#   'x-accel-redirect' - Django checks the request, nginx sends the file from
+#                        an internal location at MEDIA_ACCEL_REDIRECT_PREFIX
+#   'x-sendfile'       - Django checks the request, Apache/lighttpd send the file
+#   'none'             - the web server serves MEDIA_URL itself
+MEDIA_SERVE_MODE = 'app'
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+
+# Longest edge in pixels of the thumbnails generated for each book photo,
+# and how many background threads render them
+BOOK_PHOTO_SIZES = {
+    'small': 200,
+    'medium': 600,
+}
+BOOK_PHOTO_WORKERS = 2
+
+# Upload limits for book photos. Byte limits are checked while streaming and
+# the pixel limit is checked from the image header before anything is decoded.
+# Resumable uploads keep their partial files in BOOK_PHOTO_UPLOAD_DIR.
+BOOK_PHOTO_MAX_BYTES = 20 * 1024 * 1024
+BOOK_PHOTO_MAX_PIXELS = 50_000_000
+BOOK_PHOTO_CHUNK_BYTES = 1024 * 1024
+BOOK_PHOTO_UPLOAD_DIR = os.path.join(BASE_DIR, 'upload_sessions')
+BOOK_PHOTO_UPLOAD_EXPIRY_HOURS = 24
+
+# Book covers are looked up on the server through this fetcher (any
+# books.covers.CoverFetcher subclass; None turns lookups off), up to
+# BOOK_COVER_WORKERS at a time, and cached. Lookups that find nothing are
+# retried after BOOK_COVER_MISSING_TTL_DAYS, and ones that fail (timeouts,
+# server errors) after BOOK_COVER_RETRY_HOURS. Off while DEBUG is on unless
+# DJANGO_BOOK_COVER_FETCHER names a fetcher, so development and tests don't
+# call out to Open Library.
+BOOK_COVER_FETCHER = os.environ.get(
+    'DJANGO_BOOK_COVER_FETCHER',
+    '' if DEBUG else 'books.covers.OpenLibraryCoverFetcher'
+) or None
+BOOK_COVER_WORKERS = 2
+BOOK_COVER_MISSING_TTL_DAYS = 30
+BOOK_COVER_RETRY_HOURS = 6
+
+# Edition metadata for /api/metadata/isbn/ is looked up through this client
+# (any books.metadata.MetadataClient subclass; None turns lookups off), up
+# to ISBN_METADATA_WORKERS at a time, and cached in the database. A request
+# waits at most ISBN_METADATA_TIMEOUT seconds for upstream lookups.
+ISBN_METADATA_CLIENT = 'books.metadata.OpenLibraryMetadataClient'
+ISBN_METADATA_WORKERS = 8
+ISBN_METADATA_TIMEOUT = 20
+ISBN_METADATA_REFRESH_DAYS = 180
+ISBN_METADATA_MISSING_TTL_DAYS = 30
+ISBN_METADATA_RETRY_HOURS = 6
+
 # Add these lines for better handling of multipart form data
 REST_FRAMEWORK = {
     'DEFAULT_PARSER_CLASSES': [
@@ -175,3 +290,14 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Serve the book, genre and reading stats reads with async views. Only
+# worth it under ASGI, so backwyrm/asgi.py turns it on.
+BOOKS_ASYNC_VIEWS = os.environ.get('BOOKS_ASYNC_VIEWS', 'false').lower() in ('1', 'true', 'yes')
+
+# Cursor pagination for book lists (used when the client sends ?page_size= or ?cursor=)
+BOOKS_PAGE_SIZE = 50
+BOOKS_MAX_PAGE_SIZE = 500
+
+# Days to keep records of permanently deleted books for /api/books/changes/.
+# Sync tokens older than this are rejected and the client has to resync fully.
+BOOKS_TOMBSTONE_DAYS = 90
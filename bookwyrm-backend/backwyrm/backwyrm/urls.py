@@ -15,20 +15,34 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+import re
+from django.urls import path, include, re_path
 from rest_framework import routers
-from books.views import BookViewSet
+from books.views import BookPhotoViewSet, BookViewSet, GenreViewSet, IsbnMetadataView, ReadingCalendarView, ReadingStatsView
 from django.conf import settings
-from django.conf.urls.static import static
+from books.media import serve_media
+from books.async_views import async_reads
 
 router = routers.DefaultRouter()
 router.register(r'books', BookViewSet, basename='book') # API endpoint for books
+router.register(r'genres', GenreViewSet, basename='genre') # API endpoint for genres
+router.register(r'book-photos', BookPhotoViewSet, basename='book-photo') # API endpoint for photos
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include(router.urls)),  # Include the router URLs under the 'api/' path
+    path('api/reading-stats/', ReadingStatsView.as_view(), name='reading-stats'),
+    path('api/reading-stats/calendar/', ReadingCalendarView.as_view(), name='reading-calendar'),
+    path('api/metadata/isbn/', IsbnMetadataView.as_view(), name='isbn-metadata'),
 ]
 
-# Add this to serve media files during development
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+# Serve media files (book photos) unless the web server in front does it
+# directly; see MEDIA_SERVE_MODE in settings
+if settings.MEDIA_SERVE_MODE != 'none':
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.+)$' % re.escape(settings.MEDIA_URL.lstrip('/')), serve_media),
+    ]
+
+# Under ASGI, serve the hot read endpoints with async views
+if settings.BOOKS_ASYNC_VIEWS:
+    urlpatterns = async_reads(urlpatterns)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class BooksConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'books'
+
+    def ready(self):
+        # Registers the search index system check
+        from . import search  # noqa: F401
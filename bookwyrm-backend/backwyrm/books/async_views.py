@@ -0,0 +1,118 @@
+"""
+Async read path for serving under ASGI.
+
+The hot read endpoints (book list and detail, genre list and detail, and
+reading stats) have async handlers next to their regular ones, named after
+the action with an ``a`` in front (``alist``, ``aretrieve``, ``aget``), which
+load rows with Django's async ORM methods. Views that mix in AsyncReadMixin
+send GET requests to the async handler when built with ``async_reads=True``,
+so a request waiting on the database doesn't hold a worker thread, and run
+everything else through DRF's regular dispatch() in a thread.
+
+Under WSGI an async view would only add an event loop to every request, so
+the URLconf only swaps these in when BOOKS_ASYNC_VIEWS is set, which
+backwyrm/asgi.py does.
+"""
+from asgiref.sync import markcoroutinefunction, sync_to_async
+from django.http import HttpResponse
+from django.urls import URLPattern, URLResolver
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+class AsyncReadMixin:
+    """
+    Serve GET requests of an APIView or viewset from its async handler.
+
+    Off unless the view is built with ``as_view(..., async_reads=True)``;
+    async_reads() does that for the URL patterns that have an async handler.
+    Requests go through the same DRF steps as dispatch(): content
+    negotiation, authentication, permissions and throttling in initial(),
+    errors through handle_exception() and headers in finalize_response().
+    """
+    async_reads = False
+
+    @classmethod
+    def async_handler_name(cls, actions=None):
+        """Get the name of the async GET handler for a viewset's actions (or an APIView), or None"""
+        action = actions.get('get') if actions is not None else 'get'
+        name = f'a{action}' if action else None
+        return name if name and hasattr(cls, name) else None
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.async_reads:
+            return super().dispatch(request, *args, **kwargs)
+        if request.method in READ_METHODS:
+            return self.adispatch(request, *args, **kwargs)
+        return sync_to_async(super().dispatch)(request, *args, **kwargs)
+
+    async def adispatch(self, request, *args, **kwargs):
+        """dispatch() for reads, awaiting the async handler"""
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            # Authentication may look the session up in the database
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if isinstance(request.accepted_renderer, JSONRenderer):
+                handler = getattr(self, self.async_handler_name(getattr(self, 'action_map', None)))
+                response = await handler(request, *args, **kwargs)
+            else:
+                # The browsable API queries the database while rendering,
+                # so it keeps the regular handler
+                handler = getattr(self, request.method.lower())
+                response = await sync_to_async(handler)(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        if not isinstance(self.response, Response) or not isinstance(self.response.accepted_renderer, JSONRenderer):
+            # Django renders template responses in a thread
+            return self.response
+        # JSON can be rendered here, and the result handed back as a plain
+        # response so Django doesn't hop to a thread to render it
+        self.response.render()
+        rendered = HttpResponse(self.response.content, status=self.response.status_code, headers=self.response.headers)
+        rendered.cookies = self.response.cookies
+        return rendered
+
+
+def async_view(callback):
+    """
+    Rebuild a DRF view function with async reads turned on. Returns the
+    callback unchanged if the view doesn't have an async handler.
+    """
+    cls = getattr(callback, 'cls', None)
+    if cls is None or not issubclass(cls, AsyncReadMixin):
+        return callback
+    actions = getattr(callback, 'actions', None)
+    if not cls.async_handler_name(actions):
+        return callback
+
+    if actions is not None:
+        view = cls.as_view(dict(actions), **callback.initkwargs, async_reads=True)
+    else:
+        view = cls.as_view(**callback.initkwargs, async_reads=True)
+    # dispatch() returns a coroutine for every request now
+    return markcoroutinefunction(view)
+
+
+def async_reads(patterns):
+    """Swap async_view() into every URL pattern, including nested ones, that has async reads"""
+    swapped = []
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            pattern = URLResolver(
+                pattern.pattern, async_reads(pattern.url_patterns), pattern.default_kwargs,
+                pattern.app_name, pattern.namespace
+            )
+        elif isinstance(pattern, URLPattern):
+            pattern = URLPattern(pattern.pattern, async_view(pattern.callback), pattern.default_args, pattern.name)
+        swapped.append(pattern)
+    return swapped
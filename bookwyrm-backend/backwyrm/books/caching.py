@@ -0,0 +1,191 @@
+import hashlib
+import threading
+import time
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+from django.http import Http404
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+
+# name -> (version, when it was read), for get_cache_version(max_age=...)
+_versions = {}
+_versions_lock = threading.Lock()
+
+
+def get_cache_version(name, max_age=0):
+    """
+    Get the shared version of an in-process cache. Whichever process writes
+    the data behind a cache bumps its version, so every worker process
+    knows to reload its own copy. With max_age, a version read less than
+    that many seconds ago is reused instead of asking the database again.
+    """
+    from .models import CacheVersion
+
+    if max_age:
+        version = peek_cache_version(name, max_age)
+        if version is not None:
+            return version
+
+    now = time.monotonic()
+    version = CacheVersion.objects.filter(name=name).values_list('version', flat=True).first() or 0
+    with _versions_lock:
+        _versions[name] = (version, now)
+    return version
+
+
+def peek_cache_version(name, max_age):
+    """
+    Get the version of a cache if it was read less than max_age seconds ago,
+    else None. Never queries, so async code can call it.
+    """
+    with _versions_lock:
+        remembered = _versions.get(name)
+    if remembered and time.monotonic() - remembered[1] < max_age:
+        return remembered[0]
+    return None
+
+
+def bump_cache_version(name, using='default'):
+    """
+    Tell every process to reload an in-process cache. Call it after writing
+    the data behind the cache: the shared version is only bumped once the
+    write has committed (straight away in autocommit), so no process can
+    load the old data and keep it under the new version.
+    """
+    transaction.on_commit(lambda: increment_cache_version(name, using), using=using)
+    forget_cache_version(name)
+
+
+def increment_cache_version(name, using='default'):
+    from .models import CacheVersion
+
+    versions = CacheVersion.objects.using(using)
+    if not versions.filter(name=name).update(version=F('version') + 1):
+        versions.get_or_create(name=name)
+        versions.filter(name=name).update(version=F('version') + 1)
+    forget_cache_version(name)
+
+
+def forget_cache_version(name):
+    """Make the next get_cache_version() in this process read the version again"""
+    with _versions_lock:
+        _versions.pop(name, None)
+
+
+def make_etag(*parts):
+    """Build a short quoted ETag from the given validator parts"""
+    digest = hashlib.md5(':'.join(str(part) for part in parts).encode('utf-8'), usedforsecurity=False)
+    return quote_etag(digest.hexdigest())
+
+
+class ConditionalGetMixin:
+    """
+    Conditional GET support for the list and retrieve actions of a viewset.
+
+    Subclasses must provide ``get_list_validators(queryset)`` and
+    ``get_object_validators(obj)``, each returning an ``(etag, last_modified)``
+    pair that is cheap to compute and changes whenever anything in the
+    response does, nested objects included. When the client's ``If-None-Match`` or
+    ``If-Modified-Since`` header still matches, a ``304 Not Modified`` is
+    returned without serializing anything.
+
+    ``alist`` and ``aretrieve`` do the same with the async ORM, for serving
+    under ASGI (see books.async_views); they need ``aget_list_validators``
+    too, and an object validator that doesn't query.
+    """
+
+    def not_modified(self, request, etag, last_modified):
+        """Get a 304 response if the client's copy is current, else None"""
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is not None:
+            return self.add_validators(response, etag, last_modified)
+        return None
+
+    def add_validators(self, response, etag, last_modified):
+        """Attach the validators and ask clients to revalidate before reuse"""
+        if etag:
+            response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        patch_cache_control(response, no_cache=True)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        etag, last_modified = self.get_list_validators(queryset)
+
+        response = self.not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+
+        response = super().list(request, *args, **kwargs)
+        return self.add_validators(response, etag, last_modified)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag, last_modified = self.get_object_validators(instance)
+
+        response = self.not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+
+        serializer = self.get_serializer(instance)
+        return self.add_validators(Response(serializer.data), etag, last_modified)
+
+    async def aget_object(self):
+        """get_object() for async handlers"""
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except queryset.model.DoesNotExist:
+            raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+        except (TypeError, ValueError, ValidationError):
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    async def apaginate_queryset(self, queryset):
+        if self.paginator is None:
+            return None
+        return await self.paginator.apaginate_queryset(queryset, self.request, view=self)
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        etag, last_modified = await self.aget_list_validators(queryset)
+
+        response = self.not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            serializer = await self.aget_serializer(page, many=True)
+            response = self.get_paginated_response(serializer.data)
+        else:
+            serializer = await self.aget_serializer([obj async for obj in queryset], many=True)
+            response = Response(serializer.data)
+        return self.add_validators(response, etag, last_modified)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        etag, last_modified = self.get_object_validators(instance)
+
+        response = self.not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+
+        serializer = await self.aget_serializer(instance)
+        return self.add_validators(Response(serializer.data), etag, last_modified)
+
+    async def aget_serializer(self, *args, **kwargs):
+        """get_serializer() for async handlers, running any queries the serializer needs up front"""
+        serializer = self.get_serializer(*args, **kwargs)
+        if hasattr(serializer, 'aload'):
+            await serializer.aload()
+        return serializer
@@ -0,0 +1,230 @@
+"""
+Server-side book cover lookup.
+
+Covers are looked up once per ISBN and per normalized title/author through
+the fetcher named by BOOK_COVER_FETCHER, and the results are kept in
+BookCover: the image (plus the usual thumbnails) in MEDIA_ROOT for hits,
+and an expiry time for misses and failures. Books point at their cover, so
+serving cover_url never calls out to the network.
+"""
+import abc
+import json
+import logging
+import re
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import ValidationError
+
+from .thumbnails import generate_derivatives
+from .upstream import UpstreamError, http_get
+from .uploads import PayloadTooLarge, max_photo_bytes, store_photo
+
+logger = logging.getLogger(__name__)
+
+# Book fields a cover is looked up by
+COVER_FIELDS = ('isbn', 'title', 'author')
+
+KEY_MAX_LENGTH = 255
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class CoverFetchError(UpstreamError):
+    """A lookup failed in a way worth retrying later, e.g. a timeout"""
+
+
+class CoverFetcher(abc.ABC):
+    """
+    Finds cover images for books. Subclasses implement fetch(), which gets
+    either an ISBN or a title and author, and returns a (image bytes,
+    source URL) pair, None if there is no cover, or raises CoverFetchError
+    (or any UpstreamError).
+    """
+
+    @abc.abstractmethod
+    def fetch(self, isbn=None, title=None, author=None):
+        pass
+
+
+class OpenLibraryCoverFetcher(CoverFetcher):
+    """Look covers up on Open Library, the same way the mobile app used to"""
+    search_url = 'https://openlibrary.org/search.json'
+    cover_url = 'https://covers.openlibrary.org/b/{kind}/{value}-L.jpg?default=false'
+    timeout = 10
+
+    def fetch(self, isbn=None, title=None, author=None):
+        if isbn:
+            return self.download(self.cover_url.format(kind='isbn', value=isbn))
+
+        query = urlencode({'title': title, 'author': author or '', 'limit': 1})
+        try:
+            docs = json.loads(self.get(f'{self.search_url}?{query}') or b'{}').get('docs') or []
+        except ValueError:
+            raise CoverFetchError('Open Library search returned invalid JSON')
+        if not docs:
+            return None
+        # Same identifiers, in the same order, as the mobile lookup tried
+        if docs[0].get('cover_i'):
+            return self.download(self.cover_url.format(kind='id', value=docs[0]['cover_i']))
+        for kind in ('isbn', 'oclc', 'lccn'):
+            if docs[0].get(kind):
+                return self.download(self.cover_url.format(kind=kind, value=docs[0][kind][0]))
+        return None
+
+    def download(self, url):
+        content = self.get(url)
+        return (content, url) if content else None
+
+    def get(self, url):
+        return http_get(url, timeout=self.timeout, max_bytes=max_photo_bytes())
+
+
+def get_fetcher():
+    """Get the configured cover fetcher, or None if lookups are turned off"""
+    path = getattr(settings, 'BOOK_COVER_FETCHER', None)
+    return import_string(path)() if path else None
+
+
+def normalize(text):
+    """
+    Normalize text for cover keys: accents, case, punctuation and extra
+    whitespace are dropped, so "The Hobbit " and "the hobbit" match
+    """
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(re.sub(r'[^\w\s]', ' ', text.lower()).split())
+
+
+def normalize_isbn(isbn):
+    return re.sub(r'[^0-9X]', '', (isbn or '').upper())
+
+
+def cover_lookups(isbn, title, author):
+    """
+    Get the (key, fetch arguments) pairs to try for a book, best first:
+    by ISBN if it has one, then by title and author
+    """
+    lookups = []
+    isbn = normalize_isbn(isbn)
+    if isbn:
+        lookups.append((f'isbn:{isbn}', {'isbn': isbn}))
+    if normalize(title):
+        key = f'work:{normalize(title)}|{normalize(author)}'[:KEY_MAX_LENGTH]
+        lookups.append((key, {'title': title, 'author': author}))
+    return lookups
+
+
+def fetch_cover(key, lookup, fetcher):
+    """Run one lookup through the fetcher and cache the outcome under key"""
+    from .models import BookCover
+
+    now = timezone.now()
+    values = {'status': BookCover.MISSING, 'image': '', 'source_url': ''}
+    try:
+        result = fetcher.fetch(**lookup)
+        if result is not None:
+            content, source_url = result
+            storage = BookCover._meta.get_field('image').storage
+            name = store_photo(File(BytesIO(content)), storage, directory='covers')
+            generate_derivatives(name, storage)
+            values = {'status': BookCover.FOUND, 'image': name, 'source_url': source_url[:500]}
+    except UpstreamError as e:
+        logger.warning(f"Cover lookup for {key} failed: {e}")
+        values['status'] = BookCover.FAILED
+    except (ValidationError, PayloadTooLarge):
+        # Whatever came back wasn't a usable image
+        pass
+
+    if values['status'] == BookCover.FOUND:
+        values['expires_at'] = None
+    elif values['status'] == BookCover.MISSING:
+        values['expires_at'] = now + timedelta(days=getattr(settings, 'BOOK_COVER_MISSING_TTL_DAYS', 30))
+    else:
+        values['expires_at'] = now + timedelta(hours=getattr(settings, 'BOOK_COVER_RETRY_HOURS', 6))
+
+    cover, _ = BookCover.objects.update_or_create(key=key, defaults=values)
+    return cover
+
+
+def resolve_cover(book_id, fetcher=None):
+    """
+    Find the cover for a book, from the cache where possible, and point
+    the book at it. Only lookups missing from the cache, or whose negative
+    result has expired, go through the fetcher.
+    """
+    from .models import Book, BookCover
+
+    fetcher = fetcher or get_fetcher()
+    book = Book.objects.filter(pk=book_id).values('isbn', 'title', 'author', 'cover_id', 'cover__key').first()
+    if book is None or fetcher is None:
+        return None
+
+    lookups = cover_lookups(book['isbn'], book['title'], book['author'])
+    if book['cover_id'] and book['cover__key'] == (lookups[0][0] if lookups else None):
+        # Already has the best cover there is
+        return book['cover_id']
+
+    now = timezone.now()
+    cached = {cover.key: cover for cover in BookCover.objects.filter(key__in=[key for key, _ in lookups])}
+    cover = None
+    for key, lookup in lookups:
+        entry = cached.get(key)
+        if entry is None or entry.is_stale(now):
+            entry = fetch_cover(key, lookup, fetcher)
+        if entry.status == BookCover.FOUND:
+            cover = entry
+            break
+
+    cover_id = cover.pk if cover else None
+    if cover_id != book['cover_id']:
+        # update() skips auto_now; the new cover has to reach synced clients
+        Book.objects.filter(pk=book_id).update(cover=cover, updated_at=timezone.now())
+    return cover_id
+
+
+def resolve_covers_in_worker(book_ids):
+    try:
+        for book_id in book_ids:
+            try:
+                resolve_cover(book_id)
+            except Exception:
+                logger.exception(f"Failed to resolve the cover of book {book_id}")
+    finally:
+        # Worker threads don't go through the request cycle that normally
+        # closes connections
+        connection.close()
+
+
+def get_executor():
+    """
+    Get the thread pool cover lookups run in. It is separate from the
+    thumbnail pool, so slow lookups can't hold up thumbnails.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'BOOK_COVER_WORKERS', 2),
+                    thread_name_prefix='book-cover'
+                )
+    return _executor
+
+
+def schedule_covers(book_ids):
+    """Queue cover lookups for books once the current transaction commits"""
+    if not getattr(settings, 'BOOK_COVER_FETCHER', None):
+        return
+    book_ids = list(book_ids)
+    transaction.on_commit(lambda: get_executor().submit(resolve_covers_in_worker, book_ids))
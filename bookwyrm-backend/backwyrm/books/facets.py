@@ -0,0 +1,98 @@
+"""
+Library dashboard counts.
+
+The book counts come from a single aggregate query over Book using
+conditional Count(filter=Q(...)), and the label counts from one grouped
+query over BookLabel. The result is cached in-process under a shared cache
+version that is bumped whenever books are written; see the BookQuerySet and
+Book signal hooks in models.
+"""
+import threading
+
+from django.db.models import Count, Q
+
+from .caching import bump_cache_version, get_cache_version
+
+
+# Reading status flags counted among the books not in trash
+STATUS_FIELDS = (
+    'favorite',
+    'is_read',
+    'toBeRead',
+    'shelved',
+    'currently_reading',
+    'did_not_finish',
+    'recommended_to_me',
+)
+
+FACETS_CACHE = 'facets'
+
+_facets = None
+_facets_lock = threading.Lock()
+
+
+def count_facets(genre_codes):
+    """
+    Count books by status and by each of the given genre codes in one query,
+    and books per label in another
+    """
+    from .models import Book, BookLabel, Label
+
+    active = Q(is_deleted=False)
+    aggregates = {
+        'total': Count('id', filter=active),
+        'trash': Count('id', filter=Q(is_deleted=True)),
+    }
+    for field in STATUS_FIELDS:
+        aggregates[f'status_{field}'] = Count('id', filter=active & Q(**{field: True}))
+    for index, code in enumerate(genre_codes):
+        aggregates[f'genre_{index}'] = Count('id', filter=active & Q(genre=code))
+
+    counts = Book.objects.order_by().aggregate(**aggregates)
+
+    labels = {kind: {} for kind, _ in Label.KIND_CHOICES}
+    label_counts = BookLabel.objects.filter(book__is_deleted=False).order_by().values(
+        'label__kind', 'label__name'
+    ).annotate(count=Count('book_id')).values_list('label__kind', 'label__name', 'count')
+    for kind, name, count in label_counts:
+        labels[kind][name] = count
+
+    return {
+        'total': counts['total'],
+        'trash': counts['trash'],
+        'status': {field: counts[f'status_{field}'] for field in STATUS_FIELDS},
+        'genres': {code: counts[f'genre_{index}'] for index, code in enumerate(genre_codes)},
+        'labels': labels,
+    }
+
+
+def get_facets():
+    """
+    Get the dashboard counts, e.g. {"total": 120, "trash": 3, "status":
+    {"favorite": 12, ...}, "genres": {"fantasy": 30, ...}, "labels": {"tag":
+    {"cozy": 4, ...}, "vibe": {...}, "genre": {...}}}
+    """
+    from .models import get_genre_names
+
+    global _facets
+    # Read before counting, so a write that lands during the count leaves
+    # the result under an older version than the next reader will see
+    version = get_cache_version(FACETS_CACHE)
+    # A genre added since the counts were cached needs a count of its own
+    genre_codes = tuple(sorted(get_genre_names()))
+    cached = _facets
+    if cached is not None and cached[0] == (version, genre_codes):
+        return cached[1]
+
+    facets = count_facets(genre_codes)
+    with _facets_lock:
+        _facets = ((version, genre_codes), facets)
+    return facets
+
+
+def clear_facets(using='default'):
+    """Drop the cached counts in every process after a write to Book"""
+    global _facets
+    bump_cache_version(FACETS_CACHE, using=using)
+    with _facets_lock:
+        _facets = None
@@ -0,0 +1,114 @@
+from decimal import Decimal, InvalidOperation
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+
+from .labels import labelled
+from .pagination import ordering_expressions
+
+
+TRUE_VALUES = {'true', '1', 'yes'}
+FALSE_VALUES = {'false', '0', 'no'}
+
+
+class BookFilter(BaseFilterBackend):
+    """
+    Filter books by reading status, genre, language, labels and rating using
+    query parameters, e.g. ``/api/books/?favorite=true&genre=fantasy,sci-fi&rating_min=4``
+    or ``/api/books/?tag=cozy&vibe=dark academia``
+    """
+    boolean_fields = (
+        'favorite',
+        'is_read',
+        'toBeRead',
+        'shelved',
+        'currently_reading',
+        'did_not_finish',
+        'recommended_to_me',
+    )
+    list_fields = ('genre', 'language')
+    # Query parameter -> Label kind, looked up through the label index
+    label_fields = {
+        'additional_genre': 'genre',
+        'tag': 'tag',
+        'vibe': 'vibe',
+    }
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+
+        for field in self.boolean_fields:
+            if field in params:
+                queryset = queryset.filter(**{field: self.parse_boolean(field, params[field])})
+
+        # Comma-separated values match any of the given genres or languages
+        for field in self.list_fields:
+            values = self.parse_list(params.get(field, ''))
+            if len(values) == 1:
+                queryset = queryset.filter(**{field: values[0]})
+            elif values:
+                queryset = queryset.filter(**{f'{field}__in': values})
+
+        # ...and any of the given additional genres, tags or vibes
+        for param, kind in self.label_fields.items():
+            values = self.parse_list(params.get(param, ''))
+            if values:
+                queryset = queryset.filter(id__in=labelled(kind, values, using=queryset.db))
+
+        if params.get('rating_min'):
+            queryset = queryset.filter(rating__gte=self.parse_decimal('rating_min', params['rating_min']))
+        if params.get('rating_max'):
+            queryset = queryset.filter(rating__lte=self.parse_decimal('rating_max', params['rating_max']))
+
+        return queryset
+
+    def parse_list(self, value):
+        return [item.strip() for item in value.split(',') if item.strip()]
+
+    def parse_boolean(self, name, value):
+        value = value.strip().lower()
+        if value in TRUE_VALUES:
+            return True
+        if value in FALSE_VALUES:
+            return False
+        raise ValidationError({name: f"Expected true or false, got '{value}'."})
+
+    def parse_decimal(self, name, value):
+        try:
+            number = Decimal(value)
+        except InvalidOperation:
+            number = None
+        # NaN and infinities parse, but can't be compared with a rating
+        if number is None or not number.is_finite():
+            raise ValidationError({name: f"Expected a number, got '{value}'."})
+        return number
+
+
+class BookOrderingFilter(OrderingFilter):
+    """
+    Order books with ``?ordering=`` (e.g. ``?ordering=-rating,title``).
+
+    The primary key is appended as a tie-breaker and the chosen ordering is
+    handed to the cursor paginator, so ordered results can still be paged.
+    """
+    ordering_fields = [
+        'title',
+        'author',
+        'rating',
+        'created_at',
+        'updated_at',
+        'deleted_at',
+        'publication_date',
+        'page_count',
+    ]
+
+    def filter_queryset(self, request, queryset, view):
+        ordering = self.get_ordering(request, queryset, view)
+        if not ordering:
+            return queryset
+
+        ordering = list(ordering)
+        if ordering[-1].lstrip('-') not in ('id', 'pk'):
+            ordering.append('id')
+        view.cursor_ordering = ordering
+        return queryset.order_by(*ordering_expressions(queryset.model, ordering))
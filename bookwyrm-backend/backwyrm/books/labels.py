@@ -0,0 +1,125 @@
+"""
+Normalized labels for the comma-separated Book fields.
+
+additional_genres, tags and vibes are still stored and served as strings,
+and every write to them is mirrored into Label/BookLabel rows so filters
+and facet counts can use indexed lookups instead of LIKE scans.
+"""
+from django.apps import apps as global_apps
+
+
+# Book field -> Label kind
+LABEL_FIELDS = {
+    'additional_genres': 'genre',
+    'tags': 'tag',
+    'vibes': 'vibe',
+}
+
+NAME_MAX_LENGTH = 255
+
+
+def split_labels(value):
+    """
+    Split a comma-separated field into label names, e.g.
+    "Cozy, dark academia,,cozy" -> ['cozy', 'dark academia']
+    """
+    names = []
+    for part in (value or '').split(','):
+        name = part.strip().lower()[:NAME_MAX_LENGTH]
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def sync_labels(book_ids, using='default', apps=None):
+    """
+    Bring the BookLabel rows of the given books in line with their string
+    fields, creating any labels that don't exist yet and removing the ones
+    no book uses any more. Takes a fixed number of queries however many
+    books are passed.
+    """
+    apps = apps or global_apps
+    Book = apps.get_model('books', 'Book')
+    Label = apps.get_model('books', 'Label')
+    BookLabel = apps.get_model('books', 'BookLabel')
+
+    book_ids = list(book_ids)
+    if not book_ids:
+        return
+
+    rows = Book.objects.using(using).filter(id__in=book_ids).order_by().values_list('id', *LABEL_FIELDS)
+    wanted = set()
+    for book_id, *values in rows:
+        for kind, value in zip(LABEL_FIELDS.values(), values):
+            wanted.update((book_id, kind, name) for name in split_labels(value))
+
+    label_keys = {(kind, name) for _, kind, name in wanted}
+    label_ids = get_label_ids(Label, label_keys, using)
+    missing = label_keys - set(label_ids)
+    if missing:
+        Label.objects.using(using).bulk_create(
+            [Label(kind=kind, name=name) for kind, name in missing],
+            ignore_conflicts=True
+        )
+        label_ids.update(get_label_ids(Label, missing, using))
+
+    target = {(book_id, label_ids[(kind, name)]) for book_id, kind, name in wanted}
+    links = BookLabel.objects.using(using)
+    current = {
+        (book_id, label_id): link_id
+        for link_id, book_id, label_id in links.filter(book_id__in=book_ids).values_list('id', 'book_id', 'label_id')
+    }
+
+    stale = {key: link_id for key, link_id in current.items() if key not in target}
+    if stale:
+        links.filter(id__in=stale.values()).delete()
+
+    added = target - set(current)
+    links.bulk_create(
+        [BookLabel(book_id=book_id, label_id=label_id) for book_id, label_id in added],
+        ignore_conflicts=True
+    )
+    if stale or added:
+        clear_label_facets(using, apps)
+    remove_unused_labels({label_id for _, label_id in stale}, using=using, apps=apps)
+
+
+def remove_unused_labels(label_ids, using='default', apps=None):
+    """Delete those of the given labels that no book has any more"""
+    apps = apps or global_apps
+    Label = apps.get_model('books', 'Label')
+    if label_ids:
+        deleted, _ = Label.objects.using(using).filter(id__in=label_ids, book_labels__isnull=True).delete()
+        if deleted:
+            clear_label_facets(using, apps)
+
+
+def clear_label_facets(using, apps):
+    """Drop the cached facet counts, which include books per label"""
+    from .facets import clear_facets
+    # Migrations pass their historical apps and have no cached counts
+    if apps is global_apps:
+        clear_facets(using=using)
+
+
+def get_label_ids(Label, keys, using):
+    """Get a (kind, name) -> id map for the given label keys that exist"""
+    if not keys:
+        return {}
+    rows = Label.objects.using(using).filter(
+        kind__in={kind for kind, _ in keys},
+        name__in={name for _, name in keys}
+    ).order_by().values_list('kind', 'name', 'id')
+    return {(kind, name): label_id for kind, name, label_id in rows if (kind, name) in keys}
+
+
+def labelled(kind, names, using='default'):
+    """
+    Get a subquery of the ids of books with any of the given labels, to
+    filter on with ``id__in``
+    """
+    from .models import BookLabel
+    names = [name.strip().lower() for name in names]
+    return BookLabel.objects.using(using).filter(
+        label__kind=kind, label__name__in=names
+    ).values('book_id')
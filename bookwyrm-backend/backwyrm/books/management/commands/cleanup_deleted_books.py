@@ -1,8 +1,12 @@
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from datetime import timedelta
-from books.models import Book
+from books.models import Book, BookTombstone, PhotoUpload
+from books.uploads import remove_upload_sessions, upload_session_dir
 import logging
+import os
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -21,45 +25,97 @@ class Command(BaseCommand):
             action='store_true',
             help='Perform a dry run without actually deleting anything'
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of books to delete per transaction (default: 500)'
+        )
 
     def handle(self, *args, **options):
         days = options['days']
         dry_run = options['dry_run']
-        
+        batch_size = max(1, options['batch_size'])
+
         # Calculate the cutoff date
         cutoff_date = timezone.now() - timedelta(days=days)
-        
+
         # Get books deleted before the cutoff date
         books_to_delete = Book.objects.filter(
             is_deleted=True,
             deleted_at__lt=cutoff_date
         )
-        
+
         count = books_to_delete.count()
-        
+
+        if not dry_run:
+            self.prune_tombstones()
+            self.prune_upload_sessions()
+
         if count == 0:
             self.stdout.write(self.style.SUCCESS('No books to delete.'))
             return
-            
+
         if dry_run:
             self.stdout.write(
                 self.style.WARNING(f'DRY RUN: Would delete {count} books that were soft-deleted more than {days} days ago')
             )
-            for book in books_to_delete:
+            for book in books_to_delete.only('title', 'author', 'deleted_at').iterator():
                 deleted_days = (timezone.now() - book.deleted_at).days
                 self.stdout.write(f' - "{book.title}" by {book.author} (deleted {deleted_days} days ago)')
         else:
-            for book in books_to_delete:
-                book_title = book.title
-                book_author = book.author
-                deleted_days = (timezone.now() - book.deleted_at).days
-                
-                # Log before deletion to ensure we have a record
-                logger.info(f'Permanently deleting book: "{book_title}" by {book_author} (deleted {deleted_days} days ago)')
-                
-                # Permanently delete the book
-                book.delete()
-            
+            # Delete in batches so each transaction (and the SQLite write lock)
+            # stays short; every batch removes its books, their photo rows and
+            # then the photo files
+            deleted = 0
+            started = time.monotonic()
+            while True:
+                batch_count = books_to_delete.order_by('id')[:batch_size].purge()
+                if batch_count == 0:
+                    break
+                deleted += batch_count
+
+                elapsed = time.monotonic() - started
+                logger.info(f'Permanently deleted {deleted}/{count} books ({deleted / elapsed if elapsed else 0:.0f} rows/s)')
+
+            elapsed = time.monotonic() - started
+            rate = deleted / elapsed if elapsed else 0
             self.stdout.write(
-                self.style.SUCCESS(f'Successfully deleted {count} books that were soft-deleted more than {days} days ago')
+                self.style.SUCCESS(
+                    f'Successfully deleted {deleted} books that were soft-deleted more than {days} days ago '
+                    f'in {elapsed:.2f}s ({rate:.0f} rows/s)'
+                )
             )
+
+    def prune_tombstones(self):
+        """Drop delete markers that no valid sync token can still ask about"""
+        cutoff = timezone.now() - timedelta(days=settings.BOOKS_TOMBSTONE_DAYS)
+        pruned, _ = BookTombstone.objects.filter(deleted_at__lt=cutoff).delete()
+        if pruned:
+            logger.info(f'Pruned {pruned} book tombstones older than {settings.BOOKS_TOMBSTONE_DAYS} days')
+
+    def prune_upload_sessions(self):
+        """Drop resumable photo uploads that were abandoned part way"""
+        cutoff = timezone.now() - timedelta(hours=settings.BOOK_PHOTO_UPLOAD_EXPIRY_HOURS)
+        expired = list(PhotoUpload.objects.filter(created_at__lt=cutoff).values_list('id', flat=True))
+        if expired:
+            PhotoUpload.objects.filter(id__in=expired).delete()
+            remove_upload_sessions(expired)
+            logger.info(f'Removed {len(expired)} abandoned photo uploads')
+
+        # Partial files whose upload row is gone, e.g. deleted along with
+        # its book from the admin
+        directory = upload_session_dir()
+        names = [name for name in os.listdir(directory) if name.endswith('.part')]
+        live = {str(upload_id) for upload_id in PhotoUpload.objects.values_list('id', flat=True)}
+        orphaned = 0
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                if name[:-len('.part')] not in live and os.path.getmtime(path) < cutoff.timestamp():
+                    os.remove(path)
+                    orphaned += 1
+            except FileNotFoundError:
+                pass
+        if orphaned:
+            logger.info(f'Removed {orphaned} orphaned photo upload files')
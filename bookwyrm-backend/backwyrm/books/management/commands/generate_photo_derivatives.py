@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from books.models import BookPhoto
+from books.thumbnails import process_photo
+
+
+class Command(BaseCommand):
+    help = 'Generate thumbnails for book photos that do not have them yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Regenerate thumbnails for every photo, not just missing ones'
+        )
+
+    def handle(self, *args, **options):
+        photos = BookPhoto.objects.exclude(photo='')
+        if not options['all']:
+            photos = photos.filter(derivatives_ready=False)
+
+        photo_ids = list(photos.values_list('id', flat=True))
+        if not photo_ids:
+            self.stdout.write(self.style.SUCCESS('All book photos already have thumbnails.'))
+            return
+
+        for photo_id in photo_ids:
+            process_photo(photo_id)
+
+        ready = BookPhoto.objects.filter(id__in=photo_ids, derivatives_ready=True).count()
+        self.stdout.write(
+            self.style.SUCCESS(f'Generated thumbnails for {ready} of {len(photo_ids)} book photos')
+        )
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from books.covers import get_fetcher, resolve_cover
+from books.models import Book
+
+
+class Command(BaseCommand):
+    help = 'Look up covers for books that do not have one yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Only look up covers for this many books'
+        )
+
+    def handle(self, *args, **options):
+        fetcher = get_fetcher()
+        if fetcher is None:
+            raise CommandError('Cover lookups are turned off (BOOK_COVER_FETCHER is not set).')
+
+        book_ids = list(
+            Book.objects.filter(is_deleted=False, cover__isnull=True)
+            .order_by('id').values_list('id', flat=True)[:options['limit']]
+        )
+        if not book_ids:
+            self.stdout.write(self.style.SUCCESS('All books already have a cover.'))
+            return
+
+        # Lookups are cached, so books sharing an ISBN or title only cost one
+        found = sum(1 for book_id in book_ids if resolve_cover(book_id, fetcher))
+        self.stdout.write(
+            self.style.SUCCESS(f'Found covers for {found} of {len(book_ids)} books')
+        )
@@ -0,0 +1,144 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
+
+
+# Photos stored by content hash (see uploads.store_photo) never change under
+# the same name. Their thumbnails (<hash>.small.webp) do when they are
+# rendered again, e.g. after BOOK_PHOTO_SIZES changes, so they are
+# revalidated like any other file.
+CONTENT_ADDRESSED = re.compile(r'(^|/)[0-9a-f]{64}\.[a-z0-9]+$')
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+STREAM_BLOCK_SIZE = 64 * 1024
+
+
+def parse_range(header, size):
+    """
+    Parse a single-range Range header into an inclusive (start, end) pair.
+    Returns None if the header should be ignored, and raises ValueError if
+    the range can't be satisfied.
+    """
+    match = RANGE.match(header.strip())
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0:
+            raise ValueError('Empty suffix range')
+        return max(0, size - length), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError('Range not satisfiable')
+    return start, end
+
+
+def read_range(path, start, end):
+    """Yield the bytes of a file between start and end (inclusive)"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            data = f.read(min(STREAM_BLOCK_SIZE, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+
+
+def offload_response(path, name, content_type):
+    """Hand the file body to the front-end web server, if configured to"""
+    mode = settings.MEDIA_SERVE_MODE
+    if mode == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type)
+        # nginx decodes the URI, so names with spaces or non-ASCII
+        # characters have to be quoted
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX + quote(name)
+        return response
+    if mode == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+        return response
+    return None
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Serve a file from MEDIA_ROOT with conditional GET, single byte ranges and
+    long-lived caching for content-addressed files.
+
+    With MEDIA_SERVE_MODE 'app' the file is returned as a FileResponse, which
+    WSGI servers send with sendfile() where available. With 'x-accel-redirect'
+    (nginx) or 'x-sendfile' (Apache, lighttpd) Django only checks the request
+    and sets headers, and the web server sends the bytes.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('File not found.')
+
+    try:
+        stat = os.stat(full_path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404('File not found.')
+    if not os.path.isfile(full_path):
+        raise Http404('File not found.')
+
+    name = path.replace(os.sep, '/')
+    content_type, _ = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+    etag = quote_etag(f'{int(stat.st_mtime_ns):x}-{stat.st_size:x}')
+    immutable = bool(CONTENT_ADDRESSED.search(name))
+
+    def finish(response):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        response['Accept-Ranges'] = 'bytes'
+        if immutable:
+            patch_cache_control(response, public=True, max_age=365 * 24 * 60 * 60, immutable=True)
+        else:
+            patch_cache_control(response, public=True, no_cache=True)
+        return response
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if not_modified is not None:
+        return finish(not_modified)
+
+    response = offload_response(full_path, name, content_type)
+    if response is not None:
+        # The web server takes care of ranges itself
+        return finish(response)
+
+    byte_range = None
+    range_header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    if range_header and (not if_range or if_range == etag):
+        try:
+            byte_range = parse_range(range_header, stat.st_size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return finish(response)
+
+    if byte_range is None:
+        return finish(FileResponse(open(full_path, 'rb'), content_type=content_type))
+
+    start, end = byte_range
+    response = StreamingHttpResponse(read_range(full_path, start, end), status=206, content_type=content_type)
+    response['Content-Length'] = str(end - start + 1)
+    response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+    return finish(response)
@@ -0,0 +1,199 @@
+"""
+Edition metadata lookup by ISBN.
+
+Results are kept in IsbnMetadata, so an ISBN is normally only looked up
+upstream once. Misses are fetched concurrently through the client named by
+ISBN_METADATA_CLIENT, and an ISBN that is already being fetched (for this
+or another request in the process) is waited on instead of fetched twice.
+Each lookup stores its own result, so one that outlasts the request that
+started it is still cached.
+"""
+import abc
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .covers import normalize_isbn
+from .upstream import UpstreamError, http_get
+
+logger = logging.getLogger(__name__)
+
+# Status of a lookup that was still running when the request stopped waiting
+PENDING = 'pending'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# ISBN -> Future of the upstream lookup running for it
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+class MetadataClient(abc.ABC):
+    """
+    Looks editions up upstream. Subclasses implement fetch(), which gets an
+    ISBN-13 and returns a JSON-serializable dict of edition metadata, None
+    if the ISBN is unknown, or raises UpstreamError.
+    """
+
+    @abc.abstractmethod
+    def fetch(self, isbn):
+        pass
+
+
+class OpenLibraryMetadataClient(MetadataClient):
+    """
+    Look editions up in the Open Library Books API. The edition is returned
+    as Open Library sends it, the same object the mobile app used to fetch.
+    """
+    books_url = 'https://openlibrary.org/api/books?bibkeys=ISBN:{isbn}&format=json&jscmd=details'
+    timeout = 10
+    max_bytes = 2 * 1024 * 1024
+
+    def fetch(self, isbn):
+        content = http_get(self.books_url.format(isbn=isbn), timeout=self.timeout, max_bytes=self.max_bytes)
+        try:
+            return json.loads(content or b'{}').get(f'ISBN:{isbn}')
+        except ValueError:
+            raise UpstreamError('Open Library returned invalid JSON')
+
+
+def get_client():
+    """Get the configured metadata client, or None if lookups are turned off"""
+    path = getattr(settings, 'ISBN_METADATA_CLIENT', None)
+    return import_string(path)() if path else None
+
+
+def get_executor():
+    """Get the thread pool upstream lookups run in"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'ISBN_METADATA_WORKERS', 8),
+                    thread_name_prefix='isbn-metadata'
+                )
+    return _executor
+
+
+def isbn13_check_digit(first12):
+    total = sum((3 if i % 2 else 1) * int(digit) for i, digit in enumerate(first12))
+    return str(-total % 10)
+
+
+def to_isbn13(value):
+    """
+    Normalize an ISBN-10 or ISBN-13 to ISBN-13, e.g. '0-261-10334-2' ->
+    '9780261103344'. Returns None if it isn't a valid ISBN.
+    """
+    isbn = normalize_isbn(value)
+    if len(isbn) == 10 and isbn[:9].isdigit() and (isbn[9].isdigit() or isbn[9] == 'X'):
+        digits = [10 if char == 'X' else int(char) for char in isbn]
+        if sum((10 - i) * digit for i, digit in enumerate(digits)) % 11:
+            return None
+        return '978' + isbn[:9] + isbn13_check_digit('978' + isbn[:9])
+    if len(isbn) == 13 and isbn.isdigit() and isbn[12] == isbn13_check_digit(isbn[:12]):
+        return isbn
+    return None
+
+
+def fetch(client, isbn):
+    """
+    Fetch one ISBN upstream and store the result, returning a (status,
+    data) pair
+    """
+    from .models import IsbnMetadata
+    try:
+        data = client.fetch(isbn) or None
+        status = IsbnMetadata.FOUND if data else IsbnMetadata.MISSING
+    except UpstreamError as e:
+        logger.warning(f"Metadata lookup for ISBN {isbn} failed: {e}")
+        status, data = IsbnMetadata.FAILED, None
+    except Exception:
+        logger.exception(f"Metadata lookup for ISBN {isbn} failed")
+        status, data = IsbnMetadata.FAILED, None
+
+    now = timezone.now()
+    try:
+        IsbnMetadata.objects.update_or_create(
+            isbn=isbn,
+            defaults={'status': status, 'data': data, 'fetched_at': now, 'expires_at': expiry(status, now)}
+        )
+    except Exception:
+        # Still answer the requests waiting on it
+        logger.exception(f"Failed to store the metadata of ISBN {isbn}")
+    return status, data
+
+
+def fetch_in_worker(client, isbn):
+    try:
+        return fetch(client, isbn)
+    finally:
+        # Worker threads don't go through the request cycle that normally
+        # closes connections
+        connection.close()
+
+
+def start_fetch(client, isbn):
+    """Get the running lookup for an ISBN, starting one if there is none"""
+    with _in_flight_lock:
+        future = _in_flight.get(isbn)
+        if future is not None:
+            return future
+        future = get_executor().submit(fetch_in_worker, client, isbn)
+        _in_flight[isbn] = future
+    future.add_done_callback(lambda _: forget(isbn, future))
+    return future
+
+
+def forget(isbn, future):
+    with _in_flight_lock:
+        if _in_flight.get(isbn) is future:
+            del _in_flight[isbn]
+
+
+def expiry(status, now):
+    """Get when a lookup result should be looked up again"""
+    from .models import IsbnMetadata
+    if status == IsbnMetadata.FOUND:
+        return now + timedelta(days=getattr(settings, 'ISBN_METADATA_REFRESH_DAYS', 180))
+    if status == IsbnMetadata.MISSING:
+        return now + timedelta(days=getattr(settings, 'ISBN_METADATA_MISSING_TTL_DAYS', 30))
+    return now + timedelta(hours=getattr(settings, 'ISBN_METADATA_RETRY_HOURS', 6))
+
+
+def lookup_isbns(isbns, client=None):
+    """
+    Look up many ISBN-13s at once. Returns a dict of isbn -> (status, data),
+    where status is 'found', 'missing', 'failed' or 'pending' (still being
+    looked up when ISBN_METADATA_TIMEOUT ran out).
+    """
+    from .models import IsbnMetadata
+
+    isbns = list(dict.fromkeys(isbns))
+    now = timezone.now()
+    results = {
+        entry.isbn: (entry.status, entry.data)
+        for entry in IsbnMetadata.objects.filter(isbn__in=isbns, expires_at__gt=now)
+    }
+    misses = [isbn for isbn in isbns if isbn not in results]
+
+    client = client or get_client()
+    if not misses or client is None:
+        return {isbn: results.get(isbn, (IsbnMetadata.FAILED, None)) for isbn in isbns}
+
+    futures = {isbn: start_fetch(client, isbn) for isbn in misses}
+    wait(futures.values(), timeout=getattr(settings, 'ISBN_METADATA_TIMEOUT', 20))
+
+    # Lookups that are still running store their result when they finish
+    for isbn, future in futures.items():
+        results[isbn] = future.result() if future.done() else (PENDING, None)
+    return {isbn: results[isbn] for isbn in isbns}
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0020_cacheversion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['is_deleted', '-created_at', 'id'], name='book_deleted_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['genre', 'is_deleted'], name='book_genre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['language', 'is_deleted'], name='book_language_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['rating'], name='book_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('favorite', True), ('is_deleted', False)), fields=['-created_at'], name='book_favorite_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('is_deleted', False), ('is_read', True)), fields=['-created_at'], name='book_is_read_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('is_deleted', False), ('toBeRead', True)), fields=['-created_at'], name='book_to_be_read_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('is_deleted', False), ('shelved', True)), fields=['-created_at'], name='book_shelved_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('currently_reading', True), ('is_deleted', False)), fields=['-created_at'], name='book_currently_reading_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('did_not_finish', True), ('is_deleted', False)), fields=['-created_at'], name='book_did_not_finish_idx'),
+        ),
+    ]
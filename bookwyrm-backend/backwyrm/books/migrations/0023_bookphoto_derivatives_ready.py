@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0022_booktombstone'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookphoto',
+            name='derivatives_ready',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:07
+
+from collections import Counter
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def build_reading_stats(apps, schema_editor):
+    """
+    Compute the counters and streaks from the existing reading days. A
+    frozen copy of books.stats.rebuild() as it was when this was written.
+    """
+    ReadingDay = apps.get_model('books', 'ReadingDay')
+    ReadingStreak = apps.get_model('books', 'ReadingStreak')
+    ReadingStatsCounter = apps.get_model('books', 'ReadingStatsCounter')
+    using = schema_editor.connection.alias
+
+    counts = Counter()
+    runs = []
+    days = ReadingDay.objects.using(using).order_by('read_date').values_list('read_date', flat=True)
+    for day in days.iterator():
+        counts.update([f'year:{day.year}', f'month:{day.year}-{day.month:02d}', f'weekday:{day.weekday()}'])
+        if runs and runs[-1][1] == day - timedelta(days=1):
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+
+    counts['streak:longest'] = max(((end - start).days + 1 for start, end in runs), default=0)
+    ReadingStatsCounter.objects.using(using).bulk_create(
+        [ReadingStatsCounter(key=key, days=days) for key, days in counts.items()]
+    )
+    ReadingStreak.objects.using(using).bulk_create(
+        [ReadingStreak(start=start, end=end) for start, end in runs]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0024_photoupload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadingStatsCounter',
+            fields=[
+                ('key', models.CharField(max_length=20, primary_key=True, serialize=False)),
+                ('days', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ReadingStreak',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.DateField(unique=True)),
+                ('end', models.DateField(unique=True)),
+            ],
+            options={
+                'ordering': ['-end'],
+            },
+        ),
+        migrations.RunPython(build_reading_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,75 @@
+from django.db import migrations
+
+
+# The index as of this migration, frozen here so that later changes to
+# books.search need a migration of their own to change it.
+#
+# On SQLite, AlterField, RemoveField and most other schema changes to
+# books_book rebuild the table, and the triggers below are dropped with
+# the old one without any error. A migration that changes books_book must
+# create the three triggers again afterwards. The books.E001 system check
+# reports missing triggers.
+FTS_TABLE = 'books_book_fts'
+COLUMNS = 'title, author, tags, vibes, publisher, content_warnings, book_notes'
+NEW_VALUES = ', '.join(f'new.{column}' for column in COLUMNS.split(', '))
+OLD_VALUES = ', '.join(f'old.{column}' for column in COLUMNS.split(', '))
+DELETE_OLD = (
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {COLUMNS}) "
+    f"VALUES ('delete', old.id, {OLD_VALUES});"
+)
+INSERT_NEW = f"INSERT INTO {FTS_TABLE}(rowid, {COLUMNS}) VALUES (new.id, {NEW_VALUES});"
+
+
+def create_search_index(apps, schema_editor):
+    """
+    Create the FTS5 index, the triggers that keep it current and fill it
+    with the existing books. Does nothing on other backends or when SQLite
+    was built without FTS5.
+    """
+    from books.search import forget_fts_available
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        compiled_in = cursor.fetchone()[0]
+    if not compiled_in:
+        return
+
+    statements = [
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+        f"{COLUMNS}, content='books_book', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"CREATE TRIGGER {FTS_TABLE}_insert AFTER INSERT ON books_book BEGIN {INSERT_NEW} END",
+        f"CREATE TRIGGER {FTS_TABLE}_delete AFTER DELETE ON books_book BEGIN {DELETE_OLD} END",
+        # Soft deletes and other updates that leave the text alone don't
+        # touch the index
+        f"CREATE TRIGGER {FTS_TABLE}_update AFTER UPDATE OF {COLUMNS} ON books_book "
+        f"BEGIN {DELETE_OLD} {INSERT_NEW} END",
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+    ]
+    for statement in statements:
+        schema_editor.execute(statement)
+    forget_fts_available()
+
+
+def drop_search_index(apps, schema_editor):
+    """Drop the FTS5 index and its triggers, if they exist"""
+    from books.search import forget_fts_available
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for trigger in ('insert', 'delete', 'update'):
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{trigger}')
+    schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    forget_fts_available()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0025_reading_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
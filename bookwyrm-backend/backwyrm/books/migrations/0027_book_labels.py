@@ -0,0 +1,113 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+BACKFILL_BATCH_SIZE = 500
+
+# Frozen copies of books.labels as of this migration, so later changes
+# there can't change what the backfill does
+LABEL_FIELDS = {
+    'additional_genres': 'genre',
+    'tags': 'tag',
+    'vibes': 'vibe',
+}
+NAME_MAX_LENGTH = 255
+
+
+def split_labels(value):
+    names = []
+    for part in (value or '').split(','):
+        name = part.strip().lower()[:NAME_MAX_LENGTH]
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def backfill_labels(apps, schema_editor):
+    """Split the existing comma-separated fields into labels, a batch of books at a time"""
+    Book = apps.get_model('books', 'Book')
+    Label = apps.get_model('books', 'Label')
+    BookLabel = apps.get_model('books', 'BookLabel')
+    using = schema_editor.connection.alias
+
+    label_ids = {}
+    last_id = 0
+    while True:
+        rows = list(
+            Book.objects.using(using).filter(id__gt=last_id).order_by('id')
+            .values_list('id', *LABEL_FIELDS)[:BACKFILL_BATCH_SIZE]
+        )
+        if not rows:
+            break
+
+        wanted = set()
+        for book_id, *values in rows:
+            for kind, value in zip(LABEL_FIELDS.values(), values):
+                wanted.update((book_id, kind, name) for name in split_labels(value))
+
+        missing = {(kind, name) for _, kind, name in wanted} - set(label_ids)
+        if missing:
+            Label.objects.using(using).bulk_create(
+                [Label(kind=kind, name=name) for kind, name in missing],
+                ignore_conflicts=True
+            )
+            created = Label.objects.using(using).filter(
+                kind__in={kind for kind, _ in missing},
+                name__in={name for _, name in missing}
+            ).values_list('kind', 'name', 'id')
+            label_ids.update({(kind, name): label_id for kind, name, label_id in created})
+
+        BookLabel.objects.using(using).bulk_create(
+            [BookLabel(book_id=book_id, label_id=label_ids[(kind, name)]) for book_id, kind, name in wanted],
+            ignore_conflicts=True
+        )
+        last_id = rows[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0026_book_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookLabel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('book', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='book_labels', to='books.book')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Label',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('genre', 'Additional genre'), ('tag', 'Tag'), ('vibe', 'Vibe')], max_length=10)),
+                ('name', models.CharField(max_length=255)),
+                ('books', models.ManyToManyField(related_name='labels', through='books.BookLabel', to='books.book')),
+            ],
+            options={
+                'ordering': ['kind', 'name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='booklabel',
+            name='label',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='book_labels', to='books.label'),
+        ),
+        migrations.AddConstraint(
+            model_name='label',
+            constraint=models.UniqueConstraint(fields=('kind', 'name'), name='label_kind_name_unique'),
+        ),
+        migrations.AddIndex(
+            model_name='booklabel',
+            index=models.Index(fields=['label', 'book'], name='book_label_label_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='booklabel',
+            constraint=models.UniqueConstraint(fields=('book', 'label'), name='book_label_unique'),
+        ),
+        migrations.RunPython(backfill_labels, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0027_book_labels'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookCover',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True)),
+                ('status', models.CharField(choices=[('found', 'Found'), ('missing', 'Not found'), ('failed', 'Lookup failed')], max_length=10)),
+                ('image', models.ImageField(blank=True, upload_to='covers/')),
+                ('source_url', models.URLField(blank=True, max_length=500)),
+                ('fetched_at', models.DateTimeField(auto_now=True)),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='cover',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='books', to='books.bookcover'),
+        ),
+    ]
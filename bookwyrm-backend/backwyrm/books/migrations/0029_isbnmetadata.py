@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0028_book_cover'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IsbnMetadata',
+            fields=[
+                ('isbn', models.CharField(max_length=13, primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('found', 'Found'), ('missing', 'Not found'), ('failed', 'Lookup failed')], max_length=10)),
+                ('data', models.JSONField(blank=True, null=True)),
+                ('fetched_at', models.DateTimeField()),
+                ('expires_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'ISBN metadata',
+                'verbose_name_plural': 'ISBN metadata',
+            },
+        ),
+    ]
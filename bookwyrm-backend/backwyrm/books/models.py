@@ -1,5 +1,9 @@
-from django.db import models
-from django.db.models.signals import post_migrate
+import threading
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_migrate, post_save
 from django.dispatch import receiver
 
 
@@ -51,6 +55,205 @@ class Genre(models.Model):
         verbose_name_plural = 'Genres'
 
 
+# Versions of the in-process caches, shared by every worker process
+class CacheVersion(models.Model):
+    """
+    Bumped whenever the data behind an in-process cache (genre names,
+    facet counts, reading calendars) is written; see books.caching
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+
+# In-process map of genre code -> name, loaded on first use and reloaded
+# once a Genre row has been written, in this or another process
+GENRE_NAMES_CACHE = 'genre-names'
+_genre_names = None
+_genre_names_lock = threading.Lock()
+
+
+def get_genre_names():
+    """Get a dict mapping every genre code to its display name"""
+    from .caching import get_cache_version
+    global _genre_names
+    # Serializers ask once per book, so only check the version every second
+    version = get_cache_version(GENRE_NAMES_CACHE, max_age=1)
+    cached = _genre_names
+    if cached is None or cached[0] != version:
+        with _genre_names_lock:
+            if _genre_names is None or _genre_names[0] != version:
+                _genre_names = (version, dict(Genre.objects.values_list('code', 'name')))
+            cached = _genre_names
+    return cached[1]
+
+
+async def aget_genre_names():
+    """get_genre_names() for async code, which can't query directly"""
+    from .caching import peek_cache_version
+    cached = _genre_names
+    if cached is not None and cached[0] == peek_cache_version(GENRE_NAMES_CACHE, max_age=1):
+        return cached[1]
+    return await sync_to_async(get_genre_names)()
+
+
+def clear_genre_names(using='default'):
+    """Forget the cached genre map everywhere, e.g. after a bulk write to Genre"""
+    from .caching import bump_cache_version
+    global _genre_names
+    bump_cache_version(GENRE_NAMES_CACHE, using=using)
+    with _genre_names_lock:
+        _genre_names = None
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+def invalidate_genre_names(sender, using='default', **kwargs):
+    clear_genre_names(using=using)
+
+
+class BookQuerySet(models.QuerySet):
+    """Set-based soft delete helpers for books"""
+    
+    # Every set-based write goes through update() or delete(), so this is
+    # where the cached dashboard counts are dropped, once the write is done
+    def update(self, **kwargs):
+        from .facets import clear_facets
+        updated = super().update(**kwargs)
+        clear_facets(using=self.db)
+        return updated
+    
+    def delete(self):
+        from .facets import clear_facets
+        deleted = super().delete()
+        clear_facets(using=self.db)
+        return deleted
+    
+    def soft_delete(self):
+        """Move every book in the queryset to trash with a single UPDATE"""
+        from django.utils import timezone
+        now = timezone.now()
+        return self.filter(is_deleted=False).update(
+            is_deleted=True,
+            deleted_at=now,
+            updated_at=now
+        )
+    
+    def restore(self):
+        """Restore every deleted book in the queryset with a single UPDATE"""
+        from django.utils import timezone
+        return self.filter(is_deleted=True).update(
+            is_deleted=False,
+            deleted_at=None,
+            updated_at=timezone.now()
+        )
+
+
+    def purge(self):
+        """
+        Permanently delete the books in the queryset together with their
+        photo rows, then remove the photo files and their thumbnails, and
+        the partial files of unfinished uploads, once the transaction commits.
+        Labels that only these books had are deleted with them.
+        A tombstone is recorded for each book so syncing clients see the delete.
+        Returns the number of books deleted.
+        """
+        from django.db import transaction
+        from .labels import remove_unused_labels
+        from .uploads import remove_upload_sessions
+        with transaction.atomic(using=self.db):
+            ids = list(self.values_list('id', flat=True))
+            if not ids:
+                return 0
+            
+            photos = BookPhoto.objects.using(self.db).filter(book_id__in=ids)
+            names = set(photos.values_list('photo', flat=True))
+            photos.delete()
+            files = unused_photo_files(names, using=self.db)
+            # Unfinished uploads go with their book, partial files included
+            uploads = list(PhotoUpload.objects.using(self.db).filter(book_id__in=ids).values_list('id', flat=True))
+            labels = set(BookLabel.objects.using(self.db).filter(book_id__in=ids).values_list('label_id', flat=True))
+            _, deleted = self.model.objects.using(self.db).filter(id__in=ids).delete()
+            remove_unused_labels(labels, using=self.db)
+            BookTombstone.objects.using(self.db).bulk_create(
+                [BookTombstone(book_id=book_id) for book_id in ids]
+            )
+            
+            if files:
+                storage = BookPhoto._meta.get_field('photo').storage
+                transaction.on_commit(lambda: delete_files(storage, files), using=self.db)
+            if uploads:
+                transaction.on_commit(lambda: remove_upload_sessions(uploads), using=self.db)
+        
+        return deleted.get(self.model._meta.label, 0)
+
+
+BookManager = models.Manager.from_queryset(BookQuerySet)
+
+
+def unused_photo_files(names, using='default'):
+    """
+    Get the files (originals and thumbnails) of the given photo names that no
+    BookPhoto refers to any more. Photos are stored by content, so several
+    books can share one file.
+    """
+    from .thumbnails import derivative_names
+    names = {name for name in names if name}
+    names -= set(
+        BookPhoto.objects.using(using).filter(photo__in=names).values_list('photo', flat=True)
+    )
+    files = []
+    for name in sorted(names):
+        files.append(name)
+        files.extend(derivative_names(name))
+    return files
+
+
+def delete_files(storage, names):
+    """Remove files from storage, logging (not raising) on failure"""
+    import logging
+    logger = logging.getLogger(__name__)
+    for name in names:
+        try:
+            storage.delete(name)
+        except OSError as e:
+            logger.warning(f"Could not delete file {name}: {e}")
+
+
+# Cover images resolved on the server, see books.covers
+class BookCover(models.Model):
+    """
+    A cached cover lookup, keyed by ISBN ('isbn:9780261103344') or by
+    normalized title and author ('work:the hobbit|tolkien'). Lookups that
+    found nothing or failed are cached too, until expires_at, so they
+    aren't retried on every save.
+    """
+    FOUND = 'found'
+    MISSING = 'missing'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (FOUND, 'Found'),
+        (MISSING, 'Not found'),
+        (FAILED, 'Lookup failed'),
+    ]
+    
+    key = models.CharField(max_length=255, unique=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES)
+    image = models.ImageField(upload_to='covers/', blank=True)
+    source_url = models.URLField(max_length=500, blank=True)
+    fetched_at = models.DateTimeField(auto_now=True)
+    # Only negative entries expire; found covers are kept
+    expires_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"Cover {self.key} ({self.status})"
+    
+    def is_stale(self, now):
+        return self.expires_at is not None and self.expires_at <= now
+
+
 # Book model - with genre as CharField to match API expectations
 class Book(models.Model):
     """
@@ -111,33 +314,109 @@ class Book(models.Model):
     content_warnings = models.TextField(blank=True, null=True)
     emoji = models.CharField(max_length=10, blank=True, null=True, default="📚")
     
+    # Resolved in the background when the ISBN, title or author change
+    cover = models.ForeignKey(
+        BookCover,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='books'
+    )
+    
     # Add fields for tracking deleted books
     is_deleted = models.BooleanField(default=False)
     deleted_at = models.DateTimeField(null=True, blank=True)
 
+    objects = BookManager()
+
     def __str__(self):
         return f'{self.title} by {self.author}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        book = super().from_db(db, field_names, values)
+        # What the row held, so save signals can tell what actually changed
+        book._loaded_values = dict(zip(field_names, values))
+        return book
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        fields = [
+            field.attname for field in self._meta.concrete_fields
+            if update_fields is None or field.name in update_fields
+        ]
+        loaded = getattr(self, '_loaded_values', {})
+        self._loaded_values = {**loaded, **{name: getattr(self, name) for name in fields}}
+
+    def changed_fields(self, fields):
+        """
+        Get which of the given fields differ from what was last loaded or
+        saved. Fields that weren't loaded count as changed.
+        """
+        loaded = getattr(self, '_loaded_values', {})
+        return {name for name in fields if name not in loaded or loaded[name] != getattr(self, name)}
+
     class Meta:
         ordering = ['-created_at']  # Newest books first by default
         verbose_name = 'Book'
         verbose_name_plural = 'Books'
+        indexes = [
+            # Default list and trash ordering
+            models.Index(fields=['is_deleted', '-created_at', 'id'], name='book_deleted_created_idx'),
+            models.Index(fields=['genre', 'is_deleted'], name='book_genre_idx'),
+            models.Index(fields=['language', 'is_deleted'], name='book_language_idx'),
+            models.Index(fields=['rating'], name='book_rating_idx'),
+            # Delta sync looks up everything changed since a point in time
+            models.Index(fields=['updated_at'], name='book_updated_idx'),
+            # Reading status filters only ever ask for the flagged books,
+            # so partial indexes keep these small
+            models.Index(
+                fields=['-created_at'], name='book_favorite_idx',
+                condition=models.Q(favorite=True, is_deleted=False),
+            ),
+            models.Index(
+                fields=['-created_at'], name='book_is_read_idx',
+                condition=models.Q(is_read=True, is_deleted=False),
+            ),
+            models.Index(
+                fields=['-created_at'], name='book_to_be_read_idx',
+                condition=models.Q(toBeRead=True, is_deleted=False),
+            ),
+            models.Index(
+                fields=['-created_at'], name='book_shelved_idx',
+                condition=models.Q(shelved=True, is_deleted=False),
+            ),
+            models.Index(
+                fields=['-created_at'], name='book_currently_reading_idx',
+                condition=models.Q(currently_reading=True, is_deleted=False),
+            ),
+            models.Index(
+                fields=['-created_at'], name='book_did_not_finish_idx',
+                condition=models.Q(did_not_finish=True, is_deleted=False),
+            ),
+        ]
         
     # Method to get the Genre object associated with this book
     def get_genre_object(self):
         """Get the Genre object for this book"""
-        try:
-            return Genre.objects.get(code=self.genre)
-        except Genre.DoesNotExist:
-            return Genre.objects.get(code='unknown')
+        names = get_genre_names()
+        code = self.genre if self.genre in names else 'unknown'
+        if code not in names:
+            raise Genre.DoesNotExist(f"Genre '{code}' does not exist")
+        return Genre.from_db('default', ['code', 'name'], [code, names[code]])
     
     # Enhanced methods for soft delete functionality
+    # Only the soft delete columns are written, not the whole row
+    SOFT_DELETE_FIELDS = ['is_deleted', 'deleted_at', 'updated_at']
+    
     def soft_delete(self):
         """Mark book as deleted and set deletion timestamp"""
         from django.utils import timezone
         self.is_deleted = True
         self.deleted_at = timezone.now()
-        self.save()
+        self.save(update_fields=self.SOFT_DELETE_FIELDS)
         
     def restore(self):
         """Restore a deleted book"""
@@ -151,13 +430,10 @@ class Book(models.Model):
             
         self.is_deleted = False
         self.deleted_at = None
-        self.save()
-        
-        # Verify the restoration was successful
-        self.refresh_from_db()
-        success = not self.is_deleted
-        logger.info(f"Book {self.id} restoration {'successful' if success else 'failed'}")
-        return success
+        # save() raises DatabaseError if the row is gone, so no re-read is needed
+        self.save(update_fields=self.SOFT_DELETE_FIELDS)
+        logger.info(f"Book {self.id} restoration successful")
+        return True
     
     @property
     def days_until_permanent_deletion(self):
@@ -175,6 +451,137 @@ class Book(models.Model):
         return max(0, days_left)
 
 
+# Record of permanently deleted books for delta sync
+class BookTombstone(models.Model):
+    """
+    Marker left behind when a book is permanently deleted, so clients
+    syncing through /api/books/changes/ learn about hard deletes too.
+    """
+    book_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    def __str__(self):
+        return f"Book {self.book_id} deleted at {self.deleted_at}"
+    
+    class Meta:
+        ordering = ['-deleted_at']
+
+
+# Normalized additional genres, tags and vibes
+class Label(models.Model):
+    """
+    An additional genre, tag or vibe, split out of the comma-separated
+    Book fields so books can be looked up by label through an index.
+    The string fields on Book stay the source of truth; see books.labels.
+    """
+    GENRE = 'genre'
+    TAG = 'tag'
+    VIBE = 'vibe'
+    KIND_CHOICES = [
+        (GENRE, 'Additional genre'),
+        (TAG, 'Tag'),
+        (VIBE, 'Vibe'),
+    ]
+    
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    name = models.CharField(max_length=255)
+    books = models.ManyToManyField(Book, through='BookLabel', related_name='labels')
+    
+    def __str__(self):
+        return f"{self.kind}: {self.name}"
+    
+    class Meta:
+        ordering = ['kind', 'name']
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'name'], name='label_kind_name_unique'),
+        ]
+
+
+class BookLabel(models.Model):
+    """A label applied to a book"""
+    # Both lookups are covered by the composite indexes below
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='book_labels', db_index=False)
+    label = models.ForeignKey(Label, on_delete=models.CASCADE, related_name='book_labels', db_index=False)
+    
+    def __str__(self):
+        return f"{self.label} on book {self.book_id}"
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'label'], name='book_label_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['label', 'book'], name='book_label_label_idx'),
+        ]
+
+
+@receiver(post_save, sender=Book)
+def sync_book_labels(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Keep a book's labels in step with its comma-separated fields, when
+    they have any to add or have actually changed
+    """
+    from .labels import LABEL_FIELDS, sync_labels
+    if update_fields is not None and not set(update_fields) & set(LABEL_FIELDS):
+        return
+    if created:
+        changed = any(getattr(instance, name) for name in LABEL_FIELDS)
+    else:
+        changed = instance.changed_fields(LABEL_FIELDS)
+    if changed:
+        sync_labels([instance.pk], using=kwargs.get('using', 'default'))
+
+
+@receiver(post_save, sender=Book)
+def queue_cover_lookup(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Look up a cover in the background for new books, books without one, and
+    when what identifies the book changes
+    """
+    from .covers import COVER_FIELDS, schedule_covers
+    if update_fields is not None and not set(update_fields) & set(COVER_FIELDS):
+        return
+    if created or instance.cover_id is None or instance.changed_fields(COVER_FIELDS):
+        schedule_covers([instance.pk])
+
+
+@receiver(post_save, sender=Book)
+def invalidate_facets(sender, using='default', **kwargs):
+    """Saving a single book bypasses BookQuerySet, so drop the counts here"""
+    from .facets import clear_facets
+    clear_facets(using=using)
+
+
+# Edition metadata looked up by ISBN, see books.metadata
+class IsbnMetadata(models.Model):
+    """
+    Cached result of looking an ISBN up upstream. Found entries are
+    refreshed after a while; misses and failures expire sooner.
+    """
+    FOUND = 'found'
+    MISSING = 'missing'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (FOUND, 'Found'),
+        (MISSING, 'Not found'),
+        (FAILED, 'Lookup failed'),
+    ]
+    
+    # Always stored as ISBN-13
+    isbn = models.CharField(max_length=13, primary_key=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES)
+    data = models.JSONField(null=True, blank=True)
+    fetched_at = models.DateTimeField()
+    expires_at = models.DateTimeField(db_index=True)
+    
+    def __str__(self):
+        return f"ISBN {self.isbn} ({self.status})"
+    
+    class Meta:
+        verbose_name = 'ISBN metadata'
+        verbose_name_plural = 'ISBN metadata'
+
+
 # New model for book photos
 class BookPhoto(models.Model):
     """
@@ -183,6 +590,8 @@ class BookPhoto(models.Model):
     book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='photos')
     photo = models.ImageField(upload_to='book_photos/')
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    # Set once the resized thumbnails have been generated next to the photo
+    derivatives_ready = models.BooleanField(default=False)
     
     def __str__(self):
         return f"Photo for {self.book.title}"
@@ -191,6 +600,32 @@ class BookPhoto(models.Model):
         ordering = ['-uploaded_at']
 
 
+@receiver(post_save, sender=BookPhoto)
+def queue_photo_derivatives(sender, instance, created, update_fields=None, **kwargs):
+    """Render thumbnails in the background whenever a photo file is saved"""
+    if instance.derivatives_ready:
+        return
+    if instance.photo and (created or update_fields is None or 'photo' in update_fields):
+        from .thumbnails import schedule_derivatives
+        schedule_derivatives(instance.pk)
+
+
+# Resumable photo uploads in progress
+class PhotoUpload(models.Model):
+    """
+    A chunked photo upload that can be resumed after a dropped connection.
+    Chunks are appended to a partial file on disk, whose size is the offset
+    the client should continue from.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='photo_uploads')
+    size = models.PositiveBigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Upload {self.id} for {self.book.title}"
+
+
 # New model for tracking reading days
 class ReadingDay(models.Model):
     """
@@ -203,12 +638,65 @@ class ReadingDay(models.Model):
     def __str__(self):
         return f"Reading on {self.read_date}"
     
+    def save(self, *args, **kwargs):
+        # The stats are updated from post_save, in the same transaction as
+        # the day, so a failure there can't leave them out of step
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+    
     class Meta:
         ordering = ['-read_date']
         verbose_name = 'Reading Day'
         verbose_name_plural = 'Reading Days'
 
 
+# Precomputed reading statistics, maintained by books.stats
+class ReadingStreak(models.Model):
+    """
+    A run of consecutive reading days. Runs are merged as days are recorded,
+    so the newest run gives the current streak without scanning ReadingDay.
+    """
+    start = models.DateField(unique=True)
+    end = models.DateField(unique=True)
+    
+    def __str__(self):
+        return f"Reading streak {self.start} to {self.end}"
+    
+    @property
+    def length(self):
+        return (self.end - self.start).days + 1
+    
+    class Meta:
+        ordering = ['-end']
+
+
+class ReadingStatsCounter(models.Model):
+    """
+    A precomputed reading-day count, keyed like 'year:2025', 'month:2025-06',
+    'weekday:0' (Monday) or 'streak:longest'.
+    """
+    key = models.CharField(max_length=20, primary_key=True)
+    days = models.PositiveIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.key}: {self.days}"
+
+
+@receiver(post_save, sender=ReadingDay)
+def count_reading_day(sender, instance, created, **kwargs):
+    """Fold a newly recorded reading day into the precomputed stats"""
+    if created:
+        from .stats import add_days
+        add_days([instance.read_date])
+
+
+@receiver(post_delete, sender=ReadingDay)
+def recount_reading_days(sender, **kwargs):
+    """Deleting days is rare, so simply recompute the stats afterwards"""
+    from .stats import schedule_rebuild
+    schedule_rebuild()
+
+
 # Ensure all genres from GENRE_CHOICES exist in the database
 @receiver(post_migrate)
 def create_default_genres(sender, **kwargs):
@@ -0,0 +1,233 @@
+import base64
+import json
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Q
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def nullable_fields(model, fields):
+    """Get the names in ``fields`` (optionally ``-`` prefixed) that allow NULL"""
+    names = {name.lstrip('-') for name in fields}
+    return {field.name for field in model._meta.concrete_fields if field.null and field.name in names}
+
+
+def ordering_expressions(model, fields):
+    """
+    Turn ordering field names into ``order_by`` expressions that put NULLs
+    last in either direction, matching what the cursor conditions expect.
+    """
+    nullable = nullable_fields(model, fields)
+    expressions = []
+    for name in fields:
+        field = name.lstrip('-')
+        expression = F(field).desc if name.startswith('-') else F(field).asc
+        expressions.append(expression(nulls_last=True) if field in nullable else expression())
+    return expressions
+
+
+class BookCursorPagination(BasePagination):
+    """
+    Keyset (cursor) pagination for book lists.
+
+    Rows are ordered by ``ordering`` (newest books first by default) with the
+    primary key as a tie-breaker, and the cursor stores the ordering values of
+    the last row on the page. The next page is fetched with a ``WHERE`` on
+    those values instead of an ``OFFSET``, so pages stay stable while books
+    are being added and every page costs the same to load.
+
+    Pagination is opt-in: clients that send neither ``cursor`` nor
+    ``page_size`` keep receiving the plain list they always have.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    ordering = ('-created_at', 'id')
+
+    def get_page_size(self, request):
+        """Get the requested page size, clamped to the configured maximum"""
+        page_size = getattr(settings, 'BOOKS_PAGE_SIZE', 50)
+        max_page_size = getattr(settings, 'BOOKS_MAX_PAGE_SIZE', 500)
+
+        requested = request.query_params.get(self.page_size_query_param)
+        if requested:
+            try:
+                page_size = int(requested)
+            except ValueError:
+                pass
+
+        return max(1, min(page_size, max_page_size))
+
+    def get_ordering(self, view):
+        """Get the ordering fields, always ending with the primary key"""
+        ordering = list(getattr(view, 'cursor_ordering', None) or self.ordering)
+        if ordering[-1].lstrip('-') not in ('id', 'pk'):
+            ordering.append('id')
+        return ordering
+
+    def is_requested(self, request):
+        """Pagination only applies when the client asks for it"""
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset() for async views"""
+        queryset = self.page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.set_page([row async for row in queryset])
+
+    def page_queryset(self, queryset, request, view):
+        """Narrow the queryset to the requested page, or None if not paginating"""
+        if not self.is_requested(request):
+            return None
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.fields = self.get_ordering(view)
+
+        self.nullable = nullable_fields(queryset.model, self.fields)
+        queryset = queryset.order_by(*ordering_expressions(queryset.model, self.fields))
+
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded:
+            queryset = queryset.filter(self.after(self.decode_cursor(encoded, queryset)))
+
+        # Fetch one extra row to find out whether there is a next page
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, rows):
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def after(self, values):
+        """
+        Build the keyset condition matching rows that sort after ``values``.
+
+        For ordering (a, b, id) this is the lexicographic comparison
+        ``a > x OR (a = x AND b > y) OR (a = x AND b = y AND id > z)``,
+        with NULLs sorted after every non-NULL value.
+        """
+        condition = Q()
+        equal = Q()
+        for name, value in zip(self.fields, values):
+            field = name.lstrip('-')
+            lookup = 'lt' if name.startswith('-') else 'gt'
+
+            if value is None:
+                # NULLs sort last, so only the remaining fields can break the tie
+                equal &= Q(**{f'{field}__isnull': True})
+                continue
+
+            beyond = Q(**{f'{field}__{lookup}': value})
+            if field in self.nullable:
+                beyond |= Q(**{f'{field}__isnull': True})
+            condition = condition | (equal & beyond) if condition else equal & beyond
+            equal &= Q(**{field: value})
+        return condition
+
+    def encode_cursor(self, obj):
+        """Encode the ordering values of ``obj`` (an instance or a values() row) as an opaque cursor string"""
+        values = []
+        for name in self.fields:
+            field = name.lstrip('-')
+            value = obj[field] if isinstance(obj, dict) else getattr(obj, field)
+            if isinstance(value, (date, datetime)):
+                value = value.isoformat()
+            elif isinstance(value, Decimal):
+                value = str(value)
+            values.append(value)
+        payload = json.dumps(values, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, encoded, queryset):
+        """Decode a cursor back into typed ordering values"""
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+            if not isinstance(values, list) or len(values) != len(self.fields):
+                raise ValueError
+            return [
+                self.parse_value(self.get_field(queryset, name.lstrip('-')), value)
+                for name, value in zip(self.fields, values)
+            ]
+        except (TypeError, ValueError, ArithmeticError, ValidationError):
+            raise NotFound('Invalid cursor.')
+
+    def get_field(self, queryset, name):
+        """Get the model field, or annotation output field, for an ordering name"""
+        try:
+            return queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # e.g. the search_rank of search results
+            return queryset.query.annotations[name].output_field
+
+    def parse_value(self, field, value):
+        """Convert a JSON cursor value back to the field's Python type"""
+        if value is None:
+            return None
+        internal_type = field.get_internal_type()
+        if internal_type == 'DateTimeField':
+            parsed = parse_datetime(value)
+        elif internal_type == 'DateField':
+            parsed = parse_date(value)
+        elif internal_type == 'DecimalField':
+            parsed = Decimal(value)
+        else:
+            parsed = field.to_python(value)
+        if parsed is None:
+            raise ValueError(f'Invalid cursor value for {field.name}')
+        return parsed
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.page_size_query_param, self.page_size)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class SyncPagination(BookCursorPagination):
+    """
+    Batches of the books changed since a sync, for /api/books/changes/.
+    Always on, oldest change first, with the same keyset cursor as the book
+    list, so books edited while a client pages move to a later batch
+    instead of being skipped.
+    """
+    ordering = ('updated_at', 'id')
+
+    def is_requested(self, request):
+        return True
+
+    def get_ordering(self, view):
+        return list(self.ordering)
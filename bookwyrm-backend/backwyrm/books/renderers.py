@@ -0,0 +1,37 @@
+"""
+JSON rendering with orjson, for the book endpoints.
+
+Books are rendered to the same bytes as DRF's JSONRenderer produces, only
+faster. orjson writes floats in exponent form differently from the json
+module (1e-05 comes out as 0.00001) and NaN as null, so this is only used
+for responses without floats; book payloads have none, ratings are
+decimal strings. Anything orjson can't encode the same way falls back to
+JSONRenderer.
+"""
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer using orjson for the default compact, UTF-8 output"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or not self.compact or self.ensure_ascii
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except TypeError:
+            # e.g. integers beyond 64 bits or non-string dict keys
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Like JSONRenderer, escape the two characters that are valid in
+        # JSON but not in JavaScript strings
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
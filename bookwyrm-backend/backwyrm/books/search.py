@@ -0,0 +1,148 @@
+"""
+Full-text search over books.
+
+On SQLite the text columns are indexed in an FTS5 table that reads its
+content from books_book and is kept in sync by triggers, so saves, soft
+deletes, QuerySet.update() and hard deletes are all covered without any
+Python code running. Other backends (or SQLite builds without FTS5) fall
+back to case-insensitive substring matching.
+
+The index itself is created by migration 0026; changing SEARCH_FIELDS
+means rebuilding it in a new migration. On SQLite most schema changes to
+books_book rebuild the table, which drops the triggers with it, so such a
+migration has to create them again; check_search_triggers() reports any
+that are missing.
+"""
+import re
+
+from django.core import checks
+from django.db import connections
+from django.db.models import Case, ExpressionWrapper, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+
+FTS_TABLE = 'books_book_fts'
+
+# Indexed columns with their weight when ranking matches
+SEARCH_FIELDS = {
+    'title': 10.0,
+    'author': 8.0,
+    'tags': 4.0,
+    'vibes': 4.0,
+    'publisher': 2.0,
+    'content_warnings': 2.0,
+    'book_notes': 1.0,
+}
+
+# The triggers that keep the index in step with books_book
+FTS_TRIGGERS = [f'{FTS_TABLE}_insert', f'{FTS_TABLE}_delete', f'{FTS_TABLE}_update']
+
+# Longer queries are cut down to this many terms
+MAX_TERMS = 16
+
+TERM = re.compile(r'\w+')
+
+_fts_available = {}
+
+
+@checks.register(checks.Tags.database)
+def check_search_triggers(app_configs, databases=None, **kwargs):
+    """
+    Report a search index that has lost its triggers, e.g. to a migration
+    that rebuilt books_book. Runs with migrate and ``check --database``.
+    """
+    errors = []
+    for alias in databases or []:
+        connection = connections[alias]
+        if connection.vendor != 'sqlite' or FTS_TABLE not in connection.introspection.table_names():
+            continue
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'books_book'"
+            )
+            present = {name for name, in cursor.fetchall()}
+        missing = [name for name in FTS_TRIGGERS if name not in present]
+        if missing:
+            errors.append(checks.Error(
+                f"The search index on database '{alias}' is missing its triggers: {', '.join(missing)}.",
+                hint=(
+                    'A migration rebuilt books_book and dropped them. Create them again in a '
+                    'new migration, as in books/migrations/0026_book_search_index.py.'
+                ),
+                id='books.E001',
+            ))
+    return errors
+
+
+def search_terms(query):
+    """Split a search query into lowercase words"""
+    return [term.lower() for term in TERM.findall(query)][:MAX_TERMS]
+
+
+def fts_available(using='default'):
+    """Check whether the FTS5 index exists on a database"""
+    if using not in _fts_available:
+        connection = connections[using]
+        _fts_available[using] = (
+            connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names()
+        )
+    return _fts_available[using]
+
+
+def forget_fts_available():
+    """Drop what fts_available() remembers, for when the index is created or dropped"""
+    _fts_available.clear()
+
+
+def match_expression(terms):
+    """
+    Build an FTS5 query matching books that contain every term, each as a
+    word prefix, e.g. ["hobb", "tolk"] -> "hobb"* "tolk"*
+    """
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def search_books(queryset, query):
+    """
+    Narrow a book queryset to the books matching a search query, annotated
+    with ``search_rank`` where a lower rank is a better match
+    """
+    terms = search_terms(query)
+    if not terms:
+        return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+    if fts_available(queryset.db):
+        return fts_search(queryset, terms)
+    return fallback_search(queryset, terms)
+
+
+def fts_search(queryset, terms):
+    match = match_expression(terms)
+    weights = ', '.join(str(weight) for weight in SEARCH_FIELDS.values())
+    table = queryset.model._meta.db_table
+
+    # The MATCH narrows the rows first, so bm25() is only computed for hits
+    return queryset.filter(
+        id__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', (match,))
+    ).annotate(search_rank=RawSQL(
+        f'SELECT bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} '
+        f'WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id',
+        (match,),
+        output_field=FloatField()
+    ))
+
+
+def fallback_search(queryset, terms):
+    condition = Q()
+    score = Value(0.0)
+    for term in terms:
+        matches = Q()
+        for field, weight in SEARCH_FIELDS.items():
+            lookup = Q(**{f'{field}__icontains': term})
+            matches |= lookup
+            score = score + Case(When(lookup, then=Value(weight)), default=Value(0.0))
+        condition &= matches
+
+    # Negated so that, as with bm25(), lower ranks are better
+    return queryset.filter(condition).annotate(
+        search_rank=ExpressionWrapper(-score, output_field=FloatField())
+    )
@@ -1,5 +1,10 @@
-from rest_framework import serializers
-from .models import Book, BookPhoto, Genre
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+from .models import Book, BookCover, BookPhoto, Genre, PhotoUpload, aget_genre_names, get_genre_names
+from .thumbnails import DERIVATIVE_FORMATS, derivative_name, get_sizes
 
 class GenreSerializer(serializers.ModelSerializer):
     """Serializer for the Genre model"""
@@ -7,36 +12,342 @@ class GenreSerializer(serializers.ModelSerializer):
         model = Genre
         fields = ['code', 'name']
 
-class BookPhotoSerializer(serializers.ModelSerializer):
+class MediaURLMixin:
+    """Build absolute URLs for files in MEDIA_ROOT"""
+    
+    def get_url_prefix(self):
+        """
+        Get the scheme and host to put in front of media URLs.
+        Built once per request and kept in the serializer context, which is
+        shared by every nested photo serializer in a book list.
+        """
+        if 'media_url_prefix' not in self.context:
+            request = self.context.get('request')
+            prefix = request.build_absolute_uri('/')[:-1] if request else ''
+            self.context['media_url_prefix'] = prefix
+        return self.context['media_url_prefix']
+    
+    def absolute_url(self, url):
+        """Prefix a site-relative media URL with the request's scheme and host"""
+        if url.startswith('/'):
+            return self.get_url_prefix() + url
+        return url
+    
+    def thumbnail_urls(self, storage, name, url=None):
+        """
+        Get the URLs of the resized copies of a photo by size and format.
+        Given the URL of the photo itself, they are derived from it instead
+        of asking the storage for each.
+        """
+        _, extension = os.path.splitext(name)
+        if url is not None and extension and url.endswith(extension):
+            base = url[:-len(extension)]
+            derivative_url = lambda size, ext: f'{base}.{size}.{ext}'
+        else:
+            derivative_url = lambda size, ext: storage.url(derivative_name(name, size, ext))
+        return {
+            size: {
+                ext: self.absolute_url(derivative_url(size, ext))
+                for ext, _, _ in DERIVATIVE_FORMATS
+            }
+            for size in get_sizes()
+        }
+
+class BookPhotoSerializer(MediaURLMixin, serializers.ModelSerializer):
     """Serializer for book photos"""
     photo_url = serializers.SerializerMethodField()
+    thumbnails = serializers.SerializerMethodField()
     
     class Meta:
         model = BookPhoto
-        fields = ['id', 'photo', 'photo_url', 'uploaded_at']
+        fields = ['id', 'photo', 'photo_url', 'thumbnails', 'uploaded_at']
     
     def get_photo_url(self, obj):
         """Get the full URL for the photo"""
         if obj.photo:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.photo.url)
-            return obj.photo.url
+            return self.absolute_url(obj.photo.url)
         return None
+    
+    def get_thumbnails(self, obj):
+        """
+        Get the URLs of the resized copies by size and format, e.g.
+        {"small": {"jpg": ..., "webp": ...}}, or None until they are generated
+        """
+        if not obj.photo or not obj.derivatives_ready:
+            return None
+        return self.thumbnail_urls(obj.photo.storage, obj.photo.name, obj.photo.url)
 
-class BookSerializer(serializers.ModelSerializer):
+class BookSerializer(MediaURLMixin, serializers.ModelSerializer):
     """Serializer for books"""
     photos = BookPhotoSerializer(many=True, read_only=True)
     genre_name = serializers.SerializerMethodField()
+    cover_url = serializers.SerializerMethodField()
     
     class Meta:
         model = Book
-        fields = '__all__'
+        # The cover is exposed as cover_url instead
+        exclude = ['cover']
     
     def get_genre_name(self, obj):
         """Get the display name of the primary genre"""
-        try:
-            genre_obj = Genre.objects.get(code=obj.genre)
-            return genre_obj.name
-        except Genre.DoesNotExist:
-            return None
\ No newline at end of file
+        # Async views load the names into the context before serializing
+        names = self.context['genre_names'] if 'genre_names' in self.context else get_genre_names()
+        return names.get(obj.genre)
+    
+    def get_cover_url(self, obj):
+        """Get the URL of the cover found on the server, if any"""
+        cover = obj.cover
+        if cover is not None and cover.image:
+            return self.absolute_url(cover.image.url)
+        return None
+
+
+# Fields whose to_representation() is str(), int() or bool(), which the
+# database already returns their columns as
+COPIED_FIELDS = (serializers.CharField, serializers.IntegerField, serializers.BooleanField)
+
+def column_converter(field):
+    """
+    Get a function that turns a non-NULL column value into what
+    field.to_representation() returns, or None if the value is returned
+    as it is
+    """
+    kind = type(field)
+    if kind in COPIED_FIELDS:
+        return None
+    if kind is serializers.DateTimeField:
+        return datetime_converter(field)
+    return field.to_representation
+
+def datetime_converter(field):
+    """
+    DateTimeField.to_representation() for ISO 8601 output, with the
+    timezone looked up once rather than per value
+    """
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    if output_format is None or output_format.lower() != ISO_8601 or field_timezone is None:
+        return field.to_representation
+    
+    def convert(value):
+        if isinstance(value, str) or value.utcoffset() is None:
+            return field.to_representation(value)
+        value = value.astimezone(field_timezone).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return convert
+
+class RowSerializer(MediaURLMixin):
+    """
+    Read-only stand-in for a ModelSerializer that takes rows from
+    ``.values(*columns())`` instead of model instances.
+    
+    Which column each field of serializer_class reads, and how it's
+    converted, is worked out once, so rows are turned into exactly what
+    serializer_class would return for the same objects without building
+    model instances or going through the field machinery per value.
+    Fields that aren't a plain column need a ``row_<field name>(row)``
+    method; extra_columns lists the columns those read. Subclasses whose
+    rows need queries run first (say, for related rows) define
+    ``load(rows)``, and ``aload()`` for async views, which await it
+    before reading .data.
+    """
+    serializer_class = None
+    extra_columns = ()
+    
+    def __init__(self, instance=None, many=False, context=None):
+        self.instance = instance
+        self.many = many
+        self.context = {} if context is None else context
+        # Converters are picked per request, as they depend on its timezone
+        self.names = []
+        self.copied = []
+        self.converted = []
+        self.computed = []
+        for name, source, field in self.get_fields():
+            self.names.append(name)
+            if source is None:
+                self.computed.append((name, getattr(self, f'row_{name}')))
+            elif column_converter(field) is None:
+                self.copied.append((name, source))
+            else:
+                self.converted.append((name, source, column_converter(field)))
+    
+    @classmethod
+    def get_fields(cls):
+        """Get (name, column, DRF field) for every field, column None for row_ methods"""
+        if '_fields' not in cls.__dict__:
+            fields = []
+            for name, field in cls.serializer_class().fields.items():
+                if hasattr(cls, f'row_{name}'):
+                    fields.append((name, None, None))
+                elif (isinstance(field, (serializers.BaseSerializer, serializers.SerializerMethodField, serializers.FileField))
+                        or field.source == '*' or '.' in field.source):
+                    raise ImproperlyConfigured(f"{cls.__name__} needs a row_{name}() method")
+                else:
+                    fields.append((name, field.source, field))
+            cls._fields = fields
+        return cls._fields
+    
+    @classmethod
+    def columns(cls):
+        """Get the columns to pass to values()"""
+        return [source for _, source, _ in cls.get_fields() if source] + list(cls.extra_columns)
+    
+    def to_representation(self, row):
+        # Filled in three passes, in the field order of serializer_class
+        data = dict.fromkeys(self.names)
+        for name, source in self.copied:
+            data[name] = row[source]
+        for name, source, convert in self.converted:
+            value = row[source]
+            if value is not None:
+                data[name] = convert(value)
+        for name, method in self.computed:
+            data[name] = method(row)
+        return data
+    
+    @property
+    def data(self):
+        rows = list(self.instance) if self.many else [self.instance]
+        if hasattr(self, 'load'):
+            self.load(rows)
+        if not self.many:
+            return self.to_representation(self.instance)
+        return [self.to_representation(row) for row in rows]
+
+class BookPhotoRowSerializer(RowSerializer):
+    """BookPhotoSerializer for photo rows"""
+    serializer_class = BookPhotoSerializer
+    extra_columns = ('photo', 'derivatives_ready', 'book_id')
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.storage = BookPhoto._meta.get_field('photo').storage
+    
+    def url(self, row):
+        """Get the site-relative URL of the photo, once per row"""
+        if row.get('_url') is None:
+            row['_url'] = self.storage.url(row['photo'])
+        return row['_url']
+    
+    def row_photo(self, row):
+        # As DRF's ImageField does it
+        if not row['photo']:
+            return None
+        request = self.context.get('request')
+        return request.build_absolute_uri(self.url(row)) if request is not None else self.url(row)
+    
+    def row_photo_url(self, row):
+        return self.absolute_url(self.url(row)) if row['photo'] else None
+    
+    def row_thumbnails(self, row):
+        if not row['photo'] or not row['derivatives_ready']:
+            return None
+        return self.thumbnail_urls(self.storage, row['photo'], self.url(row))
+
+class BookRowSerializer(RowSerializer):
+    """
+    BookSerializer for book rows, for the book list and detail reads.
+    The photos of every row are loaded in one query.
+    """
+    serializer_class = BookSerializer
+    extra_columns = ('cover__image',)
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.photo_serializer = BookPhotoRowSerializer(context=self.context)
+        self.cover_storage = BookCover._meta.get_field('image').storage
+        self.photos = None
+        self.genre_names = self.context.get('genre_names')
+    
+    @classmethod
+    def values(cls, queryset):
+        """Turn a book queryset into the rows this serializer takes"""
+        return queryset.prefetch_related(None).values(*cls.columns(), *queryset.query.annotations)
+    
+    def photo_rows(self, rows):
+        return BookPhoto.objects.filter(book_id__in=[row['id'] for row in rows]).values(
+            *BookPhotoRowSerializer.columns()
+        )
+    
+    def set_photos(self, photo_rows):
+        self.photos = {}
+        for photo in photo_rows:
+            self.photos.setdefault(photo['book_id'], []).append(photo)
+    
+    def load(self, rows):
+        if self.photos is None:
+            self.set_photos(self.photo_rows(rows) if rows else [])
+        if self.genre_names is None:
+            self.genre_names = get_genre_names()
+    
+    async def aload(self):
+        rows = [self.instance] if not self.many else self.instance
+        if not isinstance(rows, list):
+            rows = self.instance = [row async for row in rows]
+        self.set_photos([photo async for photo in self.photo_rows(rows)] if rows else [])
+        if self.genre_names is None:
+            self.genre_names = await aget_genre_names()
+    
+    def row_photos(self, row):
+        return [self.photo_serializer.to_representation(photo) for photo in self.photos.get(row['id'], ())]
+    
+    def row_genre_name(self, row):
+        return self.genre_names.get(row['genre'])
+    
+    def row_cover_url(self, row):
+        if not row['cover__image']:
+            return None
+        return self.absolute_url(self.cover_storage.url(row['cover__image']))
+
+
+class BookIdsSerializer(serializers.Serializer):
+    """Serializer for the list of book ids taken by the bulk endpoints"""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False
+    )
+
+
+class BookSummarySerializer(serializers.ModelSerializer):
+    """Serializer for the few book fields shown alongside a photo"""
+    class Meta:
+        model = Book
+        fields = ['id', 'title', 'author', 'tags']
+
+
+class BookPhotoDetailSerializer(BookPhotoSerializer):
+    """Serializer for photos listed on their own, with the book they belong to"""
+    book = BookSummarySerializer(read_only=True)
+    
+    class Meta(BookPhotoSerializer.Meta):
+        fields = BookPhotoSerializer.Meta.fields + ['book']
+
+
+class PhotoUploadSerializer(serializers.ModelSerializer):
+    """Serializer for starting a resumable photo upload"""
+    book = serializers.PrimaryKeyRelatedField(queryset=Book.objects.filter(is_deleted=False))
+    size = serializers.IntegerField(min_value=1)
+    
+    class Meta:
+        model = PhotoUpload
+        fields = ['id', 'book', 'size', 'created_at']
+
+
+class ReadingDaysSerializer(serializers.Serializer):
+    """Serializer for recording one reading day or a backlog of them"""
+    read_date = serializers.DateField(required=False)
+    read_dates = serializers.ListField(
+        child=serializers.DateField(),
+        required=False,
+        max_length=3660
+    )
+
+
+class IsbnLookupSerializer(serializers.Serializer):
+    """Serializer for the ISBNs sent to the metadata lookup"""
+    isbns = serializers.ListField(
+        child=serializers.CharField(max_length=20),
+        allow_empty=False,
+        max_length=100
+    )
@@ -0,0 +1,349 @@
+"""
+Reading statistics engine.
+
+Per-year, per-month and per-weekday day counts and the longest streak are
+kept in ReadingStatsCounter, and runs of consecutive days in ReadingStreak.
+Both are updated as reading days are recorded, so reading the stats never
+scans ReadingDay.
+
+The reading calendar is served as one bitmap per year, cached in-process
+under a shared cache version that is bumped whenever days are recorded or
+the stats are rebuilt.
+"""
+import base64
+import threading
+from bisect import bisect_right
+from collections import Counter
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+
+
+LONGEST_STREAK = 'streak:longest'
+
+# Bits per year in the calendar bitmap, enough for leap years
+CALENDAR_BITS = 366
+
+CALENDAR_CACHE = 'reading-calendar'
+
+# version -> {year: bitmap}
+_calendars = (None, {})
+_calendars_lock = threading.Lock()
+
+
+def counter_keys(day):
+    """Get the counter keys a reading day counts towards"""
+    return [
+        f'year:{day.year}',
+        f'month:{day.year}-{day.month:02d}',
+        f'weekday:{day.weekday()}',
+    ]
+
+
+def lock_stats():
+    """
+    Lock the stats for the rest of the transaction, so concurrent requests
+    recording days update the aggregates one after the other. SQLite has
+    no row locks; there the IMMEDIATE transaction mode set in DATABASES
+    makes writers queue for the database lock instead of failing with
+    "database is locked".
+    """
+    from .models import ReadingStatsCounter
+
+    ReadingStatsCounter.objects.get_or_create(key=LONGEST_STREAK)
+    ReadingStatsCounter.objects.select_for_update().get(key=LONGEST_STREAK)
+
+
+def record_days(days):
+    """
+    Record reading days, ignoring any that are already recorded, and update
+    the aggregates. Returns the days that were newly recorded.
+    """
+    from .models import ReadingDay
+
+    days = sorted(set(days))
+    if not days:
+        return []
+
+    with transaction.atomic():
+        lock_stats()
+        # The streaks cover exactly the recorded days, so they tell which
+        # days are new without reading ReadingDay. Every day is inserted
+        # anyway and the unique constraint on read_date skips the others.
+        streaks = nearby_streaks(days)
+        new_days = days_outside(streaks, days)
+        ReadingDay.objects.bulk_create(
+            [ReadingDay(read_date=day) for day in days],
+            ignore_conflicts=True
+        )
+        add_days(new_days, streaks)
+    return new_days
+
+
+def add_days(days, streaks=None):
+    """
+    Update the aggregates for reading days that were just inserted.
+    Must only be given days that weren't recorded before. ``streaks`` are
+    the streaks from nearby_streaks(), if the caller already has them.
+    """
+    from .models import ReadingStatsCounter
+
+    days = sorted(set(days))
+    if not days:
+        return
+
+    with transaction.atomic():
+        lock_stats()
+        add_to_counters(days)
+        longest = merge_streaks(days, nearby_streaks(days) if streaks is None else streaks)
+        # lock_stats() made sure the longest streak counter exists
+        ReadingStatsCounter.objects.filter(key=LONGEST_STREAK, days__lt=longest).update(days=longest)
+
+    clear_calendars()
+
+
+def add_to_counters(days):
+    """
+    Count new days towards their counters, with one UPDATE per year (for
+    the year and its months) and one for the weekdays
+    """
+    from .models import ReadingStatsCounter
+
+    groups = {}
+    for day in days:
+        year_key, month_key, weekday_key = counter_keys(day)
+        groups.setdefault(day.year, Counter()).update([year_key, month_key])
+        groups.setdefault('weekdays', Counter())[weekday_key] += 1
+
+    keys = [key for increments in groups.values() for key in increments]
+    existing = set(ReadingStatsCounter.objects.filter(key__in=keys).values_list('key', flat=True))
+    ReadingStatsCounter.objects.bulk_create([
+        ReadingStatsCounter(key=key, days=amount)
+        for increments in groups.values() for key, amount in increments.items()
+        if key not in existing
+    ])
+    for increments in groups.values():
+        updates = {key: amount for key, amount in increments.items() if key in existing}
+        if updates:
+            whens = [When(key=key, then=Value(amount)) for key, amount in updates.items()]
+            ReadingStatsCounter.objects.filter(key__in=updates).update(days=F('days') + Case(*whens, default=Value(0)))
+
+
+def nearby_streaks(days):
+    """
+    Get the streaks, by start, that overlap or touch the range of the given
+    sorted days
+    """
+    from .models import ReadingStreak
+
+    return list(ReadingStreak.objects.filter(
+        end__gte=days[0] - timedelta(days=1),
+        start__lte=days[-1] + timedelta(days=1),
+    ).order_by('start'))
+
+
+def days_outside(streaks, days):
+    """Get those of the days that aren't in any of the streaks, sorted by start"""
+    starts = [streak.start for streak in streaks]
+    outside = []
+    for day in days:
+        index = bisect_right(starts, day)
+        if not (index and streaks[index - 1].end >= day):
+            outside.append(day)
+    return outside
+
+
+def merge_streaks(days, streaks):
+    """
+    Add new days to the runs of consecutive days. The days are grouped into
+    runs of their own, which are joined to each other and to the given
+    nearby streaks where they touch. Returns the length of the longest run
+    the days ended up in.
+    """
+    from .models import ReadingStreak
+
+    # (start, end, streak or None for the new days), by start
+    runs = []
+    for day in days:
+        if runs and runs[-1][1] == day - timedelta(days=1):
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    spans = sorted(
+        [(start, end, None) for start, end in runs] + [(streak.start, streak.end, streak) for streak in streaks],
+        key=lambda span: span[0]
+    )
+
+    # Join touching spans; each group holds the spans joined into one run
+    groups = []
+    for start, end, streak in spans:
+        if groups and start <= groups[-1][1] + timedelta(days=1):
+            groups[-1][1] = max(groups[-1][1], end)
+            groups[-1][2].append(streak)
+        else:
+            groups.append([start, end, [streak]])
+
+    # Groups that are a single existing streak are left alone; the others
+    # replace the streaks they took in
+    changed = [(start, end, members) for start, end, members in groups if not (len(members) == 1 and members[0])]
+    replaced = [streak.pk for _, _, members in changed for streak in members if streak is not None]
+    if replaced:
+        ReadingStreak.objects.filter(pk__in=replaced).delete()
+    ReadingStreak.objects.bulk_create([ReadingStreak(start=start, end=end) for start, end, _ in changed])
+
+    return max(((end - start).days + 1 for start, end, _ in changed), default=0)
+
+
+def rebuild():
+    """
+    Recompute every aggregate from ReadingDay. Used after reading days are
+    deleted.
+    """
+    from .models import ReadingDay, ReadingStatsCounter, ReadingStreak
+
+    with transaction.atomic():
+        lock_stats()
+        ReadingStreak.objects.all().delete()
+        ReadingStatsCounter.objects.exclude(key=LONGEST_STREAK).delete()
+
+        counts = Counter()
+        runs = []
+        for day in ReadingDay.objects.order_by('read_date').values_list('read_date', flat=True).iterator():
+            counts.update(counter_keys(day))
+            if runs and runs[-1][1] == day - timedelta(days=1):
+                runs[-1][1] = day
+            else:
+                runs.append([day, day])
+
+        longest = max(((end - start).days + 1 for start, end in runs), default=0)
+        ReadingStatsCounter.objects.filter(key=LONGEST_STREAK).update(days=longest)
+        ReadingStatsCounter.objects.bulk_create(
+            [ReadingStatsCounter(key=key, days=days) for key, days in counts.items()]
+        )
+        ReadingStreak.objects.bulk_create(
+            [ReadingStreak(start=start, end=end) for start, end in runs]
+        )
+
+    clear_calendars()
+
+
+def schedule_rebuild(using='default'):
+    """
+    Rebuild the stats once the current transaction commits. Deleting many
+    days in one transaction (one post_delete each) still rebuilds once.
+    """
+    pending = transaction.get_connection(using).run_on_commit
+    if not any(func is rebuild for _, func, _ in pending):
+        transaction.on_commit(rebuild, using=using)
+
+
+def get_stats(today=None):
+    """Get the reading statistics from the precomputed aggregates"""
+    from .models import ReadingStatsCounter, ReadingStreak
+
+    counters = dict(ReadingStatsCounter.objects.values_list('key', 'days'))
+    latest = ReadingStreak.objects.order_by('-end').first()
+    return summarize(counters, latest, today or date.today())
+
+
+async def aget_stats(today=None):
+    """get_stats() for async views"""
+    from .models import ReadingStatsCounter, ReadingStreak
+
+    counters = {key: days async for key, days in ReadingStatsCounter.objects.values_list('key', 'days')}
+    latest = await ReadingStreak.objects.order_by('-end').afirst()
+    return summarize(counters, latest, today or date.today())
+
+
+def summarize(counters, latest, today):
+    """Shape the counters and the newest streak into the stats response"""
+    years = {}
+    months = {}
+    weekdays = [0] * 7
+    for key, days in counters.items():
+        kind, _, value = key.partition(':')
+        if kind == 'year':
+            years[value] = days
+        elif kind == 'month':
+            months[value] = days
+        elif kind == 'weekday':
+            weekdays[int(value)] = days
+
+    # The newest run is the current streak if it reaches today or yesterday
+    current_streak = 0
+    if latest and latest.end >= today - timedelta(days=1):
+        current_streak = latest.length
+
+    return {
+        'total_days_read': years.get(str(today.year), 0),
+        'current_year': today.year,
+        'days_by_year': dict(sorted(years.items())),
+        'days_by_month': dict(sorted(months.items())),
+        'days_by_weekday': weekdays,
+        'current_streak': current_streak,
+        'longest_streak': counters.get(LONGEST_STREAK, 0),
+    }
+
+
+def calendar_bitmap(year, days):
+    """
+    Pack the reading days of a year into CALENDAR_BITS bits, most significant
+    bit first: bit N is set if day N + 1 of the year (1 January is bit 0) was
+    a reading day. The last bit is always clear outside leap years.
+    """
+    bitmap = bytearray((CALENDAR_BITS + 7) // 8)
+    for day in days:
+        if day.year == year:
+            index = day.timetuple().tm_yday - 1
+            bitmap[index // 8] |= 0x80 >> (index % 8)
+    return bytes(bitmap)
+
+
+def clear_calendars(using='default'):
+    """Drop the cached calendar bitmaps in every process"""
+    global _calendars
+    from .caching import bump_cache_version
+    bump_cache_version(CALENDAR_CACHE, using=using)
+    with _calendars_lock:
+        _calendars = (None, {})
+
+
+def get_calendar(first_year, last_year):
+    """
+    Get the calendar bitmap of every year from first_year to last_year as a
+    dict of year -> bytes. Years that aren't cached are read from ReadingDay
+    in a single range query.
+    """
+    global _calendars
+    from .caching import get_cache_version
+    from .models import ReadingDay
+
+    years = range(first_year, last_year + 1)
+    version = get_cache_version(CALENDAR_CACHE)
+    with _calendars_lock:
+        if _calendars[0] != version:
+            _calendars = (version, {})
+        cache = _calendars[1]
+        calendars = {year: cache[year] for year in years if year in cache}
+    missing = [year for year in years if year not in calendars]
+
+    if missing:
+        days_by_year = {year: [] for year in missing}
+        read_dates = ReadingDay.objects.filter(
+            read_date__range=(date(missing[0], 1, 1), date(missing[-1], 12, 31))
+        ).values_list('read_date', flat=True)
+        for day in read_dates.iterator():
+            if day.year in days_by_year:
+                days_by_year[day.year].append(day)
+
+        loaded = {year: calendar_bitmap(year, days) for year, days in days_by_year.items()}
+        # Only kept if nothing was recorded in the meantime
+        cache.update(loaded)
+        calendars.update(loaded)
+
+    return {year: calendars[year] for year in years}
+
+
+def encode_calendar(bitmap):
+    return base64.b64encode(bitmap).decode('ascii')
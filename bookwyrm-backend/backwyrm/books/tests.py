@@ -1,3 +1,1734 @@
-from django.test import TestCase
+import base64
+import os
+import runpy
+import shutil
+import tempfile
+import time
+import uuid
+from concurrent.futures import Future
+from datetime import date, timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F, QuerySet
+from django.db.utils import ConnectionHandler
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import Resolver404, URLResolver, resolve
+from django.urls.resolvers import RegexPattern
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.test import APITestCase
+
+from backwyrm import settings as project_settings
+from backwyrm import urls as project_urls
+
+from . import caching, covers, facets, labels, models, search, thumbnails
+from . import stats as reading_stats
+from .async_views import async_reads
+from .covers import CoverFetcher, resolve_cover
+from .metadata import MetadataClient, lookup_isbns, to_isbn13
+from .models import (
+    Book, BookCover, BookPhoto, BookTombstone, CacheVersion, Genre, IsbnMetadata, Label, PhotoUpload, ReadingDay, ReadingStatsCounter, ReadingStreak,
+    get_genre_names
+)
+from .renderers import FastJSONRenderer
+from .serializers import BookRowSerializer, BookSerializer, RowSerializer
+from .uploads import upload_session_path
+from .views import BookViewSet
+
+
+def reset_caches():
+    """Drop the in-process caches, which outlive the rolled back test transactions"""
+    models._genre_names = None
+    reading_stats._calendars = (None, {})
+    facets._facets = None
+    with caching._versions_lock:
+        caching._versions.clear()
+
+
+def image_bytes(color='red', size=(40, 30), image_format='JPEG'):
+    from PIL import Image
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, image_format)
+    return buffer.getvalue()
+
+
+class MediaTestCase(APITestCase):
+    """Keeps uploaded photos and upload sessions in a temporary directory"""
+
+    def setUp(self):
+        super().setUp()
+        reset_caches()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            BOOK_PHOTO_UPLOAD_DIR=f'{self.media_root}/upload_sessions',
+            BOOK_COVER_FETCHER=None,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload_photo(self, book, color='red'):
+        photo = SimpleUploadedFile('photo.jpg', image_bytes(color), content_type='image/jpeg')
+        response = self.client.post('/api/book-photos/', {'book': book.pk, 'photo': photo}, format='multipart')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()
+
+
+class DeferredExecutor:
+    """Runs submitted jobs in the test's own thread, when told to"""
+
+    def __init__(self, run_at_once=True):
+        self.run_at_once = run_at_once
+        self.jobs = []
+
+    def submit(self, fn, *args):
+        future = Future()
+        self.jobs.append((future, fn, args))
+        if self.run_at_once:
+            self.run()
+        return future
+
+    def run(self):
+        jobs, self.jobs = self.jobs, []
+        for future, fn, args in jobs:
+            future.set_result(fn(*args))
+
+
+class CacheTestCase(APITestCase):
+    def setUp(self):
+        reset_caches()
+
+    def bump_elsewhere(self, name):
+        """Bump a cache version the way another process would, leaving this one's memory alone"""
+        CacheVersion.objects.get_or_create(name=name)
+        CacheVersion.objects.filter(name=name).update(version=F('version') + 1)
+
+    def later(self, seconds=2):
+        """Move the clock that cache version reads are remembered by forward"""
+        now = time.monotonic() + seconds
+        return mock.patch('books.caching.time.monotonic', return_value=now)
+
+
+class PaginationTests(APITestCase):
+    def setUp(self):
+        now = timezone.now()
+        for number, page_count in enumerate([300, None, 120, None, 120]):
+            book = Book.objects.create(title=f'Book {number}', author='X', page_count=page_count)
+            # Pairs of books share a created_at, so the id has to break ties
+            Book.objects.filter(pk=book.pk).update(created_at=now - timedelta(minutes=number // 2))
+
+    def ids(self, queryset):
+        return list(queryset.values_list('id', flat=True))
+
+    def walk(self, path, **params):
+        """Follow the next links from the first page, returning the ids of every page"""
+        response = self.client.get(path, {'page_size': 2, **params})
+        pages = []
+        while True:
+            self.assertEqual(response.status_code, 200, response.content)
+            data = response.json()
+            pages.append([book['id'] for book in data['results']])
+            if not data['next']:
+                return pages
+            response = self.client.get(data['next'])
+
+    def test_without_parameters_the_list_is_not_paginated(self):
+        self.assertEqual(len(self.client.get('/api/books/').json()), 5)
+
+    def test_pages_break_ties_on_the_id(self):
+        pages = self.walk('/api/books/')
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual(sum(pages, []), self.ids(Book.objects.order_by('-created_at', 'id')))
+
+    def test_books_added_while_paging_do_not_shift_the_pages(self):
+        first = self.client.get('/api/books/', {'page_size': 2}).json()
+        Book.objects.create(title='New', author='X')
+        second = self.client.get(first['next']).json()
+        expected = self.ids(Book.objects.exclude(title='New').order_by('-created_at', 'id'))
+        self.assertEqual([book['id'] for book in first['results'] + second['results']], expected[:4])
+
+    def test_nulls_come_last_in_either_direction(self):
+        page_counts = dict(Book.objects.values_list('id', 'page_count'))
+        for ordering, expected in (('page_count', [120, 120, 300, None, None]), ('-page_count', [300, 120, 120, None, None])):
+            ids = sum(self.walk('/api/books/', ordering=ordering), [])
+            self.assertEqual([page_counts[book_id] for book_id in ids], expected, ordering)
+            self.assertEqual(len(set(ids)), 5, ordering)
+
+    def test_invalid_cursors_are_not_found(self):
+        for cursor in ('nope', base64.urlsafe_b64encode(b'[1]').decode(), base64.urlsafe_b64encode(b'["x", 1]').decode()):
+            response = self.client.get('/api/books/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 404, cursor)
+            self.assertEqual(response.json(), {'detail': 'Invalid cursor.'})
+
+    @override_settings(BOOKS_PAGE_SIZE=2, BOOKS_MAX_PAGE_SIZE=3)
+    def test_page_sizes_are_clamped(self):
+        for page_size, expected in (('0', 1), ('-5', 1), ('nope', 2), ('1000', 3)):
+            results = self.client.get('/api/books/', {'page_size': page_size}).json()['results']
+            self.assertEqual(len(results), expected, page_size)
+
+    def test_the_trash_is_paged_too(self):
+        Book.objects.filter(title__in=['Book 0', 'Book 1', 'Book 2']).soft_delete()
+        pages = self.walk('/api/books/trash/')
+        self.assertEqual(sum(pages, []), self.ids(Book.objects.filter(is_deleted=True).order_by('-created_at', 'id')))
+        self.assertEqual(sum(self.walk('/api/books/'), []), self.ids(Book.objects.filter(is_deleted=False).order_by('-created_at', 'id')))
+
+
+class PhotoListTests(MediaTestCase):
+    def add_books(self, count):
+        for number in range(count):
+            book = Book.objects.create(title=f'Book {number}', author='X')
+            for color in ('red', 'blue'):
+                self.upload_photo(book, color)
+
+    def test_photos_cost_one_query_however_many_books(self):
+        get_genre_names()
+        self.add_books(2)
+        for path in ('/api/books/?page_size=50', '/api/books/search/?q=book'):
+            # The first search also checks for the search index
+            self.client.get(path)
+            _, few = self.count_queries(path)
+            self.add_books(3)
+            response, more = self.count_queries(path)
+            self.assertEqual(more, few, path)
+            books = response.json()['results'] if 'page_size' in path else response.json()
+            self.assertTrue(all(len(book['photos']) == 2 for book in books))
+
+    def count_queries(self, path):
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            response = self.client.get(path)
+        return response, len(queries)
+
+    def test_photo_urls_are_absolute(self):
+        self.add_books(1)
+        photo = self.client.get('/api/books/').json()[0]['photos'][0]
+        name = BookPhoto.objects.get(pk=photo['id']).photo.name
+        self.assertEqual(photo['photo_url'], f'http://testserver/media/{name}')
+        self.assertEqual(photo['photo'], photo['photo_url'])
+        response = self.client.get('/api/books/', HTTP_HOST='books.example.com', secure=True)
+        self.assertTrue(response.json()[0]['photos'][0]['photo_url'].startswith('https://books.example.com/media/'))
+
+    def test_thumbnails_are_listed_once_they_are_ready(self):
+        self.add_books(1)
+        photo = BookPhoto.objects.first()
+        self.assertIsNone(self.client.get('/api/books/').json()[0]['photos'][0]['thumbnails'])
+
+        BookPhoto.objects.filter(pk=photo.pk).update(derivatives_ready=True)
+        photos = {p['id']: p for p in self.client.get('/api/books/').json()[0]['photos']}
+        root, _ = os.path.splitext(photo.photo.name)
+        self.assertEqual(photos[photo.pk]['thumbnails']['small']['webp'], f'http://testserver/media/{root}.small.webp')
+        self.assertEqual(set(photos[photo.pk]['thumbnails']), set(thumbnails.get_sizes()))
+
+
+class BookFilterTests(APITestCase):
+    def setUp(self):
+        Book.objects.create(title='Dune', author='Herbert', genre='sci-fi', language='en', rating=Decimal('4.5'),
+                            favorite=True, publication_date=date(1965, 8, 1))
+        Book.objects.create(title='Solaris', author='Lem', genre='sci-fi', language='pl', rating=Decimal('4.0'),
+                            publication_date=date(1961, 1, 1))
+        Book.objects.create(title='Emma', author='Austen', genre='romance', language='en', rating=Decimal('4.0'))
+        Book.objects.create(title='Unrated', author='Nobody', genre='fantasy', is_read=True)
+
+    def titles(self, **params):
+        response = self.client.get('/api/books/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [book['title'] for book in response.json()]
+
+    def test_status_filters(self):
+        self.assertEqual(self.titles(favorite='true'), ['Dune'])
+        self.assertEqual(sorted(self.titles(favorite='no')), ['Emma', 'Solaris', 'Unrated'])
+        self.assertEqual(self.titles(is_read='1', favorite='false'), ['Unrated'])
+        response = self.client.get('/api/books/', {'favorite': 'maybe'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('favorite', response.json())
+
+    def test_list_filters_match_any_value(self):
+        self.assertEqual(sorted(self.titles(genre='sci-fi')), ['Dune', 'Solaris'])
+        self.assertEqual(sorted(self.titles(genre='romance, fantasy')), ['Emma', 'Unrated'])
+        self.assertEqual(self.titles(genre='sci-fi', language='pl'), ['Solaris'])
+        self.assertEqual(len(self.titles(genre=' , ')), 4)
+
+    def test_rating_range(self):
+        self.assertEqual(sorted(self.titles(rating_min='4.1')), ['Dune'])
+        self.assertEqual(sorted(self.titles(rating_min='4', rating_max='4.0')), ['Emma', 'Solaris'])
+        for value in ['high', 'nan', 'Infinity', '-inf']:
+            self.assertEqual(self.client.get('/api/books/', {'rating_max': value}).status_code, 400, value)
+
+    def test_ordering(self):
+        self.assertEqual(self.titles(ordering='title'), ['Dune', 'Emma', 'Solaris', 'Unrated'])
+        self.assertEqual(self.titles(ordering='-rating,title'), ['Dune', 'Emma', 'Solaris', 'Unrated'])
+        self.assertEqual(self.titles(ordering='publication_date')[:2], ['Solaris', 'Dune'])
+        # Fields that can't be ordered on are ignored
+        self.assertEqual(self.titles(ordering='book_notes'), self.titles())
+
+    def test_ordered_pages_use_typed_cursors(self):
+        for ordering in ('-rating,title', 'publication_date', '-updated_at', 'author'):
+            expected = self.titles(ordering=ordering)
+            response = self.client.get('/api/books/', {'ordering': ordering, 'page_size': 1})
+            titles = []
+            while True:
+                data = response.json()
+                titles += [book['title'] for book in data['results']]
+                if not data['next']:
+                    break
+                response = self.client.get(data['next'])
+            self.assertEqual(titles, expected, ordering)
+
+    def test_filters_apply_to_pages_and_the_trash(self):
+        Book.objects.filter(title='Solaris').soft_delete()
+        response = self.client.get('/api/books/', {'genre': 'sci-fi', 'page_size': 1})
+        self.assertEqual([book['title'] for book in response.json()['results']], ['Dune'])
+        self.assertIsNone(response.json()['next'])
+        response = self.client.get('/api/books/trash/', {'language': 'pl'})
+        self.assertEqual([book['title'] for book in response.json()], ['Solaris'])
+
+
+class BulkEditTests(APITestCase):
+    def setUp(self):
+        self.books = [Book.objects.create(title=title, author='X') for title in ('A', 'B', 'C')]
+        self.ids = [book.pk for book in self.books]
+
+    def test_bulk_update_writes_every_book_at_once(self):
+        before = Book.objects.get(pk=self.ids[0]).updated_at
+        with self.assertNumQueries(3):
+            # The UPDATE and the savepoint around it
+            response = self.client.patch('/api/books/bulk_update/', {'ids': self.ids[:2], 'is_read': True}, format='json')
+        self.assertEqual(response.json(), {'updated': 2, 'ids': self.ids[:2]})
+        self.assertEqual(list(Book.objects.filter(is_read=True).order_by('id').values_list('id', flat=True)), self.ids[:2])
+        self.assertGreater(Book.objects.get(pk=self.ids[0]).updated_at, before)
+
+    def test_bulk_update_skips_books_in_the_trash(self):
+        Book.objects.filter(pk=self.ids[2]).soft_delete()
+        response = self.client.patch('/api/books/bulk_update/', {'ids': self.ids, 'favorite': True}, format='json')
+        self.assertEqual(response.json()['updated'], 2)
+        self.assertFalse(Book.objects.get(pk=self.ids[2]).favorite)
+
+    def test_bulk_update_validates_the_values(self):
+        for data in ({'ids': self.ids}, {'ids': self.ids, 'is_deleted': True}, {'ids': self.ids, 'rating': 'lots'},
+                     {'ids': [], 'is_read': True}, {'ids': ['one'], 'is_read': True}):
+            response = self.client.patch('/api/books/bulk_update/', data, format='json')
+            self.assertEqual(response.status_code, 400, data)
+        self.assertFalse(Book.objects.filter(is_deleted=True).exists())
+
+    def test_bulk_delete_moves_books_to_the_trash(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/books/bulk_delete/', {'ids': self.ids[:2] + [999999]}, format='json')
+        self.assertEqual(response.json(), {'deleted': 2, 'ids': self.ids[:2] + [999999]})
+        trash = Book.objects.filter(is_deleted=True)
+        self.assertEqual(trash.count(), 2)
+        self.assertFalse(trash.filter(deleted_at__isnull=True).exists())
+        # Books already in the trash keep their deletion date
+        deleted_at = Book.objects.get(pk=self.ids[0]).deleted_at
+        self.client.post('/api/books/bulk_delete/', {'ids': self.ids}, format='json')
+        self.assertEqual(Book.objects.get(pk=self.ids[0]).deleted_at, deleted_at)
+
+
+class TrashTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.book = Book.objects.create(title='A', author='X')
+        self.other = Book.objects.create(title='B', author='X')
+
+    def photo_path(self, book):
+        return BookPhoto.objects.get(book=book).photo.path
+
+    def test_deleting_moves_the_book_to_the_trash(self):
+        self.assertEqual(self.client.delete(f'/api/books/{self.book.pk}/').status_code, 204)
+        self.assertEqual([book['title'] for book in self.client.get('/api/books/').json()], ['B'])
+        trash = self.client.get('/api/books/trash/').json()
+        self.assertEqual([book['title'] for book in trash], ['A'])
+        self.assertIsNotNone(trash[0]['deleted_at'])
+
+    def test_restoring_returns_the_book(self):
+        self.book.soft_delete()
+        response = self.client.post(f'/api/books/{self.book.pk}/restore/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()['is_deleted'])
+        self.assertIsNone(response.json()['deleted_at'])
+        self.assertEqual(self.client.post(f'/api/books/{self.book.pk}/restore/').status_code, 400)
+
+    def test_soft_delete_and_restore_are_set_based(self):
+        books = Book.objects.filter(pk__in=[self.book.pk, self.other.pk])
+        with self.assertNumQueries(1):
+            self.assertEqual(books.soft_delete(), 2)
+        self.assertEqual(books.soft_delete(), 0)
+        with self.assertNumQueries(1):
+            self.assertEqual(books.restore(), 2)
+        self.assertFalse(Book.objects.filter(deleted_at__isnull=False).exists())
+
+    def test_purging_keeps_photo_files_other_books_share(self):
+        self.upload_photo(self.book)
+        self.upload_photo(self.other)
+        path = self.photo_path(self.book)
+        self.assertEqual(path, self.photo_path(self.other))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(Book.objects.filter(pk=self.book.pk).purge(), 1)
+        self.assertTrue(os.path.exists(path))
+        self.assertTrue(BookPhoto.objects.filter(book=self.other).exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f'/api/books/{self.other.pk}/permanent_delete/')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(BookPhoto.objects.exists())
+
+    def test_purging_leaves_tombstones(self):
+        Book.objects.filter(pk=self.book.pk).purge()
+        self.assertEqual(list(BookTombstone.objects.values_list('book_id', flat=True)), [self.book.pk])
+        self.assertEqual(Book.objects.none().purge(), 0)
+
+    def test_emptying_the_trash_only_purges_deleted_books(self):
+        self.book.soft_delete()
+        response = self.client.post('/api/books/empty_trash/')
+        self.assertEqual(response.json(), {'detail': 'Permanently deleted 1 books.'})
+        self.assertEqual(list(Book.objects.values_list('title', flat=True)), ['B'])
+
+
+class CleanupCommandTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        long_ago = timezone.now() - timedelta(days=40)
+        for number in range(5):
+            book = Book.objects.create(title=f'Old {number}', author='X')
+            book.soft_delete()
+        Book.objects.update(deleted_at=long_ago)
+        Book.objects.create(title='Recent', author='X').soft_delete()
+        Book.objects.create(title='Live', author='X')
+
+    def cleanup(self, *args):
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('cleanup_deleted_books', *args, stdout=out)
+        return out.getvalue()
+
+    def test_expired_books_are_purged_in_batches(self):
+        with mock.patch.object(models.BookQuerySet, 'purge', autospec=True, side_effect=models.BookQuerySet.purge) as purge:
+            output = self.cleanup('--batch-size', '2')
+        # Two full batches, one partial and one that finds nothing left
+        self.assertEqual(purge.call_count, 4)
+        self.assertIn('Successfully deleted 5 books', output)
+        self.assertEqual(sorted(Book.objects.values_list('title', flat=True)), ['Live', 'Recent'])
+        self.assertEqual(BookTombstone.objects.count(), 5)
+
+    def test_photos_go_with_their_books(self):
+        books = Book.objects.filter(title='Old 0')
+        deleted_at = books.get().deleted_at
+        # Photos can only be added to books outside the trash
+        books.restore()
+        self.upload_photo(books.get())
+        books.update(is_deleted=True, deleted_at=deleted_at)
+        path = BookPhoto.objects.get().photo.path
+        self.cleanup()
+        self.assertFalse(BookPhoto.objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+    def test_the_retention_period_can_be_changed(self):
+        Book.objects.filter(title='Recent').update(deleted_at=timezone.now() - timedelta(days=2))
+        self.cleanup('--days', '1')
+        self.assertEqual(list(Book.objects.values_list('title', flat=True)), ['Live'])
+
+    def test_a_dry_run_deletes_nothing(self):
+        output = self.cleanup('--dry-run')
+        self.assertIn('DRY RUN: Would delete 5 books', output)
+        self.assertIn('"Old 0" by X', output)
+        self.assertEqual(Book.objects.count(), 7)
+
+    def test_old_tombstones_are_pruned(self):
+        live = Book.objects.get(title='Live').pk
+        Book.objects.filter(pk=live).purge()
+        BookTombstone.objects.update(deleted_at=timezone.now() - timedelta(days=365))
+        Book.objects.filter(title='Recent').purge()
+        self.cleanup()
+        self.assertFalse(BookTombstone.objects.filter(book_id=live).exists())
+        # The recent purge and the five the command just made are kept
+        self.assertEqual(BookTombstone.objects.count(), 6)
+
+
+class DeltaSyncTests(APITestCase):
+    def setUp(self):
+        self.book = Book.objects.create(title='A', author='X')
+        self.other = Book.objects.create(title='B', author='X')
+        self.token = self.changes()['token']
+        # Leave the overlap window, which would send these again
+        Book.objects.update(updated_at=F('updated_at') - timedelta(minutes=1))
+
+    def changes(self, since=None):
+        response = self.client.get('/api/books/changes/', {'since': since} if since else {})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_the_first_sync_gets_every_book(self):
+        self.book.soft_delete()
+        data = self.changes()
+        self.assertEqual(sorted(book['title'] for book in data['changed']), ['A', 'B'])
+        self.assertEqual(data['deleted'], [])
+
+    def test_later_syncs_get_what_changed(self):
+        self.assertEqual(self.changes(self.token)['changed'], [])
+        self.client.patch(f'/api/books/{self.book.pk}/', {'title': 'A2'}, format='json')
+        self.other.soft_delete()
+        Book.objects.create(title='C', author='X')
+
+        changed = self.changes(self.token)['changed']
+        self.assertEqual(sorted((book['title'], book['is_deleted']) for book in changed),
+                         [('A2', False), ('B', True), ('C', False)])
+
+    def test_bulk_writes_are_seen(self):
+        Book.objects.filter(pk=self.book.pk).restore()
+        self.assertEqual(self.changes(self.token)['changed'], [])
+        self.client.patch('/api/books/bulk_update/', {'ids': [self.book.pk], 'favorite': True}, format='json')
+        self.assertEqual([book['id'] for book in self.changes(self.token)['changed']], [self.book.pk])
+
+    def test_permanent_deletes_come_back_as_ids(self):
+        Book.objects.filter(pk=self.book.pk).purge()
+        data = self.changes(self.token)
+        self.assertEqual(data['deleted'], [self.book.pk])
+        self.assertEqual(data['changed'], [])
+
+    def test_writes_just_before_the_token_are_sent_again(self):
+        Book.objects.filter(pk=self.book.pk).update(updated_at=timezone.now() - timedelta(seconds=1))
+        token = self.changes()['token']
+        self.assertEqual([book['id'] for book in self.changes(token)['changed']], [self.book.pk])
+
+    def test_changes_come_in_batches_across_the_overlap(self):
+        started = timezone.now()
+        token = self.changes()['token']
+        moments = {
+            'old': started - timedelta(seconds=3),
+            'overlap': started - timedelta(seconds=1),
+            'tied-1': started + timedelta(seconds=1),
+            'tied-2': started + timedelta(seconds=1),
+            'new': started + timedelta(seconds=2),
+        }
+        for title, moment in moments.items():
+            book = Book.objects.create(title=title, author='X')
+            Book.objects.filter(pk=book.pk).update(updated_at=moment)
+        Book.objects.filter(pk=self.other.pk).purge()
+
+        response = self.client.get('/api/books/changes/', {'since': token, 'page_size': 2})
+        batches = [response.json()]
+        while batches[-1]['next']:
+            # A book edited mid-sync moves to a later batch instead of being skipped
+            if len(batches) == 1:
+                Book.objects.filter(title='overlap').update(updated_at=timezone.now() + timedelta(seconds=5))
+            batches.append(self.client.get(batches[-1]['next']).json())
+
+        self.assertEqual(
+            [[book['title'] for book in batch['changed']] for batch in batches],
+            [['overlap', 'tied-1'], ['tied-2', 'new'], ['overlap']]
+        )
+        self.assertEqual([batch['deleted'] for batch in batches], [[self.other.pk], [], []])
+        self.assertEqual({batch['token'] for batch in batches}, {batches[0]['token']})
+
+    def test_bad_and_expired_tokens(self):
+        for token in ('yesterday', '9' * 30):
+            response = self.client.get('/api/books/changes/', {'since': token})
+            self.assertEqual(response.status_code, 400, token)
+            response = self.client.get('/api/books/changes/', {'since': self.token, 'started': token})
+            self.assertEqual(response.status_code, 400, token)
+        with override_settings(BOOKS_TOMBSTONE_DAYS=0):
+            response = self.client.get('/api/books/changes/', {'since': self.token})
+        self.assertEqual(response.status_code, 410)
+
+
+class GenreNameTests(CacheTestCase):
+    def test_books_are_served_without_a_genre_query_per_book(self):
+        for i in range(5):
+            Book.objects.create(title=f'Book {i}', author='Author', genre='fantasy')
+        get_genre_names()
+
+        # The list validators, the books and their photos; no genre lookups
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/books/?page_size=10')
+        names = {book['genre_name'] for book in response.json()['results']}
+        self.assertEqual(names, {'Fantasy'})
+
+    def test_unknown_codes_have_no_name(self):
+        Book.objects.create(title='Odd', author='Author', genre='bogus')
+        response = self.client.get('/api/books/')
+        self.assertIsNone(response.json()[0]['genre_name'])
+
+    def test_renaming_a_genre_reloads_the_map(self):
+        self.assertEqual(get_genre_names()['fantasy'], 'Fantasy')
+        with self.captureOnCommitCallbacks(execute=True):
+            Genre.objects.filter(code='fantasy').update(name='Fantasy & Myth')
+            models.clear_genre_names()
+        self.assertEqual(get_genre_names()['fantasy'], 'Fantasy & Myth')
+
+    def test_a_rename_in_another_process_is_picked_up(self):
+        self.assertEqual(get_genre_names()['fantasy'], 'Fantasy')
+
+        # What another worker's rename leaves behind: the new row and a
+        # bumped version, but nothing in this process's memory
+        Genre.objects.filter(code='fantasy').update(name='Myth')
+        self.bump_elsewhere(models.GENRE_NAMES_CACHE)
+
+        # The version is only checked once a second
+        self.assertEqual(get_genre_names()['fantasy'], 'Fantasy')
+        with self.later():
+            self.assertEqual(get_genre_names()['fantasy'], 'Myth')
+
+    def test_the_version_is_only_bumped_once_the_write_commits(self):
+        version = caching.get_cache_version(models.GENRE_NAMES_CACHE)
+        with self.captureOnCommitCallbacks() as callbacks:
+            Genre.objects.create(code='poetry-2', name='Verse')
+            self.assertEqual(caching.get_cache_version(models.GENRE_NAMES_CACHE), version)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(caching.get_cache_version(models.GENRE_NAMES_CACHE), version + 1)
+
+
+class GenreSyncTests(CacheTestCase):
+    def sync(self, genres):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/genres/sync/', genres, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_new_and_renamed_genres_are_upserted(self):
+        results = self.sync([
+            {'value': 'fantasy', 'label': 'Fantasy & Myth'},
+            {'value': 'solarpunk', 'label': 'Solarpunk'},
+            {'value': 'fantasy', 'label': 'Myth'},
+        ])
+        self.assertEqual([result['status'] for result in results], ['updated', 'created', 'updated'])
+        self.assertEqual(Genre.objects.get(code='fantasy').name, 'Myth')
+        self.assertEqual(Genre.objects.get(code='solarpunk').name, 'Solarpunk')
+        self.assertEqual(get_genre_names()['solarpunk'], 'Solarpunk')
+
+    def test_unchanged_genres_are_not_written(self):
+        genres = [{'value': code, 'label': name} for code, name in Genre.objects.values_list('code', 'name')]
+        with self.assertNumQueries(1):
+            results = self.sync(genres)
+        self.assertEqual({result['status'] for result in results}, {'updated'})
+
+    def test_incomplete_genres_are_reported(self):
+        results = self.sync([{'value': 'odd'}, 'fantasy', {'value': 'weird', 'label': 'Weird'}])
+        self.assertEqual([result['status'] for result in results], ['error', 'error', 'created'])
+        self.assertFalse(Genre.objects.filter(code='odd').exists())
+
+    def test_a_list_is_required(self):
+        response = self.client.post('/api/genres/sync/', {'value': 'fantasy'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ConditionalGetTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.book = Book.objects.create(title='The Hobbit', author='Tolkien')
+
+    def revalidate(self, path, etag):
+        return self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_books_are_not_modified(self):
+        for path in ('/api/books/', f'/api/books/{self.book.pk}/'):
+            response = self.client.get(path)
+            self.assertEqual(response['Cache-Control'], 'no-cache')
+            not_modified = self.revalidate(path, response['ETag'])
+            self.assertEqual(not_modified.status_code, 304)
+            self.assertEqual(not_modified['ETag'], response['ETag'])
+        detail = f'/api/books/{self.book.pk}/'
+        since = self.client.get(detail, HTTP_IF_MODIFIED_SINCE=self.client.get(detail)['Last-Modified'])
+        self.assertEqual(since.status_code, 304)
+
+    def test_deleting_a_book_is_not_hidden_by_if_modified_since(self):
+        other = Book.objects.create(title='Dune', author='Herbert')
+        response = self.client.get('/api/books/')
+        self.assertNotIn('Last-Modified', response)
+        since = timezone.now() + timedelta(minutes=1)
+
+        Book.objects.filter(pk=other.pk).soft_delete()
+        response = self.client.get('/api/books/', HTTP_IF_MODIFIED_SINCE=http_date(since.timestamp()))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([book['id'] for book in response.json()], [self.book.pk])
+
+    def test_a_304_on_the_list_takes_one_query(self):
+        etag = self.client.get('/api/books/')['ETag']
+        get_genre_names()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.revalidate('/api/books/', etag).status_code, 304)
+
+    def test_editing_a_book_changes_the_etags(self):
+        list_etag = self.client.get('/api/books/')['ETag']
+        detail_etag = self.client.get(f'/api/books/{self.book.pk}/')['ETag']
+        self.client.patch(f'/api/books/{self.book.pk}/', {'title': 'There and Back Again'}, format='json')
+        self.assertEqual(self.revalidate('/api/books/', list_etag).status_code, 200)
+        self.assertEqual(self.revalidate(f'/api/books/{self.book.pk}/', detail_etag).status_code, 200)
+
+    def test_adding_and_removing_a_photo_changes_the_etags(self):
+        detail = f'/api/books/{self.book.pk}/'
+        list_etag = self.client.get('/api/books/')['ETag']
+        etag = self.client.get(detail)['ETag']
+
+        photo = self.upload_photo(self.book)
+        response = self.revalidate(detail, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p['id'] for p in response.json()['photos']], [photo['id']])
+        self.assertEqual(self.revalidate('/api/books/', list_etag).status_code, 200)
+
+        etag = response['ETag']
+        self.client.delete(f'/api/book-photos/{photo["id"]}/')
+        response = self.revalidate(detail, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['photos'], [])
+
+    def test_renaming_the_genre_changes_the_etags(self):
+        etag = self.client.get(f'/api/books/{self.book.pk}/')['ETag']
+        genre = Genre.objects.get(code='unknown')
+        genre.name = 'Unsorted'
+        with self.captureOnCommitCallbacks(execute=True):
+            genre.save()
+        self.assertEqual(self.revalidate(f'/api/books/{self.book.pk}/', etag).status_code, 200)
+
+    def test_genres_are_revalidated_without_queries(self):
+        response = self.client.get('/api/genres/')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.revalidate('/api/genres/', response['ETag']).status_code, 304)
+        detail = self.client.get('/api/genres/fantasy/')
+        self.assertEqual(self.revalidate('/api/genres/fantasy/', detail['ETag']).status_code, 304)
+
+
+class ThumbnailTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.book = Book.objects.create(title='A', author='X')
+
+    def add_photo(self, size=(1200, 900)):
+        photo = SimpleUploadedFile('photo.jpg', image_bytes('green', size), content_type='image/jpeg')
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post('/api/book-photos/', {'book': self.book.pk, 'photo': photo}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        return BookPhoto.objects.get(pk=response.json()['id']), callbacks
+
+    def test_uploads_queue_their_derivatives_once_committed(self):
+        executor = DeferredExecutor(run_at_once=False)
+        with mock.patch('books.thumbnails.get_executor', return_value=executor):
+            photo, callbacks = self.add_photo()
+            self.assertEqual(executor.jobs, [])
+            for callback in callbacks:
+                callback()
+        self.assertEqual(len(executor.jobs), 1)
+        executor.run()
+        self.assertTrue(BookPhoto.objects.get(pk=photo.pk).derivatives_ready)
+
+    def test_every_size_and_format_is_rendered(self):
+        from PIL import Image
+        photo, _ = self.add_photo()
+        updated_at = Book.objects.get(pk=self.book.pk).updated_at
+        thumbnails.process_photo(photo.pk)
+
+        storage = photo.photo.storage
+        for name in thumbnails.derivative_names(photo.photo.name):
+            with storage.open(name) as image_file, Image.open(image_file) as image:
+                size = name.split('.')[-2]
+                self.assertEqual(max(image.size), thumbnails.get_sizes()[size], name)
+        self.assertTrue(BookPhoto.objects.get(pk=photo.pk).derivatives_ready)
+        # Clients caching the book need to see the new thumbnails
+        self.assertGreater(Book.objects.get(pk=self.book.pk).updated_at, updated_at)
+
+    def test_small_photos_are_not_scaled_up(self):
+        from PIL import Image
+        photo, _ = self.add_photo(size=(120, 90))
+        thumbnails.process_photo(photo.pk)
+        name = thumbnails.derivative_name(photo.photo.name, 'medium', 'webp')
+        with photo.photo.storage.open(name) as image_file, Image.open(image_file) as image:
+            self.assertEqual(image.size, (120, 90))
+
+    def test_failures_leave_the_photo_without_thumbnails(self):
+        photo, _ = self.add_photo()
+        with open(photo.photo.path, 'wb') as broken:
+            broken.write(b'not an image')
+        with self.assertLogs('books.thumbnails', 'ERROR'):
+            thumbnails.process_photo(photo.pk)
+        self.assertFalse(BookPhoto.objects.get(pk=photo.pk).derivatives_ready)
+        # Photos deleted before their turn are skipped
+        thumbnails.process_photo(999999)
+
+    def test_rendering_again_replaces_the_derivatives_in_place(self):
+        photo, _ = self.add_photo()
+        thumbnails.process_photo(photo.pk)
+        storage = photo.photo.storage
+        name = thumbnails.derivative_name(photo.photo.name, 'small', 'jpg')
+        first = storage.open(name).read()
+
+        with override_settings(BOOK_PHOTO_SIZES={'small': 100, 'medium': 600}):
+            with mock.patch.object(storage, 'delete', side_effect=AssertionError('deleted before replacing')):
+                thumbnails.process_photo(photo.pk)
+        self.assertNotEqual(storage.open(name).read(), first)
+        self.assertEqual(oct(os.stat(storage.path(name)).st_mode & 0o777), oct(0o644))
+        # Nothing is left behind next to the derivatives
+        self.assertEqual(
+            sorted(os.listdir(os.path.dirname(storage.path(name)))),
+            sorted(os.path.basename(n) for n in [photo.photo.name, *thumbnails.derivative_names(photo.photo.name)])
+        )
+
+    def test_derivatives_are_revalidated_but_originals_are_cached_for_good(self):
+        photo, _ = self.add_photo()
+        thumbnails.process_photo(photo.pk)
+        original = self.client.get(photo.photo.url)
+        self.assertIn('immutable', original['Cache-Control'])
+        derivative = self.client.get(photo.photo.storage.url(thumbnails.derivative_name(photo.photo.name, 'small', 'webp')))
+        self.assertEqual(derivative.status_code, 200)
+        self.assertNotIn('immutable', derivative['Cache-Control'])
+        self.assertIn('no-cache', derivative['Cache-Control'])
+
+    def test_derivatives_are_deleted_with_the_photo(self):
+        photo, _ = self.add_photo()
+        thumbnails.process_photo(photo.pk)
+        paths = [photo.photo.storage.path(name) for name in thumbnails.derivative_names(photo.photo.name)]
+        self.assertTrue(all(os.path.exists(path) for path in paths))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete(f'/api/book-photos/{photo.pk}/').status_code, 204)
+        self.assertFalse(any(os.path.exists(path) for path in paths))
+
+
+class PhotoUploadTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.book = Book.objects.create(title='The Hobbit', author='Tolkien')
+        self.image = image_bytes('blue', size=(64, 48))
+
+    def start(self, size=None):
+        response = self.client.post(
+            '/api/book-photos/uploads/', {'book': self.book.pk, 'size': size or len(self.image)}, format='json'
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()['id']
+
+    def send(self, upload_id, offset, data):
+        return self.client.generic(
+            'PATCH', f'/api/book-photos/uploads/{upload_id}/', data,
+            content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset)
+        )
+
+    def test_an_upload_can_be_resumed_and_completed(self):
+        upload_id = self.start()
+        half = len(self.image) // 2
+        self.assertEqual(self.send(upload_id, 0, self.image[:half]).json()['offset'], half)
+
+        # After a dropped connection the client asks where to carry on
+        self.assertEqual(self.client.get(f'/api/book-photos/uploads/{upload_id}/').json()['offset'], half)
+        self.assertEqual(self.send(upload_id, half, self.image[half:]).json()['offset'], len(self.image))
+
+        response = self.client.post(f'/api/book-photos/uploads/{upload_id}/complete/')
+        self.assertEqual(response.status_code, 201, response.content)
+        photo = BookPhoto.objects.get(pk=response.json()['id'])
+        with photo.photo.open('rb') as stored:
+            self.assertEqual(stored.read(), self.image)
+        self.assertFalse(PhotoUpload.objects.exists())
+
+    def test_a_chunk_at_the_wrong_offset_is_refused(self):
+        upload_id = self.start()
+        self.send(upload_id, 0, self.image[:10])
+        # A resent chunk whose response got lost
+        response = self.send(upload_id, 0, self.image[:10])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], 10)
+
+    def test_an_unfinished_upload_cannot_be_completed(self):
+        upload_id = self.start()
+        self.send(upload_id, 0, self.image[:10])
+        response = self.client.post(f'/api/book-photos/uploads/{upload_id}/complete/')
+        self.assertEqual(response.status_code, 409)
+
+    def test_chunks_past_the_declared_size_are_refused(self):
+        upload_id = self.start(size=10)
+        self.assertEqual(self.send(upload_id, 0, self.image[:20]).status_code, 413)
+        self.assertEqual(self.client.get(f'/api/book-photos/uploads/{upload_id}/').json()['offset'], 0)
+
+    def test_upload_ids_that_are_not_uuids_are_not_found(self):
+        self.assertEqual(self.send('abc-def', 0, b'x').status_code, 404)
+        self.assertEqual(self.client.post('/api/book-photos/uploads/abc-def/complete/').status_code, 404)
+        self.assertEqual(self.send(uuid.uuid4(), 0, b'x').status_code, 404)
+
+    def test_the_same_image_is_stored_once(self):
+        other = Book.objects.create(title='Another', author='Someone')
+        first = self.upload_photo(self.book, color='green')
+        second = self.upload_photo(other, color='green')
+        self.assertEqual(
+            BookPhoto.objects.get(pk=first['id']).photo.name,
+            BookPhoto.objects.get(pk=second['id']).photo.name
+        )
+
+    def test_images_that_are_not_photos_are_refused(self):
+        upload = SimpleUploadedFile('notes.txt', b'not an image', content_type='text/plain')
+        response = self.client.post('/api/book-photos/', {'book': self.book.pk, 'photo': upload}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+
+    def test_decompression_bombs_are_refused(self):
+        with mock.patch('PIL.Image.MAX_IMAGE_PIXELS', 100):
+            upload = SimpleUploadedFile('bomb.jpg', self.image, content_type='image/jpeg')
+            response = self.client.post(
+                '/api/book-photos/', {'book': self.book.pk, 'photo': upload}, format='multipart'
+            )
+        self.assertEqual(response.status_code, 413)
+
+    def test_purging_a_book_removes_its_unfinished_uploads(self):
+        upload_id = self.start()
+        self.send(upload_id, 0, self.image[:10])
+        path = upload_session_path(upload_id)
+        self.assertTrue(os.path.exists(path))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.filter(pk=self.book.pk).purge()
+        self.assertFalse(PhotoUpload.objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+    def test_cleanup_removes_abandoned_and_orphaned_upload_files(self):
+        abandoned = self.start()
+        PhotoUpload.objects.filter(pk=abandoned).update(created_at=timezone.now() - timedelta(days=2))
+        orphan = upload_session_path(uuid.uuid4())
+        open(orphan, 'wb').close()
+        old = time.time() - 2 * 24 * 60 * 60
+        os.utime(orphan, (old, old))
+        current = self.start()
+
+        call_command('cleanup_deleted_books', stdout=StringIO())
+        self.assertFalse(os.path.exists(upload_session_path(abandoned)))
+        self.assertFalse(os.path.exists(orphan))
+        self.assertTrue(os.path.exists(upload_session_path(current)))
+
+
+class MediaServingTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        os.makedirs(os.path.join(self.media_root, 'book_photos'))
+        self.content = bytes(range(256)) * 4
+        with open(os.path.join(self.media_root, 'book_photos', 'Mój zdjęcie 1.jpg'), 'wb') as f:
+            f.write(self.content)
+        self.url = '/media/book_photos/M%C3%B3j%20zdj%C4%99cie%201.jpg'
+
+    def test_files_are_served_with_validators(self):
+        response = self.client.get(self.url)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_byte_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.content[10:20])
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.content)}')
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=5000-').status_code, 416)
+
+    def test_paths_outside_media_root_are_not_found(self):
+        self.assertEqual(self.client.get('/media/../manage.py').status_code, 404)
+        self.assertEqual(self.client.get('/media/book_photos/missing.jpg').status_code, 404)
+
+    def test_content_addressed_files_are_cached_for_good(self):
+        name = f'{"ab" * 32}.jpg'
+        with open(os.path.join(self.media_root, 'book_photos', name), 'wb') as f:
+            f.write(b'x')
+        response = self.client.get(f'/media/book_photos/{name}')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('no-cache', self.client.get(self.url)['Cache-Control'])
+
+    @override_settings(MEDIA_SERVE_MODE='x-accel-redirect')
+    def test_accel_redirects_are_quoted(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/book_photos/M%C3%B3j%20zdj%C4%99cie%201.jpg')
+        self.assertEqual(response.content, b'')
+
+
+class ReadingStatsTests(CacheTestCase):
+    def record(self, *days):
+        for day in days:
+            ReadingDay.objects.create(read_date=day)
+
+    def streaks(self):
+        return list(ReadingStreak.objects.order_by('start').values_list('start', 'end'))
+
+    def test_adjacent_days_are_merged_into_one_streak(self):
+        self.record(date(2025, 6, 1), date(2025, 6, 3))
+        self.assertEqual(len(self.streaks()), 2)
+        # Joins the runs either side of it
+        self.record(date(2025, 6, 2))
+        self.assertEqual(self.streaks(), [(date(2025, 6, 1), date(2025, 6, 3))])
+        self.record(date(2025, 5, 31), date(2025, 6, 4))
+        self.assertEqual(self.streaks(), [(date(2025, 5, 31), date(2025, 6, 4))])
+        self.assertEqual(reading_stats.get_stats(today=date(2025, 6, 5))['longest_streak'], 5)
+
+    def test_deleting_a_day_splits_its_streak(self):
+        self.record(*(date(2025, 6, day) for day in range(1, 6)))
+        with self.captureOnCommitCallbacks(execute=True):
+            ReadingDay.objects.get(read_date=date(2025, 6, 3)).delete()
+        self.assertEqual(self.streaks(), [
+            (date(2025, 6, 1), date(2025, 6, 2)),
+            (date(2025, 6, 4), date(2025, 6, 5)),
+        ])
+        stats = reading_stats.get_stats(today=date(2025, 6, 5))
+        self.assertEqual(stats['longest_streak'], 2)
+        self.assertEqual(stats['days_by_month'], {'2025-06': 4})
+
+    def test_deleting_many_days_rebuilds_once(self):
+        self.record(*(date(2025, 6, day) for day in range(1, 11)))
+        with mock.patch('books.stats.rebuild') as rebuild:
+            with self.captureOnCommitCallbacks() as callbacks:
+                ReadingDay.objects.filter(read_date__lt=date(2025, 6, 8)).delete()
+        self.assertEqual(len([cb for cb in callbacks if cb is rebuild]), 1)
+
+    def test_counters(self):
+        self.record(date(2024, 12, 31), date(2025, 1, 1), date(2025, 1, 6))
+        stats = reading_stats.get_stats(today=date(2025, 1, 7))
+        self.assertEqual(stats['total_days_read'], 2)
+        self.assertEqual(stats['days_by_year'], {'2024': 1, '2025': 2})
+        self.assertEqual(stats['days_by_month'], {'2024-12': 1, '2025-01': 2})
+        # Tuesday, Wednesday and Monday
+        self.assertEqual(stats['days_by_weekday'], [1, 1, 1, 0, 0, 0, 0])
+        self.assertEqual(stats['current_streak'], 1)
+        self.assertEqual(stats['longest_streak'], 2)
+        # The current streak ends once a day is missed
+        self.assertEqual(reading_stats.get_stats(today=date(2025, 1, 8))['current_streak'], 0)
+
+    def test_a_failed_stats_update_leaves_no_day_behind(self):
+        with mock.patch('books.stats.merge_streaks', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                ReadingDay.objects.create(read_date=date(2025, 6, 1))
+        self.assertFalse(ReadingDay.objects.exists())
+        self.assertFalse(ReadingStatsCounter.objects.filter(key__startswith='year:').exists())
+
+    def test_the_endpoint_reads_the_counters(self):
+        self.record(date.today())
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/reading-stats/')
+        self.assertEqual(response.json()['total_days_read'], 1)
+        self.assertEqual(response.json()['current_streak'], 1)
+
+
+class RecordReadingDaysTests(CacheTestCase):
+    def post(self, data):
+        return self.client.post('/api/reading-stats/', data, format='json')
+
+    def test_recording_a_day(self):
+        response = self.post({'read_date': '2025-06-01'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['recorded'], ['2025-06-01'])
+        self.assertTrue(ReadingDay.objects.filter(read_date=date(2025, 6, 1)).exists())
+
+    def test_recording_a_day_again_is_not_an_error(self):
+        self.post({'read_date': '2025-06-01'})
+        response = self.post({'read_date': '2025-06-01'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['recorded'], [])
+        self.assertEqual(response.json()['already_recorded'], ['2025-06-01'])
+        self.assertEqual(ReadingDay.objects.count(), 1)
+        self.assertEqual(ReadingStatsCounter.objects.get(key='year:2025').days, 1)
+
+    def test_recording_a_backlog(self):
+        self.post({'read_date': '2025-06-02'})
+        response = self.post({'read_dates': ['2025-06-03', '2025-06-01', '2025-06-02', '2025-06-03']})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['recorded'], ['2025-06-01', '2025-06-03'])
+        self.assertEqual(response.json()['already_recorded'], ['2025-06-02'])
+        self.assertEqual(ReadingStreak.objects.get().length, 3)
+        self.assertEqual(ReadingStatsCounter.objects.get(key='month:2025-06').days, 3)
+
+    def test_new_days_join_the_streaks_around_them(self):
+        reading_stats.record_days([date(2025, 6, 3), date(2025, 6, 4), date(2025, 6, 10)])
+        days = [date(2025, 6, day) for day in (1, 2, 4, 5, 8, 12)]
+        self.assertEqual(reading_stats.record_days(days), [date(2025, 6, day) for day in (1, 2, 5, 8, 12)])
+        self.assertEqual(
+            list(ReadingStreak.objects.order_by('start').values_list('start', 'end')),
+            [(date(2025, 6, 1), date(2025, 6, 5)), (date(2025, 6, 8), date(2025, 6, 8)),
+             (date(2025, 6, 10), date(2025, 6, 10)), (date(2025, 6, 12), date(2025, 6, 12))]
+        )
+        self.assertEqual(ReadingStatsCounter.objects.get(key='month:2025-06').days, 8)
+        self.assertEqual(ReadingStatsCounter.objects.get(key='streak:longest').days, 5)
+
+    def test_a_long_backlog_takes_a_fixed_number_of_queries(self):
+        reading_stats.record_days([date(2016, 1, 1) + timedelta(days=2 * n) for n in range(100)])
+        days = [date(2016, 1, 1) + timedelta(days=n) for n in range(3660)]
+        queries = []
+        with connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+            recorded = reading_stats.record_days(days)
+        self.assertEqual(len(recorded), 3560)
+        self.assertLess(len(queries), 40)
+        self.assertEqual(ReadingStreak.objects.get().length, 3660)
+        self.assertEqual(ReadingStatsCounter.objects.get(key='year:2016').days, 366)
+        self.assertEqual(ReadingStatsCounter.objects.get(key='month:2020-02').days, 29)
+        stats = reading_stats.get_stats(today=days[-1])
+        self.assertEqual(sum(stats['days_by_year'].values()), 3660)
+        self.assertEqual(stats['longest_streak'], 3660)
+        self.assertEqual(sum(stats['days_by_weekday']), 3660)
+
+    def test_today_is_recorded_by_default(self):
+        self.assertEqual(self.post({}).json()['recorded'], [date.today().isoformat()])
+
+    def test_invalid_dates_are_refused(self):
+        self.assertEqual(self.post({'read_date': 'yesterday'}).status_code, 400)
+        self.assertFalse(ReadingDay.objects.exists())
+
+
+class ReadingCalendarTests(CacheTestCase):
+    def calendar(self, query=''):
+        response = self.client.get(f'/api/reading-stats/calendar/{query}')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def days(self, year_data, year):
+        bitmap = base64.b64decode(year_data['bitmap'])
+        return [
+            date(year, 1, 1) + timedelta(days=bit)
+            for bit in range(reading_stats.CALENDAR_BITS)
+            if bitmap[bit // 8] & (0x80 >> (bit % 8))
+        ]
+
+    def test_days_are_packed_into_a_bitmap_per_year(self):
+        days = [date(2024, 1, 1), date(2024, 12, 31), date(2025, 3, 1)]
+        with self.captureOnCommitCallbacks(execute=True):
+            reading_stats.record_days(days)
+        data = self.calendar('?from=2024&to=2025-06-01')
+        self.assertEqual(data['bits'], 366)
+        self.assertEqual(data['years']['2024']['days_read'], 2)
+        self.assertEqual(self.days(data['years']['2024'], 2024), days[:2])
+        self.assertEqual(self.days(data['years']['2025'], 2025), days[2:])
+
+    def test_invalid_ranges_are_refused(self):
+        for query in ('?from=2025&to=2024', '?from=nope', '?from=1900&to=2000'):
+            self.assertEqual(self.client.get(f'/api/reading-stats/calendar/{query}').status_code, 400)
+
+    def test_cached_years_are_not_read_again(self):
+        self.calendar('?from=2025&to=2025')
+        with self.assertNumQueries(1):
+            # Only the cache version is checked
+            self.calendar('?from=2025&to=2025')
+
+    def test_recording_a_day_updates_the_calendar(self):
+        self.assertEqual(self.calendar('?from=2025')['years']['2025']['days_read'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/reading-stats/', {'read_date': '2025-06-01'}, format='json')
+        self.assertEqual(self.calendar('?from=2025')['years']['2025']['days_read'], 1)
+
+    def test_a_day_recorded_by_another_process_is_picked_up(self):
+        self.assertEqual(self.calendar('?from=2025')['years']['2025']['days_read'], 0)
+        # What another worker leaves behind: the day and a bumped version
+        ReadingDay.objects.bulk_create([ReadingDay(read_date=date(2025, 6, 1))])
+        self.bump_elsewhere(reading_stats.CALENDAR_CACHE)
+        self.assertEqual(self.calendar('?from=2025')['years']['2025']['days_read'], 1)
+
+
+class SearchTests(APITestCase):
+    def setUp(self):
+        Book.objects.create(title='The Hobbit', author='J. R. R. Tolkien', tags='adventure')
+        Book.objects.create(title='Letters', author='J. R. R. Tolkien', book_notes='Mentions the hobbit')
+        Book.objects.create(title='Dune', author='Frank Herbert', vibes='sandy')
+
+    def search(self, query, **params):
+        response = self.client.get('/api/books/search/', {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def titles(self, query, **params):
+        return [book['title'] for book in self.search(query, **params)]
+
+    def test_the_index_is_installed(self):
+        self.assertTrue(search.fts_available())
+
+    def test_every_word_matches_the_start_of_a_word(self):
+        self.assertEqual(self.titles('hob tolk'), ['The Hobbit', 'Letters'])
+        self.assertEqual(self.titles('hobbit herbert'), [])
+        self.assertEqual(self.titles('obbit'), [])
+
+    def test_better_matches_come_first(self):
+        Book.objects.create(title='Hobbit notes', author='Someone', book_notes='hobbit hobbit hobbit')
+        self.assertEqual(self.titles('hobbit')[-1], 'Letters')
+
+    def test_results_can_be_ordered(self):
+        self.assertEqual(self.titles('tolkien', ordering='title'), ['Letters', 'The Hobbit'])
+
+    def test_pages_follow_the_ranking_and_the_ordering(self):
+        for params in ({}, {'ordering': '-title'}):
+            expected = self.titles('tolkien', **params)
+            page = self.search('tolkien', page_size=1, **params)
+            titles = [book['title'] for book in page['results']]
+            while page['next']:
+                page = self.client.get(page['next']).json()
+                titles += [book['title'] for book in page['results']]
+            self.assertEqual(titles, expected)
+
+    def test_the_index_follows_writes(self):
+        Book.objects.filter(title='Dune').update(title='Dune Messiah')
+        self.assertEqual(self.titles('messiah'), ['Dune Messiah'])
+        self.assertEqual(self.titles('sandy'), ['Dune Messiah'])
+
+        Book.objects.filter(title='The Hobbit').soft_delete()
+        self.assertEqual(self.titles('hobbit'), ['Letters'])
+        Book.objects.filter(title='Letters').purge()
+        self.assertEqual(self.titles('hobbit'), [])
+
+    def test_without_the_index_search_falls_back_to_substrings(self):
+        with mock.patch('books.search.fts_available', return_value=False):
+            self.assertEqual(self.titles('hob tolk'), ['The Hobbit', 'Letters'])
+            self.assertEqual(self.titles('herbert', ordering='title'), ['Dune'])
+
+    def test_a_query_is_required(self):
+        self.assertEqual(self.client.get('/api/books/search/').status_code, 400)
+        self.assertEqual(self.titles('!!'), [])
+
+    def test_migrations_leave_the_triggers_in_place(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'books_book'")
+            triggers = {name for name, in cursor.fetchall()}
+        self.assertTrue(set(search.FTS_TRIGGERS) <= triggers, triggers)
+        self.assertEqual(search.check_search_triggers(None, databases=['default']), [])
+
+    def test_the_check_reports_missing_triggers(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TRIGGER {search.FTS_TABLE}_update')
+        errors = search.check_search_triggers(None, databases=['default'])
+        self.assertEqual([error.id for error in errors], ['books.E001'])
+        self.assertIn('books_book_fts_update', errors[0].msg)
+
+    def test_the_migration_can_be_reversed(self):
+        from django.apps import apps
+        migration = import_module('books.migrations.0026_book_search_index')
+        schema_editor = mock.Mock(connection=connection)
+        schema_editor.execute = lambda sql: connection.cursor().execute(sql)
+
+        migration.drop_search_index(apps, schema_editor)
+        self.assertFalse(search.fts_available())
+        migration.create_search_index(apps, schema_editor)
+        self.assertTrue(search.fts_available())
+        self.assertEqual(self.titles('dune'), ['Dune'])
+
+
+class LabelTests(APITestCase):
+    def labels(self, book):
+        return sorted(f'{label.kind}: {label.name}' for label in book.labels.all())
+
+    def test_labels_follow_the_fields(self):
+        book = Book.objects.create(title='A', author='X', tags='Cozy, dark academia,,cozy', vibes='Slow')
+        self.assertEqual(self.labels(book), ['tag: cozy', 'tag: dark academia', 'vibe: slow'])
+
+        book.tags = 'cozy'
+        book.save()
+        self.assertEqual(self.labels(book), ['tag: cozy', 'vibe: slow'])
+
+    def test_labels_no_book_has_are_deleted(self):
+        book = Book.objects.create(title='A', author='X', tags='cozy, gothic')
+        Book.objects.create(title='B', author='X', tags='cozy')
+        book.tags = ''
+        book.save()
+        self.assertEqual(sorted(Label.objects.values_list('name', flat=True)), ['cozy'])
+
+    def test_saves_that_leave_the_labels_alone_skip_the_sync(self):
+        with mock.patch('books.labels.sync_labels') as sync_labels:
+            Book.objects.create(title='A', author='X')
+            book = Book.objects.create(title='B', author='X', tags='cozy')
+            self.assertEqual(sync_labels.call_count, 1)
+
+            book = Book.objects.get(pk=book.pk)
+            book.title = 'C'
+            book.save()
+            book.tags = 'cozy'
+            book.save(update_fields=['tags'])
+            self.assertEqual(sync_labels.call_count, 1)
+
+            book.tags = 'gothic'
+            book.save()
+            self.assertEqual(sync_labels.call_count, 2)
+
+    def test_bulk_updates_sync_the_labels(self):
+        books = [Book.objects.create(title=title, author='X', tags='cozy') for title in 'AB']
+        response = self.client.patch(
+            '/api/books/bulk_update/', {'ids': [book.pk for book in books], 'tags': 'gothic'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.labels(books[0]), ['tag: gothic'])
+        self.assertFalse(Label.objects.filter(name='cozy').exists())
+
+    def test_filtering_by_label(self):
+        Book.objects.create(title='A', author='X', tags='Cozy')
+        Book.objects.create(title='B', author='X', tags='gothic', vibes='cozy')
+        response = self.client.get('/api/books/?tag=cozy')
+        self.assertEqual([book['title'] for book in response.json()], ['A'])
+
+    def test_purge_deletes_the_labels_only_those_books_had(self):
+        book = Book.objects.create(title='A', author='X', tags='cozy, gothic')
+        Book.objects.create(title='B', author='X', tags='cozy')
+        Book.objects.filter(pk=book.pk).purge()
+        self.assertEqual(list(Label.objects.values_list('name', flat=True)), ['cozy'])
+
+    def test_the_migration_backfills_existing_books(self):
+        from django.apps import apps
+        backfill = import_module('books.migrations.0027_book_labels')
+        Book.objects.bulk_create([Book(title='A', author='X', additional_genres='Mystery', tags='cozy, gothic')])
+        Book.objects.bulk_create([Book(title='B', author='X', tags='Cozy')])
+        with mock.patch.object(backfill, 'BACKFILL_BATCH_SIZE', 1):
+            backfill.backfill_labels(apps, mock.Mock(connection=mock.Mock(alias='default')))
+        self.assertEqual(self.labels(Book.objects.get(title='A')), ['genre: mystery', 'tag: cozy', 'tag: gothic'])
+        self.assertEqual(self.labels(Book.objects.get(title='B')), ['tag: cozy'])
+
+
+class FacetTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        Book.objects.create(title='A', author='X', genre='fantasy', favorite=True)
+        Book.objects.create(title='B', author='X', genre='fantasy', is_read=True)
+        Book.objects.create(title='C', author='X', genre='horror', is_deleted=True)
+
+    def facets(self):
+        response = self.client.get('/api/books/facets/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_counts(self):
+        data = self.facets()
+        self.assertEqual(data['total'], 2)
+        self.assertEqual(data['trash'], 1)
+        self.assertEqual(data['status']['favorite'], 1)
+        self.assertEqual(data['status']['is_read'], 1)
+        self.assertEqual(data['status']['shelved'], 0)
+        self.assertEqual(data['genres'], [{'code': 'fantasy', 'name': 'Fantasy', 'count': 2}])
+
+    def test_label_counts(self):
+        Book.objects.create(
+            title='D', author='X', additional_genres='Mystery', tags='Cozy, dark academia', vibes='cozy'
+        )
+        Book.objects.create(title='E', author='X', tags='cozy')
+        Book.objects.create(title='F', author='X', tags='cozy, gothic', is_deleted=True)
+        self.assertEqual(self.facets()['labels'], {
+            'genre': [{'name': 'mystery', 'count': 1}],
+            'tag': [{'name': 'cozy', 'count': 2}, {'name': 'dark academia', 'count': 1}],
+            'vibe': [{'name': 'cozy', 'count': 1}],
+        })
+
+    def test_label_changes_update_the_counts(self):
+        book = Book.objects.create(title='D', author='X', tags='cozy')
+        self.assertEqual(self.facets()['labels']['tag'], [{'name': 'cozy', 'count': 1}])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch('/api/books/bulk_update/', {'ids': [book.pk], 'tags': 'gothic'}, format='json')
+        self.assertEqual(self.facets()['labels']['tag'], [{'name': 'gothic', 'count': 1}])
+
+        Book.objects.filter(pk=book.pk).soft_delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.filter(pk=book.pk).purge()
+        self.assertEqual(self.facets()['labels']['tag'], [])
+
+    def test_syncing_labels_bumps_the_version_only_on_change(self):
+        book = Book.objects.create(title='D', author='X', tags='cozy')
+        version = caching.get_cache_version(facets.FACETS_CACHE)
+        with self.captureOnCommitCallbacks(execute=True):
+            labels.sync_labels([book.pk])
+        self.assertEqual(caching.get_cache_version(facets.FACETS_CACHE), version)
+
+        # Bypass BookQuerySet, so only the label sync can bump the version
+        QuerySet.update(Book.objects.filter(pk=book.pk), tags='gothic')
+        with self.captureOnCommitCallbacks(execute=True):
+            labels.sync_labels([book.pk])
+        self.assertGreater(caching.get_cache_version(facets.FACETS_CACHE), version)
+
+    def test_cached_counts_cost_only_the_version_check(self):
+        self.facets()
+        get_genre_names()
+        with self.assertNumQueries(1):
+            self.facets()
+
+    def test_writes_in_this_process_update_the_counts(self):
+        self.facets()
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.create(title='D', author='X', genre='horror')
+        self.assertEqual(self.facets()['total'], 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.filter(title='A').soft_delete()
+        self.assertEqual(self.facets()['trash'], 2)
+
+    def test_writes_in_another_process_update_the_counts(self):
+        self.assertEqual(self.facets()['total'], 2)
+        Book.objects.bulk_create([Book(title='D', author='X', genre='horror')])
+        self.bump_elsewhere(facets.FACETS_CACHE)
+        self.assertEqual(self.facets()['total'], 3)
+
+    def test_cleanup_updates_the_counts(self):
+        Book.objects.filter(title='C').update(deleted_at=timezone.now() - timedelta(days=40))
+        self.assertEqual(self.facets()['trash'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('cleanup_deleted_books', stdout=StringIO())
+        self.assertEqual(self.facets()['trash'], 0)
+
+
+def load_settings(**environ):
+    """Run the settings module again under the given environment, returning its names"""
+    with mock.patch.dict(os.environ, environ):
+        return runpy.run_path(project_settings.__file__)
+
+
+class DatabaseSettingsTests(SimpleTestCase):
+    def databases_for(self, **environ):
+        return load_settings(**environ)['DATABASES']['default']
+
+    def test_sqlite_is_the_default(self):
+        database = self.databases_for()
+        self.assertEqual(database['ENGINE'], 'django.db.backends.sqlite3')
+        self.assertEqual(database['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+        self.assertEqual(self.databases_for(DATABASE_BUSY_TIMEOUT='5')['OPTIONS']['timeout'], 5)
+
+    def test_sqlite_connections_use_wal(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        database = {**self.databases_for(), 'NAME': os.path.join(directory, 'test.sqlite3')}
+        # A handler and alias of its own, away from the test database
+        handler = ConnectionHandler({'default': database, 'wal_check': database})
+        try:
+            with handler['wal_check'].cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                self.assertEqual(cursor.fetchone()[0], 'wal')
+                cursor.execute('PRAGMA synchronous')
+                # NORMAL
+                self.assertEqual(cursor.fetchone()[0], 1)
+        finally:
+            handler.close_all()
+
+    def test_postgresql(self):
+        database = self.databases_for(DATABASE_ENGINE='postgresql', DATABASE_NAME='library', DATABASE_CONN_MAX_AGE='30')
+        self.assertEqual(database['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual(database['NAME'], 'library')
+        self.assertEqual(database['CONN_MAX_AGE'], 30)
+        self.assertTrue(database['CONN_HEALTH_CHECKS'])
+        self.assertNotIn('pool', database['OPTIONS'])
+
+    def test_postgresql_pool(self):
+        database = self.databases_for(DATABASE_ENGINE='postgresql', DATABASE_POOL_SIZE='8')
+        # Pooled connections go back to the pool after each request
+        self.assertEqual(database['CONN_MAX_AGE'], 0)
+        self.assertEqual(database['OPTIONS']['pool']['max_size'], 8)
+
+
+class ServingSettingsTests(SimpleTestCase):
+    def test_hosts_come_from_the_environment(self):
+        loaded = load_settings(DJANGO_DEBUG='false', DJANGO_ALLOWED_HOSTS='192.168.0.57, books.lan,')
+        self.assertFalse(loaded['DEBUG'])
+        self.assertEqual(loaded['ALLOWED_HOSTS'], ['192.168.0.57', 'books.lan'])
+
+    def test_static_files_are_left_to_the_web_server(self):
+        with override_settings(DEBUG=False):
+            urls = URLResolver(RegexPattern(r'^/'), runpy.run_path(project_urls.__file__)['urlpatterns'])
+        with self.assertRaises(Resolver404):
+            urls.resolve('/static/admin/css/base.css')
+
+    def test_gunicorn_uses_a_small_fixed_pool(self):
+        config = os.path.join(os.path.dirname(os.path.dirname(project_settings.__file__)), 'gunicorn.conf.py')
+        with mock.patch.dict(os.environ):
+            os.environ.pop('WEB_CONCURRENCY', None)
+            os.environ.pop('GUNICORN_THREADS', None)
+            loaded = runpy.run_path(config)
+        self.assertEqual((loaded['workers'], loaded['threads']), (2, 2))
+        with mock.patch.dict(os.environ, {'WEB_CONCURRENCY': '4'}):
+            self.assertEqual(runpy.run_path(config)['workers'], 4)
+
+
+class FakeCoverFetcher(CoverFetcher):
+    """Finds a cover for every ISBN starting with 978, and nothing by title"""
+    calls = []
+
+    def fetch(self, isbn=None, title=None, author=None):
+        self.calls.append(isbn or title)
+        if isbn and isbn.startswith('978'):
+            return image_bytes('purple'), f'https://covers.example/{isbn}.jpg'
+        return None
+
+
+class CoverTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        FakeCoverFetcher.calls = []
+        self.settings_override = override_settings(BOOK_COVER_FETCHER='books.tests.FakeCoverFetcher')
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def scheduled(self, action):
+        with mock.patch('books.covers.schedule_covers') as schedule:
+            action()
+        return [book_id for call in schedule.call_args_list for book_id in call.args[0]]
+
+    def test_fetchers_must_implement_fetch(self):
+        with self.assertRaises(TypeError):
+            CoverFetcher()
+
+    def test_lookups_are_queued_only_when_they_could_find_something_new(self):
+        book_ids = self.scheduled(lambda: Book.objects.create(title='Dune', author='Herbert'))
+        book = Book.objects.get()
+        self.assertEqual(book_ids, [book.pk])
+
+        cover = BookCover.objects.create(key='isbn:1', status=BookCover.FOUND, image='covers/x.jpg')
+        Book.objects.filter(pk=book.pk).update(cover=cover)
+        book = Book.objects.get()
+        book.book_notes = 'Spice'
+        self.assertEqual(self.scheduled(book.save), [])
+        self.assertEqual(self.scheduled(lambda: self.client.patch(f'/api/books/{book.pk}/', {'rating': '4.50'}, format='json')), [])
+
+        book.title = 'Dune Messiah'
+        self.assertEqual(self.scheduled(book.save), [book.pk])
+        # Saved, so nothing has changed any more
+        self.assertEqual(self.scheduled(book.save), [])
+
+    def test_books_without_a_cover_are_looked_up_again(self):
+        Book.objects.create(title='Dune', author='Herbert')
+        book = Book.objects.get()
+        book.book_notes = 'Spice'
+        self.assertEqual(self.scheduled(book.save), [book.pk])
+
+    def test_covers_are_resolved_and_cached(self):
+        first = Book.objects.create(title='The Hobbit', author='Tolkien', isbn='9780261103344')
+        second = Book.objects.create(title='The Hobbit', author='J.R.R. Tolkien', isbn='978-0-261-10334-4')
+        self.assertIsNotNone(resolve_cover(first.pk))
+        self.assertEqual(resolve_cover(second.pk), Book.objects.get(pk=first.pk).cover_id)
+        # Both books share the one lookup
+        self.assertEqual(FakeCoverFetcher.calls, ['9780261103344'])
+
+        response = self.client.get(f'/api/books/{first.pk}/')
+        self.assertTrue(response.json()['cover_url'].startswith('http://testserver/media/covers/'))
+
+    def test_misses_are_cached_until_they_expire(self):
+        book = Book.objects.create(title='Obscure', author='Nobody')
+        self.assertIsNone(resolve_cover(book.pk))
+        self.assertIsNone(resolve_cover(book.pk))
+        self.assertEqual(FakeCoverFetcher.calls, ['Obscure'])
+
+        BookCover.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        resolve_cover(book.pk)
+        self.assertEqual(FakeCoverFetcher.calls, ['Obscure', 'Obscure'])
+
+    def test_lookups_have_their_own_threads(self):
+        self.assertIsNot(covers.get_executor(), thumbnails.get_executor())
+
+    @override_settings(BOOK_COVER_FETCHER=None)
+    def test_lookups_can_be_turned_off(self):
+        book = Book.objects.create(title='Dune', author='Herbert')
+        self.assertIsNone(resolve_cover(book.pk))
+        with self.captureOnCommitCallbacks() as callbacks:
+            covers.schedule_covers([book.pk])
+        self.assertEqual(callbacks, [])
+
+    def test_lookups_are_off_in_development(self):
+        self.assertIsNone(load_settings(DJANGO_DEBUG='true')['BOOK_COVER_FETCHER'])
+        self.assertEqual(load_settings(DJANGO_DEBUG='false')['BOOK_COVER_FETCHER'], 'books.covers.OpenLibraryCoverFetcher')
+        self.assertEqual(
+            load_settings(DJANGO_DEBUG='true', DJANGO_BOOK_COVER_FETCHER='books.tests.FakeCoverFetcher')['BOOK_COVER_FETCHER'],
+            'books.tests.FakeCoverFetcher'
+        )
+
+
+class FakeMetadataClient(MetadataClient):
+    """Knows every ISBN ending in 4"""
+
+    def __init__(self):
+        self.calls = []
+
+    def fetch(self, isbn):
+        self.calls.append(isbn)
+        return {'title': f'Edition {isbn}'} if isbn.endswith('4') else None
+
+
+class IsbnMetadataTests(TestCase):
+    def use_executor(self, executor):
+        patcher = mock.patch('books.metadata.get_executor', return_value=executor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return executor
+
+    def test_isbns_are_normalized(self):
+        self.assertEqual(to_isbn13('0-261-10334-2'), '9780261103344')
+        self.assertEqual(to_isbn13('978-0-261-10334-4'), '9780261103344')
+        self.assertIsNone(to_isbn13('0261103343'))
+        self.assertIsNone(to_isbn13('hobbit'))
+
+    def test_fetchers_must_implement_fetch(self):
+        with self.assertRaises(TypeError):
+            MetadataClient()
+
+    def test_results_are_cached(self):
+        self.use_executor(DeferredExecutor())
+        client = FakeMetadataClient()
+        results = lookup_isbns(['9780261103344', '9780000000002'], client=client)
+        self.assertEqual(results['9780261103344'], ('found', {'title': 'Edition 9780261103344'}))
+        self.assertEqual(results['9780000000002'], ('missing', None))
+
+        again = lookup_isbns(['9780261103344', '9780000000002'], client=client)
+        self.assertEqual(again, results)
+        self.assertEqual(len(client.calls), 2)
+
+    @override_settings(ISBN_METADATA_TIMEOUT=0)
+    def test_lookups_that_outlast_the_request_are_still_cached(self):
+        executor = self.use_executor(DeferredExecutor(run_at_once=False))
+        client = FakeMetadataClient()
+        self.assertEqual(lookup_isbns(['9780261103344'], client=client)['9780261103344'], ('pending', None))
+        self.assertFalse(IsbnMetadata.objects.exists())
+
+        # The lookup finishes after the request gave up on it
+        executor.run()
+        self.assertEqual(lookup_isbns(['9780261103344'], client=client)['9780261103344'][0], 'found')
+        self.assertEqual(client.calls, ['9780261103344'])
+
+    @override_settings(ISBN_METADATA_TIMEOUT=0)
+    def test_concurrent_requests_share_a_lookup(self):
+        executor = self.use_executor(DeferredExecutor(run_at_once=False))
+        client = FakeMetadataClient()
+        lookup_isbns(['9780261103344'], client=client)
+        lookup_isbns(['9780261103344'], client=client)
+        self.assertEqual(len(executor.jobs), 1)
+        executor.run()
+
+    def test_the_endpoint(self):
+        self.use_executor(DeferredExecutor())
+        with mock.patch('books.metadata.get_client', return_value=FakeMetadataClient()):
+            response = self.client.get('/api/metadata/isbn/?isbn=0261103342,nope')
+        results = response.json()['results']
+        self.assertEqual([r['status'] for r in results], ['found', 'invalid'])
+        self.assertEqual(results[0]['isbn13'], '9780261103344')
+
+
+# The project's URLs as BOOKS_ASYNC_VIEWS serves them, for AsyncReadTests
+urlpatterns = async_reads(project_urls.urlpatterns)
+
+
+@override_settings(ROOT_URLCONF='books.tests')
+class AsyncReadTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        reset_caches()
+        self.book = Book.objects.create(title='The Hobbit', author='Tolkien', genre='fantasy')
+
+    def test_reads_with_an_async_handler_get_an_async_view(self):
+        self.assertTrue(iscoroutinefunction(resolve('/api/books/').func))
+        self.assertTrue(iscoroutinefunction(resolve(f'/api/books/{self.book.pk}/').func))
+        self.assertTrue(iscoroutinefunction(resolve('/api/reading-stats/').func))
+        self.assertFalse(iscoroutinefunction(resolve('/api/books/facets/').func))
+        self.assertFalse(iscoroutinefunction(resolve('/api/books/', urlconf='backwyrm.urls').func))
+
+    async def test_reads_match_the_sync_views(self):
+        paths = [
+            '/api/books/', f'/api/books/{self.book.pk}/', '/api/books/?page_size=1&ordering=title',
+            '/api/genres/', '/api/genres/fantasy/', '/api/reading-stats/',
+        ]
+        for path in paths:
+            response = await self.async_client.get(path)
+            with override_settings(ROOT_URLCONF='backwyrm.urls'):
+                expected = await sync_to_async(self.client.get)(path)
+            self.assertEqual(response.status_code, 200, path)
+            self.assertEqual(response.content, expected.content, path)
+            self.assertEqual(response.get('ETag'), expected.get('ETag'), path)
+
+    async def test_reads_use_the_async_handlers(self):
+        with mock.patch.object(BookViewSet, 'list', side_effect=AssertionError('list() was called')):
+            response = await self.async_client.get('/api/books/')
+        self.assertEqual(response.status_code, 200)
+
+    async def test_errors_go_through_handle_exception(self):
+        response = await self.async_client.get('/api/books/999999/')
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('detail', response.json())
+        response = await self.async_client.get('/api/books/?cursor=nope')
+        self.assertEqual(response.json(), {'detail': 'Invalid cursor.'})
+
+        with mock.patch.object(BookViewSet, 'alist', side_effect=PermissionDenied):
+            response = await self.async_client.get('/api/books/')
+        self.assertEqual(response.status_code, 403)
+        self.assertIn('detail', response.json())
+
+    async def test_conditional_gets(self):
+        etag = (await self.async_client.get('/api/books/'))['ETag']
+        response = await self.async_client.get('/api/books/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_writes_use_the_sync_views(self):
+        response = await self.async_client.patch(
+            f'/api/books/{self.book.pk}/', {'title': 'There and Back Again'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((await Book.objects.aget(pk=self.book.pk)).title, 'There and Back Again')
+
+    async def test_the_browsable_api_is_rendered_by_the_sync_view(self):
+        response = await self.async_client.get('/api/books/', headers={'Accept': 'text/html'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/html'))
+        self.assertIn(b'The Hobbit', response.content)
+
+
+class RowSerializerTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.book = Book.objects.create(
+            title='The Hobbit', author='Tolkien', genre='fantasy', additional_genres='Mystery, cozy',
+            rating=Decimal('4.5'), publication_date=date(1937, 9, 21), page_count=310,
+            isbn='9780261103344', tags='dragons', vibes='cozy', emoji='🐉',
+        )
+        cover = BookCover.objects.create(key='isbn:9780261103344', status=BookCover.FOUND, image='covers/hobbit.jpg')
+        Book.objects.filter(pk=self.book.pk).update(cover=cover)
+        photo = self.upload_photo(self.book, 'red')
+        BookPhoto.objects.filter(pk=photo['id']).update(derivatives_ready=True)
+        self.upload_photo(self.book, 'blue')
+        Book.objects.create(title='Blank', author='Nobody', book_notes=None)
+        self.request = RequestFactory().get('/api/books/')
+
+    def render(self, data):
+        return FastJSONRenderer().render(data)
+
+    def test_rows_serialize_like_instances(self):
+        books = Book.objects.select_related('cover').prefetch_related('photos').order_by('id')
+        context = {'request': self.request}
+        expected = BookSerializer(books, many=True, context=context).data
+        rows = BookRowSerializer(BookRowSerializer.values(books), many=True, context=context).data
+        self.assertTrue(any(photo['thumbnails'] for photo in expected[0]['photos']))
+        self.assertEqual(self.render(rows), self.render(expected))
+
+        row = BookRowSerializer.values(books).get(pk=self.book.pk)
+        self.assertEqual(
+            self.render(BookRowSerializer(row, context=context).data),
+            self.render(BookSerializer(books.get(pk=self.book.pk), context=context).data)
+        )
+
+    def test_the_list_and_detail_serve_the_same_bytes(self):
+        for path, expected in (
+            ('/api/books/', lambda request: BookSerializer(Book.objects.all(), many=True, context={'request': request})),
+            (f'/api/books/{self.book.pk}/', lambda request: BookSerializer(Book.objects.get(pk=self.book.pk), context={'request': request})),
+        ):
+            response = self.client.get(path)
+            self.assertEqual(response.content, self.render(expected(response.wsgi_request).data), path)
+
+    def test_fields_that_are_not_columns_need_a_row_method(self):
+        class IncompleteRowSerializer(RowSerializer):
+            serializer_class = BookSerializer
+
+        with self.assertRaises(ImproperlyConfigured):
+            IncompleteRowSerializer()
+
+    def test_only_list_and_detail_reads_use_rows(self):
+        def serializer_class(action, method):
+            view = BookViewSet(action=action, request=mock.Mock(method=method))
+            return view.get_serializer_class()
+
+        self.assertIs(serializer_class('list', 'GET'), BookRowSerializer)
+        self.assertIs(serializer_class('retrieve', 'HEAD'), BookRowSerializer)
+        for action, method in (('partial_update', 'PATCH'), ('create', 'POST'), ('trash', 'GET'),
+                               ('search', 'GET'), ('changes', 'GET'), ('restore', 'POST')):
+            self.assertIs(serializer_class(action, method), BookSerializer, action)
+
+    def test_other_actions_return_book_serializer_output(self):
+        with mock.patch.object(BookRowSerializer, 'to_representation', side_effect=AssertionError('rows were used')):
+            response = self.client.patch(f'/api/books/{self.book.pk}/', {'title': 'There and Back Again'}, format='json')
+            self.assertEqual(response.status_code, 200)
+            book = Book.objects.get(pk=self.book.pk)
+            self.assertEqual(response.content, self.render(BookSerializer(book, context={'request': response.wsgi_request}).data))
+
+            for path in ('/api/books/search/?q=hobbit', '/api/books/changes/', '/api/books/trash/'):
+                self.assertEqual(self.client.get(path).status_code, 200, path)
+            self.assertEqual(self.client.get('/api/books/search/?q=there').json()[0]['title'], 'There and Back Again')
@@ -0,0 +1,146 @@
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Formats every size is rendered in, as (extension, Pillow format, save options)
+DERIVATIVE_FORMATS = [
+    ('jpg', 'JPEG', {'quality': 80, 'optimize': True, 'progressive': True}),
+    ('webp', 'WEBP', {'quality': 75, 'method': 4}),
+]
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_sizes():
+    """Get the configured derivative sizes, e.g. {'small': 200, 'medium': 600}"""
+    return getattr(settings, 'BOOK_PHOTO_SIZES', {'small': 200, 'medium': 600})
+
+
+def derivative_name(name, size, extension):
+    """
+    Get the storage name of a derivative, stored next to the original:
+    book_photos/IMG_0001.jpg -> book_photos/IMG_0001.small.webp
+    """
+    root, _ = os.path.splitext(name)
+    return f'{root}.{size}.{extension}'
+
+
+def derivative_names(name):
+    """Get the storage names of every derivative of an original"""
+    return [
+        derivative_name(name, size, extension)
+        for size in get_sizes()
+        for extension, _, _ in DERIVATIVE_FORMATS
+    ]
+
+
+def generate_derivatives(name, storage):
+    """
+    Render every size and format of an original image into storage.
+    Images are only ever scaled down, never up.
+    """
+    from PIL import Image, ImageOps
+
+    with storage.open(name, 'rb') as original:
+        image = Image.open(original)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+
+    for size, max_edge in get_sizes().items():
+        resized = image.copy()
+        resized.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+        for extension, image_format, options in DERIVATIVE_FORMATS:
+            buffer = BytesIO()
+            resized.save(buffer, image_format, **options)
+
+            replace_file(storage, derivative_name(name, size, extension), buffer.getvalue())
+
+
+def replace_file(storage, name, content):
+    """
+    Write a file under an exact name, replacing any file already there.
+    On local storage it is written to a temporary file and renamed into
+    place, so a request never finds the file missing or half written.
+    """
+    try:
+        path = storage.path(name)
+    except NotImplementedError:
+        # Without local paths there's no rename; storage would pick a new
+        # unique name instead of overwriting
+        storage.delete(name)
+        storage.save(name, ContentFile(content))
+        return
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(dir=directory, prefix='.', suffix='.part')
+    try:
+        with os.fdopen(descriptor, 'wb') as temporary_file:
+            temporary_file.write(content)
+        # mkstemp() makes the file private to this user
+        os.chmod(temporary, storage.file_permissions_mode or 0o644)
+        os.replace(temporary, path)
+    except BaseException:
+        try:
+            os.remove(temporary)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def process_photo(photo_id):
+    """Generate derivatives for a BookPhoto and mark them as ready"""
+    from .models import Book, BookPhoto
+
+    try:
+        photo = BookPhoto.objects.filter(pk=photo_id).only('photo', 'book_id').first()
+        if photo is None or not photo.photo:
+            return
+        generate_derivatives(photo.photo.name, photo.photo.storage)
+        if BookPhoto.objects.filter(pk=photo_id, photo=photo.photo.name).update(derivatives_ready=True):
+            # The book's serialized photos changed, so cached copies and
+            # delta syncs need to pick it up again
+            Book.objects.filter(pk=photo.book_id).update(updated_at=timezone.now())
+    except Exception:
+        logger.exception(f"Failed to generate derivatives for book photo {photo_id}")
+
+
+def process_photo_in_worker(photo_id):
+    try:
+        process_photo(photo_id)
+    finally:
+        # Worker threads don't go through the request cycle that normally
+        # closes connections
+        connection.close()
+
+
+def get_executor():
+    """Get the thread pool that renders derivatives off the request thread"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'BOOK_PHOTO_WORKERS', 2),
+                    thread_name_prefix='book-photo'
+                )
+    return _executor
+
+
+def schedule_derivatives(photo_id):
+    """Queue derivative generation once the current transaction commits"""
+    transaction.on_commit(lambda: get_executor().submit(process_photo_in_worker, photo_id))
@@ -0,0 +1,134 @@
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.uploadhandler import SkipFile, TemporaryFileUploadHandler
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+
+# Image formats accepted for book photos, mapped to the stored file extension
+PHOTO_FORMATS = {
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'WEBP': 'webp',
+    'GIF': 'gif',
+}
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+class PayloadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Photo is too large.'
+    default_code = 'payload_too_large'
+
+
+def max_photo_bytes():
+    return getattr(settings, 'BOOK_PHOTO_MAX_BYTES', 20 * 1024 * 1024)
+
+
+class HashingUploadHandler(TemporaryFileUploadHandler):
+    """
+    Upload handler that streams every file straight to a temporary file on
+    disk, hashing it on the way and skipping it once it grows past
+    BOOK_PHOTO_MAX_BYTES, so an upload is never held in memory.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.sha256 = hashlib.sha256()
+        self.received = 0
+        self.too_large = False
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > max_photo_bytes():
+            self.too_large = True
+            raise SkipFile()
+        self.sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.sha256 = self.sha256.hexdigest()
+        return file
+
+
+def hash_file(file):
+    """Get the SHA-256 of a file object, reading it in chunks"""
+    sha256 = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+        sha256.update(chunk)
+    file.seek(0)
+    return sha256.hexdigest()
+
+
+def check_image(file):
+    """
+    Check that a file is an accepted image within BOOK_PHOTO_MAX_PIXELS.
+    Only the image header is read, so oversized images are rejected before
+    any pixel data is decoded. Returns the extension to store it under.
+    """
+    from PIL import Image, UnidentifiedImageError
+
+    file.seek(0)
+    try:
+        with Image.open(file) as image:
+            image_format = image.format
+            width, height = image.size
+    except Image.DecompressionBombError:
+        # Pillow refuses to even open images far past its own pixel limit
+        raise PayloadTooLarge('Photo has too many pixels.')
+    except (UnidentifiedImageError, OSError):
+        raise ValidationError({'photo': 'Upload a valid image.'})
+    finally:
+        file.seek(0)
+
+    if image_format not in PHOTO_FORMATS:
+        raise ValidationError({'photo': f'Unsupported image format: {image_format}.'})
+
+    max_pixels = getattr(settings, 'BOOK_PHOTO_MAX_PIXELS', 50_000_000)
+    if width * height > max_pixels:
+        raise PayloadTooLarge(f'Photo is {width}x{height}; the limit is {max_pixels} pixels.')
+
+    return PHOTO_FORMATS[image_format]
+
+
+def store_photo(file, storage, sha256=None, directory='book_photos'):
+    """
+    Store an uploaded image under a name derived from its content, e.g.
+    book_photos/3f/3fa9...c1.jpg. Uploading the same image again reuses the
+    stored file. Returns the storage name.
+    """
+    extension = check_image(file)
+    sha256 = sha256 or hash_file(file)
+    name = f'{directory}/{sha256[:2]}/{sha256}.{extension}'
+
+    if not storage.exists(name):
+        # Temporary uploads are moved into place rather than copied
+        name = storage.save(name, file if isinstance(file, File) else File(file))
+    return name
+
+
+def upload_session_dir():
+    """Get the directory the partial files of resumable uploads are kept in"""
+    directory = getattr(settings, 'BOOK_PHOTO_UPLOAD_DIR', os.path.join(settings.BASE_DIR, 'upload_sessions'))
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def upload_session_path(upload_id):
+    """Get the path of the partial file for a resumable upload session"""
+    return os.path.join(upload_session_dir(), f'{upload_id}.part')
+
+
+def remove_upload_sessions(upload_ids):
+    """Delete the partial files of resumable uploads, skipping any already gone"""
+    for upload_id in upload_ids:
+        try:
+            os.remove(upload_session_path(upload_id))
+        except FileNotFoundError:
+            pass
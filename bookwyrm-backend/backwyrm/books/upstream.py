@@ -0,0 +1,35 @@
+"""
+Plain HTTP access to the outside services books are looked up in. Only the
+standard library is used, so no extra dependency is needed.
+"""
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+
+USER_AGENT = 'BookWyrm/1.0'
+
+
+class UpstreamError(Exception):
+    """A request to an outside service failed in a way worth retrying later"""
+
+
+def http_get(url, timeout=10, max_bytes=None, headers=None):
+    """
+    GET a URL and return the body, or None if it is 404 Not Found.
+    Timeouts, connection errors, other error statuses and bodies larger
+    than max_bytes raise UpstreamError.
+    """
+    request = Request(url, headers={'User-Agent': USER_AGENT, **(headers or {})})
+    try:
+        with urlopen(request, timeout=timeout) as response:
+            # Read one byte more than allowed to tell if it was too large
+            content = response.read(max_bytes + 1 if max_bytes else -1)
+    except HTTPError as e:
+        if e.code == 404:
+            return None
+        raise UpstreamError(f'{url}: HTTP {e.code}')
+    except (URLError, OSError) as e:
+        raise UpstreamError(f'{url}: {e}')
+    if max_bytes and len(content) > max_bytes:
+        raise UpstreamError(f'{url}: response too large')
+    return content
@@ -2,14 +2,18 @@
 
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import BookViewSet, ReadingStatsView
+from .views import BookPhotoViewSet, BookViewSet, GenreViewSet, IsbnMetadataView, ReadingCalendarView, ReadingStatsView
 
 router = DefaultRouter()
 router.register(r'books', BookViewSet, basename='book')
+router.register(r'genres', GenreViewSet, basename='genre')
+router.register(r'book-photos', BookPhotoViewSet, basename='book-photo')
 
 urlpatterns = [
     # ...existing urls...
     path('reading-stats/', ReadingStatsView.as_view(), name='reading-stats'),
+    path('reading-stats/calendar/', ReadingCalendarView.as_view(), name='reading-calendar'),
+    path('metadata/isbn/', IsbnMetadataView.as_view(), name='isbn-metadata'),
 ]
 
 urlpatterns += router.urls
@@ -1,31 +1,137 @@
+from django.db import transaction
+from django.db.models import Count, Max
 from django.shortcuts import render, get_object_or_404
 from django.utils import timezone
-from datetime import date, datetime, timedelta
-from rest_framework import viewsets, status
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+import os
+from django.core.files import File
+from rest_framework import mixins, viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
-from .models import Book, Genre, ReadingDay
-from .serializers import BookSerializer, GenreSerializer
+from rest_framework.utils.urls import replace_query_param
+from .models import (
+    Book, BookPhoto, BookTombstone, Genre, PhotoUpload, ReadingDay,
+    aget_genre_names, clear_genre_names, delete_files, get_genre_names, unused_photo_files
+)
+from .serializers import (
+    BookIdsSerializer, BookPhotoDetailSerializer, BookRowSerializer, BookSerializer, GenreSerializer,
+    IsbnLookupSerializer, PhotoUploadSerializer, ReadingDaysSerializer
+)
+from .renderers import FastJSONRenderer
+from .pagination import BookCursorPagination, SyncPagination
+from .filters import BookFilter, BookOrderingFilter
+from .async_views import AsyncReadMixin
+from .caching import ConditionalGetMixin, make_etag
+from . import stats as reading_stats
+from .search import search_books
+from .labels import LABEL_FIELDS, sync_labels
+from .facets import get_facets
+from .covers import COVER_FIELDS, schedule_covers
+from .metadata import lookup_isbns, to_isbn13
+from .uploads import HashingUploadHandler, PayloadTooLarge, max_photo_bytes, store_photo, upload_session_path
 from rest_framework.views import APIView
 
+def genre_names_etag(names=None):
+    """ETag of the genre code -> name map, which every serialized book depends on"""
+    return make_etag(*sorted((get_genre_names() if names is None else names).items()))
+
+
+# Sync tokens are microseconds since the epoch. Each sync looks back a little
+# before the token so writes that committed just after it aren't missed.
+SYNC_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+SYNC_OVERLAP = timedelta(seconds=2)
+
+
+def encode_sync_token(moment):
+    return str((moment - SYNC_EPOCH) // timedelta(microseconds=1))
+
+
+def decode_sync_token(token):
+    """Turn a sync token back into a datetime, raising ValueError if invalid"""
+    try:
+        return SYNC_EPOCH + timedelta(microseconds=int(token))
+    except OverflowError:
+        raise ValueError(f"Invalid sync token: {token}")
+
+
 # Create your views here.
-class BookViewSet(viewsets.ModelViewSet):
+class BookViewSet(AsyncReadMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """
     API endpoint for books
     """
     serializer_class = BookSerializer
+    pagination_class = BookCursorPagination
+    filter_backends = [BookFilter, BookOrderingFilter]
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    # Loaded up front by the async handlers, which can't query mid-serialization
+    genre_names = None
     
     def get_queryset(self):
         """Override queryset to exclude soft-deleted books by default"""
-        queryset = Book.objects.all()
+        # Load the photos for a whole page of books in one extra query,
+        # and the covers in the same query as the books
+        queryset = Book.objects.select_related('cover').prefetch_related('photos')
         
         # Only include non-deleted books unless specifically requesting trash
-        # or using a restore action
-        if self.action != 'trash' and self.action != 'restore':
+        # or using a restore action; delta sync needs to see deletions too
+        if self.action not in ('trash', 'restore', 'changes'):
             queryset = queryset.filter(is_deleted=False)
+        
+        if self.reads_rows():
+            queryset = BookRowSerializer.values(queryset)
             
         return queryset
     
+    def reads_rows(self):
+        """
+        Whether this is a plain list or detail read, which is served from
+        values() rows by BookRowSerializer rather than model instances
+        """
+        return self.action in ('list', 'retrieve') and self.request.method in ('GET', 'HEAD')
+    
+    def get_serializer_class(self):
+        return BookRowSerializer if self.reads_rows() else BookSerializer
+    
+    def get_list_validators(self, queryset):
+        """
+        Validate a book list by its row count and newest updated_at, which
+        together change whenever a book in the list is added, edited or removed.
+
+        Lists get no Last-Modified: the newest updated_at among the books
+        still listed stays put when one is deleted, so If-Modified-Since
+        would answer 304 for a list that lost a book.
+        """
+        stats = queryset.order_by().aggregate(count=Count('id'), newest=Max('updated_at'))
+        etag = make_etag('books', stats['count'], stats['newest'], genre_names_etag(self.genre_names))
+        return etag, None
+    
+    async def aget_list_validators(self, queryset):
+        stats = await queryset.order_by().aaggregate(count=Count('id'), newest=Max('updated_at'))
+        etag = make_etag('books', stats['count'], stats['newest'], genre_names_etag(self.genre_names))
+        return etag, None
+    
+    def get_object_validators(self, obj):
+        # Only used by retrieve, so obj is a row
+        etag = make_etag('book', obj['id'], obj['updated_at'], genre_names_etag(self.genre_names))
+        return etag, obj['updated_at']
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.genre_names is not None:
+            context['genre_names'] = self.genre_names
+        return context
+    
+    async def alist(self, request, *args, **kwargs):
+        self.genre_names = await aget_genre_names()
+        return await super().alist(request, *args, **kwargs)
+    
+    async def aretrieve(self, request, *args, **kwargs):
+        self.genre_names = await aget_genre_names()
+        return await super().aretrieve(request, *args, **kwargs)
+    
     def get_object(self):
         """
         Override get_object to handle soft-deleted items in restoration
@@ -57,10 +163,182 @@ class BookViewSet(viewsets.ModelViewSet):
     def trash(self, request):
         """Get all books in trash (deleted but not yet permanently removed)"""
         # Get books that are marked as deleted
-        deleted_books = Book.objects.filter(is_deleted=True)
+        deleted_books = self.filter_queryset(self.get_queryset()).filter(is_deleted=True)
+        
+        # Page through the trash the same way as the main list
+        page = self.paginate_queryset(deleted_books)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        
         serializer = self.get_serializer(deleted_books, many=True)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """
+        Get the dashboard counts: books in the library and in trash, books
+        per reading status, books per primary genre, with genre names, and
+        books per additional genre, tag and vibe
+        """
+        facets = get_facets()
+        names = get_genre_names()
+        return Response({
+            **facets,
+            'genres': [
+                {'code': code, 'name': names.get(code, code), 'count': count}
+                for code, count in sorted(facets['genres'].items(), key=lambda item: (-item[1], item[0]))
+                if count
+            ],
+            'labels': {
+                kind: [
+                    {'name': name, 'count': count}
+                    for name, count in sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+                ]
+                for kind, counts in facets['labels'].items()
+            },
+        })
+    
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Search books by title, author, publisher, notes, tags, vibes and
+        content warnings, e.g. /api/books/search/?q=hobb tolk. Every word
+        must match the start of a word in the book. Results are ranked best
+        match first unless `ordering` is given, and take the same filters and
+        cursor pagination as the book list.
+        """
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response(
+                {"detail": "Missing search query `q`."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        books = search_books(self.filter_queryset(self.get_queryset()), query)
+        if 'ordering' not in request.query_params:
+            self.cursor_ordering = ['search_rank', 'id']
+            books = books.order_by('search_rank', 'id')
+        
+        page = self.paginate_queryset(books)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        
+        serializer = self.get_serializer(books, many=True)
+        return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """
+        Get the books created, edited, moved to trash or restored since a sync
+        token, plus the ids of books permanently deleted since then, e.g.
+        /api/books/changes/?since=<token>. Without a token every book is
+        returned. Books come in batches of `page_size`, oldest change first;
+        while `next` is set, fetch it for the next batch. Deleted ids come
+        with the first batch. Pass the returned token as `since` on the next
+        sync once there is no `next`.
+        """
+        now = timezone.now()
+        queryset = self.get_queryset()
+        deleted_ids = []
+        
+        # Later batches carry the time the sync started, so every batch
+        # returns the same token
+        started_token = request.query_params.get('started')
+        since_token = request.query_params.get('since')
+        try:
+            if started_token:
+                now = decode_sync_token(started_token)
+            since = decode_sync_token(since_token) if since_token else None
+        except ValueError:
+            return Response(
+                {"detail": "Invalid sync token."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if since is not None:
+            # Tombstones are pruned after a while, so older tokens can't be
+            # trusted to include every permanent delete
+            if since < now - timedelta(days=settings.BOOKS_TOMBSTONE_DAYS):
+                return Response(
+                    {"detail": "Sync token has expired. Sync again without a token."},
+                    status=status.HTTP_410_GONE
+                )
+            
+            since -= SYNC_OVERLAP
+            queryset = queryset.filter(updated_at__gte=since)
+            if not started_token:
+                deleted_ids = list(
+                    BookTombstone.objects.filter(deleted_at__gte=since)
+                    .values_list('book_id', flat=True)
+                    .distinct()
+                )
+        
+        paginator = SyncPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        next_link = paginator.get_next_link()
+        if next_link:
+            next_link = replace_query_param(next_link, 'started', encode_sync_token(now))
+        return Response({
+            'token': encode_sync_token(now),
+            'changed': serializer.data,
+            'deleted': deleted_ids,
+            'next': next_link
+        })
+    
+    @action(detail=False, methods=['patch'])
+    def bulk_update(self, request):
+        """
+        Apply the same field values to many books in one UPDATE, e.g.
+        {"ids": [1, 2, 3], "is_read": true, "toBeRead": false}
+        """
+        ids_serializer = BookIdsSerializer(data=request.data)
+        ids_serializer.is_valid(raise_exception=True)
+        ids = ids_serializer.validated_data['ids']
+        
+        # Validate the new values with the regular book serializer
+        changes = {key: value for key, value in request.data.items() if key != 'ids'}
+        serializer = self.get_serializer(data=changes, partial=True)
+        serializer.is_valid(raise_exception=True)
+        
+        # Deletion has its own endpoints, and photos aren't book columns
+        values = {
+            key: value for key, value in serializer.validated_data.items()
+            if key not in ('is_deleted', 'deleted_at', 'photos')
+        }
+        if not values:
+            return Response(
+                {"detail": "No fields to update."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # update() skips auto_now, so bump updated_at ourselves
+        values['updated_at'] = timezone.now()
+        with transaction.atomic():
+            books = Book.objects.filter(id__in=ids, is_deleted=False)
+            count = books.update(**values)
+            # update() doesn't send post_save, so refresh the labels here
+            if set(values) & set(LABEL_FIELDS):
+                sync_labels(books.values_list('id', flat=True))
+            if set(values) & set(COVER_FIELDS):
+                schedule_covers(books.values_list('id', flat=True))
+        
+        return Response({"updated": count, "ids": ids})
+    
+    @action(detail=False, methods=['post'])
+    def bulk_delete(self, request):
+        """Move many books to trash in one UPDATE, e.g. {"ids": [1, 2, 3]}"""
+        ids_serializer = BookIdsSerializer(data=request.data)
+        ids_serializer.is_valid(raise_exception=True)
+        ids = ids_serializer.validated_data['ids']
+        
+        with transaction.atomic():
+            count = Book.objects.filter(id__in=ids).soft_delete()
+        
+        return Response({"deleted": count, "ids": ids})
+    
     @action(detail=True, methods=['post'])
     def restore(self, request, pk=None):
         """Restore a book from trash and return complete book data"""
@@ -91,17 +369,7 @@ class BookViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR
                 )
             
-            # Get fresh book data after restoration
-            book.refresh_from_db()
-            
-            # Verify the restoration was successful
-            if book.is_deleted:
-                logger.error(f"Book {pk} is still marked as deleted after restore")
-                return Response(
-                    {"detail": "Failed to restore the book. It's still marked as deleted."},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
-            
+            # The in-memory book already holds the restored state
             # Return the complete serialized book data
             serializer = self.get_serializer(book)
             return Response(serializer.data)
@@ -124,24 +392,34 @@ class BookViewSet(viewsets.ModelViewSet):
     def permanent_delete(self, request, pk=None):
         """Permanently delete a book from the database"""
         book = self.get_object()
-        book.delete()  # Actually delete from database
+        # Actually delete from database, along with the photo files
+        Book.objects.filter(pk=book.pk).purge()
         return Response(status=status.HTTP_204_NO_CONTENT)
     
     @action(detail=False, methods=['post'])
     def empty_trash(self, request):
         """Permanently delete all books in trash"""
-        deleted_books = Book.objects.filter(is_deleted=True)
-        count = deleted_books.count()
-        deleted_books.delete()
+        count = Book.objects.filter(is_deleted=True).purge()
         return Response({"detail": f"Permanently deleted {count} books."})
 
-class GenreViewSet(viewsets.ModelViewSet):
+class GenreViewSet(AsyncReadMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing book genres
     """
     queryset = Genre.objects.all()
     serializer_class = GenreSerializer
     
+    def get_list_validators(self, queryset):
+        # Genres are validated against the in-process name map, so checking
+        # a list doesn't touch the database
+        return genre_names_etag(), None
+    
+    async def aget_list_validators(self, queryset):
+        return genre_names_etag(await aget_genre_names()), None
+    
+    def get_object_validators(self, obj):
+        return make_etag('genre', obj.code, obj.name), None
+    
     @action(detail=False, methods=['post'])
     def sync(self, request):
         """
@@ -155,10 +433,15 @@ class GenreViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
             
+        # Load every genre the payload mentions in one query
+        codes = [item.get('value') for item in genres_data if isinstance(item, dict)]
+        existing = dict(Genre.objects.filter(code__in=[c for c in codes if c]).values_list('code', 'name'))
+        
         results = []
+        changed = {}
         for genre_data in genres_data:
-            code = genre_data.get('value')
-            name = genre_data.get('label')
+            code = genre_data.get('value') if isinstance(genre_data, dict) else None
+            name = genre_data.get('label') if isinstance(genre_data, dict) else None
             
             if not code or not name:
                 results.append({
@@ -167,73 +450,332 @@ class GenreViewSet(viewsets.ModelViewSet):
                     "data": genre_data
                 })
                 continue
-                
-            genre, created = Genre.objects.update_or_create(
-                code=code,
-                defaults={'name': name}
-            )
+            
+            created = code not in existing
+            # Only genres that are new or renamed need to be written
+            if existing.get(code) != name:
+                changed[code] = Genre(code=code, name=name)
+                existing[code] = name
             
             results.append({
                 "status": "created" if created else "updated",
                 "code": code,
                 "name": name
             })
+        
+        if changed:
+            with transaction.atomic():
+                Genre.objects.bulk_create(
+                    changed.values(),
+                    update_conflicts=True,
+                    unique_fields=['code'],
+                    update_fields=['name']
+                )
+            # bulk_create doesn't send post_save, so drop the name map here
+            clear_genre_names()
             
         return Response(results)
 
-class ReadingStatsView(APIView):
+# Upload ids are UUIDs, as PhotoUpload.id returns them
+UPLOAD_ID_PATH = r'uploads/(?P<upload_id>[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})'
+
+
+class BookPhotoViewSet(mixins.ListModelMixin,
+                       mixins.RetrieveModelMixin,
+                       mixins.DestroyModelMixin,
+                       viewsets.GenericViewSet):
+    """
+    API endpoint for book photos.
+    
+    Photos can be uploaded in one multipart POST (fields `book` and `photo`),
+    or in chunks that survive dropped connections:
+    
+    1. POST uploads/ with {"book": <id>, "size": <total bytes>}
+    2. PATCH uploads/<id>/ with the raw bytes and an Upload-Offset header,
+       repeating until the whole file is sent; GET uploads/<id>/ returns the
+       offset to resume from
+    3. POST uploads/<id>/complete/ to turn the upload into a photo
+    
+    Either way the upload is streamed to disk, never held in memory, and
+    stored under its content hash so the same image is only stored once.
+    """
+    serializer_class = BookPhotoDetailSerializer
+    pagination_class = BookCursorPagination
+    cursor_ordering = ('-uploaded_at', 'id')
+    
+    def get_queryset(self):
+        queryset = BookPhoto.objects.select_related('book').filter(book__is_deleted=False)
+        
+        book_id = self.request.query_params.get('book')
+        if book_id:
+            if not book_id.isdigit():
+                raise ValidationError({"book": "Expected a book id."})
+            queryset = queryset.filter(book_id=book_id)
+            
+        return queryset
+    
+    def check_content_length(self, request, limit):
+        """Reject a request body that is already known to be too big"""
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            content_length = 0
+        if content_length > limit:
+            raise PayloadTooLarge()
+    
+    def save_photo(self, book, name):
+        """Create the BookPhoto for a stored file and mark the book as changed"""
+        # A file uploaded before may already have its thumbnails
+        ready = BookPhoto.objects.filter(photo=name, derivatives_ready=True).exists()
+        photo = BookPhoto.objects.create(book=book, photo=name, derivatives_ready=ready)
+        Book.objects.filter(pk=book.pk).update(updated_at=timezone.now())
+        return photo
+    
+    def create(self, request, *args, **kwargs):
+        """Upload a photo in a single multipart request"""
+        # Leave room for the multipart framing around the file itself
+        self.check_content_length(request, max_photo_bytes() + 64 * 1024)
+        
+        # Must be set before request.data is first read
+        handler = HashingUploadHandler(request._request)
+        request.upload_handlers = [handler]
+        
+        book_serializer = PhotoUploadSerializer(data={'book': request.data.get('book'), 'size': 1})
+        book_serializer.is_valid(raise_exception=True)
+        
+        upload = request.FILES.get('photo')
+        if getattr(handler, 'too_large', False):
+            raise PayloadTooLarge()
+        if upload is None:
+            raise ValidationError({"photo": "No photo was uploaded."})
+        
+        try:
+            name = store_photo(upload, BookPhoto._meta.get_field('photo').storage, upload.sha256)
+        finally:
+            upload.close()
+        
+        photo = self.save_photo(book_serializer.validated_data['book'], name)
+        serializer = self.get_serializer(photo)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    
+    def perform_destroy(self, instance):
+        name = instance.photo.name
+        with transaction.atomic():
+            instance.delete()
+            Book.objects.filter(pk=instance.book_id).update(updated_at=timezone.now())
+            files = unused_photo_files([name])
+            if files:
+                storage = instance.photo.storage
+                transaction.on_commit(lambda: delete_files(storage, files))
+    
+    @action(detail=False, methods=['post'], url_path='uploads')
+    def start_upload(self, request):
+        """Start a resumable upload"""
+        serializer = PhotoUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if serializer.validated_data['size'] > max_photo_bytes():
+            raise PayloadTooLarge()
+        
+        upload = serializer.save()
+        open(upload_session_path(upload.id), 'wb').close()
+        return Response(
+            {**serializer.data, 'offset': 0, 'chunk_size': settings.BOOK_PHOTO_CHUNK_BYTES},
+            status=status.HTTP_201_CREATED
+        )
+    
+    @action(detail=False, methods=['get', 'patch'], url_path=UPLOAD_ID_PATH)
+    def upload_chunk(self, request, upload_id=None):
+        """Get the offset to resume from, or append the next chunk"""
+        upload = get_object_or_404(PhotoUpload, pk=upload_id)
+        path = upload_session_path(upload.id)
+        offset = os.path.getsize(path) if os.path.exists(path) else 0
+        
+        if request.method == 'GET':
+            return Response({'id': upload.id, 'offset': offset, 'size': upload.size})
+        
+        # The client has to say where the chunk goes, so a chunk resent
+        # after a lost response can't be appended twice
+        if request.headers.get('Upload-Offset') != str(offset):
+            return Response(
+                {"detail": "Upload-Offset does not match the upload.", 'offset': offset},
+                status=status.HTTP_409_CONFLICT
+            )
+        
+        limit = min(settings.BOOK_PHOTO_CHUNK_BYTES, upload.size - offset)
+        self.check_content_length(request, limit)
+        
+        stream = request.stream
+        written = 0
+        with open(path, 'r+b') as partial:
+            partial.seek(offset)
+            while stream is not None:
+                data = stream.read(64 * 1024)
+                if not data:
+                    break
+                written += len(data)
+                if written > limit:
+                    partial.truncate(offset)
+                    raise PayloadTooLarge('Chunk goes past the declared upload size.')
+                partial.write(data)
+            partial.truncate()
+        
+        return Response({'id': upload.id, 'offset': offset + written, 'size': upload.size})
+    
+    @action(detail=False, methods=['post'], url_path=UPLOAD_ID_PATH + '/complete')
+    def complete_upload(self, request, upload_id=None):
+        """Store a fully received upload as a photo of its book"""
+        upload = get_object_or_404(PhotoUpload.objects.select_related('book'), pk=upload_id)
+        path = upload_session_path(upload.id)
+        offset = os.path.getsize(path) if os.path.exists(path) else 0
+        
+        if offset != upload.size:
+            return Response(
+                {"detail": "The upload is not complete yet.", 'offset': offset, 'size': upload.size},
+                status=status.HTTP_409_CONFLICT
+            )
+        
+        with open(path, 'rb') as partial:
+            name = store_photo(File(partial, name=os.path.basename(path)), BookPhoto._meta.get_field('photo').storage)
+        
+        photo = self.save_photo(upload.book, name)
+        upload.delete()
+        os.remove(path)
+        
+        serializer = self.get_serializer(photo)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class ReadingStatsView(AsyncReadMixin, APIView):
     """
     API view to handle reading statistics
     """
     def get(self, request):
         """Get reading statistics"""
-        # Get the current year
-        current_year = date.today().year
+        # Totals, per-year/month/weekday counts and streaks are all
+        # precomputed, so this doesn't scan the reading days
+        return Response(reading_stats.get_stats())
+    
+    async def aget(self, request):
+        """get() for async serving; see books.async_views"""
+        return Response(await reading_stats.aget_stats())
+    
+    def post(self, request):
+        """
+        Record reading days: {"read_date": "2025-06-01"} for one day (today if
+        omitted) or {"read_dates": [...]} for a backlog recorded offline.
+        Days that are already recorded are skipped, so retrying is safe:
+        the response is 201 if any day was new, else 200 with every day
+        listed in `already_recorded` (this used to be a 400).
+        """
+        serializer = ReadingDaysSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                {'detail': serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        # Count total reading days for the current year
-        total_days = ReadingDay.objects.filter(
-            read_date__year=current_year
-        ).count()
+        read_dates = list(serializer.validated_data.get('read_dates', []))
+        if 'read_date' in serializer.validated_data or not read_dates:
+            read_dates.append(serializer.validated_data.get('read_date', date.today()))
+        
+        recorded = reading_stats.record_days(read_dates)
         
         return Response({
-            'total_days_read': total_days,
-            'current_year': current_year
+            'success': True,
+            'read_date': read_dates[-1] if len(read_dates) == 1 else None,
+            'recorded': recorded,
+            'already_recorded': sorted(set(read_dates) - set(recorded)),
+            **reading_stats.get_stats()
+        }, status=status.HTTP_201_CREATED if recorded else status.HTTP_200_OK)
+
+
+class ReadingCalendarView(APIView):
+    """
+    API view for the reading calendar, as a bitmap per year
+    """
+    # Keeps a single response to a reasonable size
+    MAX_YEARS = 50
+
+    def parse_year(self, request, param, default):
+        value = request.query_params.get(param)
+        if not value:
+            return default
+        try:
+            # Accept a plain year or a full date
+            year = int(value) if value.isdigit() else date.fromisoformat(value).year
+        except ValueError:
+            year = None
+        if year is None or not date.min.year <= year <= date.max.year:
+            raise ValidationError({param: 'Expected a year or a date (YYYY-MM-DD).'})
+        return year
+
+    def get(self, request):
+        """
+        Get the reading days from the year of `from` to the year of `to`
+        (both default to the current year). Each year is the base64 of a
+        366-bit bitmap, most significant bit first, where bit N is set if
+        day N + 1 of the year was a reading day.
+        """
+        this_year = date.today().year
+        first_year = self.parse_year(request, 'from', this_year)
+        last_year = self.parse_year(request, 'to', this_year)
+        if first_year > last_year:
+            raise ValidationError({'detail': '`from` must not be after `to`.'})
+        if last_year - first_year >= self.MAX_YEARS:
+            raise ValidationError({'detail': f'At most {self.MAX_YEARS} years can be requested at once.'})
+
+        calendars = reading_stats.get_calendar(first_year, last_year)
+        return Response({
+            'from': first_year,
+            'to': last_year,
+            'bits': reading_stats.CALENDAR_BITS,
+            'years': {
+                str(year): {
+                    'days_read': sum(byte.bit_count() for byte in bitmap),
+                    'bitmap': reading_stats.encode_calendar(bitmap),
+                }
+                for year, bitmap in calendars.items()
+            },
         })
+
+
+class IsbnMetadataView(APIView):
+    """
+    API view to look up edition metadata for many ISBNs in one call
+    """
+    def get(self, request):
+        """Look up ISBNs given as ?isbn=9780261103344,0261102214"""
+        isbns = [isbn for isbn in request.query_params.get('isbn', '').split(',') if isbn.strip()]
+        return self.lookup({'isbns': isbns})
     
     def post(self, request):
-        """Record a new reading day"""
-        try:
-            # Get the date from request or use today
-            read_date_str = request.data.get('read_date')
-            if read_date_str:
-                read_date = datetime.strptime(read_date_str, '%Y-%m-%d').date()
-            else:
-                read_date = date.today()
-            
-            # Check if already recorded
-            if ReadingDay.objects.filter(read_date=read_date).exists():
-                return Response(
-                    {'detail': 'Reading already recorded for this date'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            # Create new reading day record
-            ReadingDay.objects.create(read_date=read_date)
-            
-            # Get updated count for current year
-            current_year = date.today().year
-            total_days = ReadingDay.objects.filter(
-                read_date__year=current_year
-            ).count()
-            
-            return Response({
-                'success': True,
-                'read_date': read_date,
-                'total_days_read': total_days
-            }, status=status.HTTP_201_CREATED)
-            
-        except Exception as e:
+        """Look up ISBNs given as {"isbns": ["9780261103344", "0261102214"]}"""
+        return self.lookup(request.data)
+    
+    def lookup(self, data):
+        """
+        Every ISBN gets a result in the order given, with a status of
+        'found' (with the edition metadata), 'missing', 'failed', 'pending'
+        (still being looked up; ask again shortly) or 'invalid'. ISBN-10s
+        are looked up as their ISBN-13.
+        """
+        serializer = IsbnLookupSerializer(data=data)
+        if not serializer.is_valid():
             return Response(
-                {'detail': str(e)},
+                {'detail': serializer.errors},
                 status=status.HTTP_400_BAD_REQUEST
-            )
\ No newline at end of file
+            )
+        
+        requested = [(isbn, to_isbn13(isbn)) for isbn in serializer.validated_data['isbns']]
+        found = lookup_isbns([isbn13 for _, isbn13 in requested if isbn13])
+        
+        results = []
+        for isbn, isbn13 in requested:
+            lookup_status, metadata = found[isbn13] if isbn13 else ('invalid', None)
+            results.append({
+                'isbn': isbn,
+                'isbn13': isbn13,
+                'status': lookup_status,
+                'metadata': metadata,
+            })
+        return Response({'results': results})
@@ -0,0 +1,52 @@
+"""
+Gunicorn settings for running backwyrm in production, see run_production.sh.
+
+Every value can be overridden from the environment:
+
+    PORT / BIND            address to listen on (default 0.0.0.0:8000)
+    WEB_CONCURRENCY        worker processes (default 2)
+    GUNICORN_THREADS       threads per worker (default 2)
+    GUNICORN_WORKER_CLASS  worker type (default gthread; run_production.sh
+                           sets uvicorn.workers.UvicornWorker for ASGI)
+    GUNICORN_KEEPALIVE     seconds to hold idle keep-alive connections (default 5)
+    GUNICORN_TIMEOUT       seconds before a stuck worker is restarted (default 60)
+    GUNICORN_MAX_REQUESTS  requests before a worker is recycled (default 2000)
+"""
+import os
+
+
+bind = os.environ.get('BIND', f"0.0.0.0:{os.environ.get('PORT', '8000')}")
+
+# A small fixed pool rather than one sized by CPU count. SQLite lets one
+# connection write at a time: in WAL mode reads carry on alongside it, but
+# every other writer waits for the lock (up to DATABASE_BUSY_TIMEOUT) while
+# holding a worker thread. More workers only lengthen that queue. With
+# PostgreSQL, raise WEB_CONCURRENCY.
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+threads = int(os.environ.get('GUNICORN_THREADS', '2'))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+
+# Phones reuse connections between requests
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', '5'))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '60'))
+# Workers finish the requests they are serving before stopping on reload
+graceful_timeout = 30
+
+# Import Django once in the master, so workers fork with it already loaded
+# and start faster with shared memory. Code changes then need a full
+# restart (or USR2); HUP reloads the configuration and replaces workers.
+preload_app = True
+
+# Recycle workers now and then, staggered so they don't all restart at once
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '2000'))
+max_requests_jitter = max_requests // 10
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def post_fork(server, worker):
+    # Database connections must not be shared between processes
+    from django.db import connections
+    connections.close_all()
@@ -0,0 +1,47 @@
+#!/bin/bash
+
+# Run the backend with gunicorn: a few worker processes, each with a few
+# threads, instead of the single-process development server.
+# Needs `pip install gunicorn`. Tune with the variables in gunicorn.conf.py.
+# Static files are collected into backwyrm/staticfiles for the web server
+# in front to serve; gunicorn doesn't serve them.
+#
+# ASGI=true serves backwyrm.asgi with uvicorn workers instead (also needs
+# `pip install uvicorn`), so the book, genre and reading stats reads run as
+# async views and one worker can serve many slow clients at once.
+#
+# Reload after changing settings or the worker count:  kill -HUP $(cat ../logs/gunicorn.pid)
+# Stop gracefully:                                      kill -TERM $(cat ../logs/gunicorn.pid)
+
+# Change to the project directory
+cd "$(dirname "$0")/backwyrm"
+
+# Activate virtual environment if it exists
+if [ -d "../venv" ]; then
+    source "../venv/bin/activate"
+fi
+
+mkdir -p ../logs
+
+# Production defaults; anything already set in the environment wins
+export DJANGO_DEBUG="${DJANGO_DEBUG:-false}"
+
+# The hosts the server answers to have to be given explicitly
+if [ -z "$DJANGO_ALLOWED_HOSTS" ]; then
+    echo "Set DJANGO_ALLOWED_HOSTS to the host names or addresses the API is reached at," >&2
+    echo "e.g. DJANGO_ALLOWED_HOSTS=192.168.0.57,books.lan $0" >&2
+    exit 1
+fi
+
+python manage.py migrate --noinput || exit $?
+python manage.py collectstatic --noinput > /dev/null || exit $?
+
+APP="backwyrm.wsgi:application"
+if [ "${ASGI:-false}" = "true" ]; then
+    APP="backwyrm.asgi:application"
+    export GUNICORN_WORKER_CLASS="${GUNICORN_WORKER_CLASS:-uvicorn.workers.UvicornWorker}"
+fi
+
+exec gunicorn "$APP" \
+    --config gunicorn.conf.py \
+    --pid ../logs/gunicorn.pid
@@ -51,6 +51,9 @@ export default function BookDetailScreen({ route, navigation }) {
 	useEffect(() => {
 		if (!initialBook && bookId) {
 			fetchBookDetails();
+		} else if (initialBook && initialBook.cover_url) {
+			// The backend already found a cover for this book
+			setGeneratedCoverUrl(initialBook.cover_url);
 		} else if (
 			initialBook &&
 			(!initialBook.cover || initialBook.cover === "")
@@ -189,8 +192,11 @@ export default function BookDetailScreen({ route, navigation }) {
 				data.myBookPhotos = [];
 			}
 
-			// After loading book data, fetch a cover image if needed
-			if (data && (!data.cover || data.cover === "")) {
+			// After loading book data, use the cover the backend found, or
+			// fetch a cover image if needed
+			if (data && data.cover_url) {
+				setGeneratedCoverUrl(data.cover_url);
+			} else if (data && (!data.cover || data.cover === "")) {
 				setAutoFetchingCover(true);
 				fetchBookCover(data.title, data.author);
 			}
@@ -761,8 +761,9 @@ export default function BookFormScreen({ route, navigation }) {
 
 		try {
 			console.log("Fetching edition details for ISBN:", isbn);
-			// IMPROVED: Use jscmd=details for more comprehensive metadata
-			const editionUrl = `https://openlibrary.org/api/books?bibkeys=ISBN:${isbn}&format=json&jscmd=details`;
+			// The backend looks the edition up on Open Library (jscmd=details)
+			// and caches it, so repeat lookups don't leave the server
+			const editionUrl = `${getApiEndpoint("metadata/isbn/")}?isbn=${encodeURIComponent(isbn)}`;
 			const response = await fetch(editionUrl);
 
 			if (!response.ok) {
@@ -771,7 +772,8 @@ export default function BookFormScreen({ route, navigation }) {
 			}
 
 			const data = await response.json();
-			const editionData = data[`ISBN:${isbn}`];
+			const result = data.results && data.results[0];
+			const editionData = result && result.status === "found" ? result.metadata : null;
 			console.log(
 				"Received edition details:",
 				editionData ? "Found" : "Not found"